@@ -6,6 +6,16 @@ $plugin = '45d-drivemap';
 $base_dir = getenv('DRIVEMAP_OUTPUT_DIR') ?: '/var/local/45d';
 $map_file = getenv('DRIVEMAP_OUTPUT_FILE') ?: ($base_dir . '/drivemap.json');
 $log_file = getenv('DRIVEMAP_LOG_FILE') ?: ($base_dir . '/drivemap.log');
+$lock_file = getenv('DRIVEMAP_LOCK_FILE') ?: ($base_dir . '/drivemap.lock');
+$manifest_file = getenv('DRIVEMAP_MANIFEST_FILE') ?: ($base_dir . '/drivemap.manifest.json');
+$changes_file = getenv('DRIVEMAP_CHANGES_FILE') ?: ($base_dir . '/drivemap.changes.json');
+$stats_file = getenv('DRIVEMAP_STATS_FILE') ?: ($base_dir . '/drivemap.stats.json');
+// Server-Sent Events: connection lifetime (clients reconnect with
+// Last-Event-ID) and how often an open stream brings the map up to date.
+$sse_seconds = max(1, (int)(getenv('DRIVEMAP_SSE_SECONDS') ?: 55));
+$sse_refresh_seconds = getenv('DRIVEMAP_SSE_REFRESH_SECONDS');
+$sse_refresh_seconds = ($sse_refresh_seconds === false || $sse_refresh_seconds === '') ? 30 : max(0, (int)$sse_refresh_seconds);
+$lock_timeout = (int)(getenv('DRIVEMAP_LOCK_TIMEOUT') ?: 120);
 $default_generator = "/usr/local/emhttp/plugins/$plugin/scripts/45d-generate-map";
 if (!is_file($default_generator)) {
   $default_generator = dirname(__DIR__) . '/scripts/45d-generate-map';
@@ -27,6 +37,13 @@ if ($refresh_seconds === false || $refresh_seconds === '') {
 if ($refresh_seconds < 0) {
   $refresh_seconds = 0;
 }
+// Stale-while-revalidate: when set, reads older than this many seconds are
+// answered from cache while a detached generator run refreshes the map.
+$revalidate_seconds = max(0, (int)(getenv('DRIVEMAP_REVALIDATE_SECONDS') ?: 0));
+// Hard limit for stale-while-revalidate; older maps are regenerated before
+// responding. 0 disables the limit.
+$max_age_seconds = getenv('DRIVEMAP_MAX_AGE_SECONDS');
+$max_age_seconds = ($max_age_seconds === false || $max_age_seconds === '') ? 3600 : max(0, (int)$max_age_seconds);
 $server_info_paths = [];
 $server_info_override = getenv('DRIVEMAP_SERVER_INFO');
 if ($server_info_override) {
@@ -34,35 +51,131 @@ if ($server_info_override) {
 }
 $server_info_paths[] = '/etc/45drives/server_info/server_info.json';
 $server_info_paths[] = $base_dir . '/server_info.json';
+// A running 45d-drivemap-watch keeps drivemap.json current on its own.
+$watch_pid_file = getenv('DRIVEMAP_WATCH_PID') ?: ($base_dir . '/drivemap-watch.pid');
+// Joined drivemap + zfs_info body, first line is the key it was built for.
+$map_zfs_file = getenv('DRIVEMAP_ZFS_JOIN_FILE') ?: ($base_dir . '/drivemap-zfs.json');
 $simulation_state_file = getenv('DRIVEMAP_SIM_STATE_FILE') ?: ($base_dir . '/dev-sim-backup/state.json');
 
+require_once __DIR__ . '/file_io.php';
 require_once __DIR__ . '/zfs_info.php';
+require_once __DIR__ . '/smart_history.php';
+require_once __DIR__ . '/device_index.php';
+require_once __DIR__ . '/pid_file.php';
 
-function respond_json($data, $status = 200)
+function respond_json($data, $status = 200, $headers = [])
 {
   http_response_code($status);
   header('Content-Type: application/json');
+  foreach ($headers as $name => $value) {
+    header($name . ': ' . $value);
+  }
   echo json_encode($data, JSON_UNESCAPED_SLASHES | JSON_PRETTY_PRINT);
   exit;
 }
 
-function load_json($path)
+function map_manifest($manifest_file, $map_file)
 {
-  if (!is_file($path)) {
+  // Pre-serialized variants are only trusted while drivemap.json is the exact
+  // file they were built from; anything else (e.g. dev-simulator overlays)
+  // goes through the decode/encode path.
+  if ($manifest_file === '' || !is_file($map_file)) {
     return null;
   }
-
-  $contents = @file_get_contents($path);
-  if ($contents === false) {
+  $manifest = load_json($manifest_file);
+  if (!is_array($manifest) || ($manifest['source']['sha1'] ?? '') !== sha1_file($map_file)) {
     return null;
   }
+  return $manifest;
+}
 
-  $data = json_decode($contents, true);
-  if (!is_array($data)) {
-    return null;
+function load_map_data($map_file, $manifest_file)
+{
+  // Returns [usable, data]. A matching manifest already proves the map is a
+  // complete generator write, so decoding is left to callers that need it.
+  if (map_manifest($manifest_file, $map_file) !== null) {
+    return [true, null];
   }
+  $data = load_json($map_file);
+  return [is_array($data), $data];
+}
 
-  return $data;
+function request_etag_matches($etag)
+{
+  // Weak comparison, as If-None-Match requires: W/ prefixes are ignored.
+  $etag = preg_replace('/^W\//', '', $etag);
+  $header = $_SERVER['HTTP_IF_NONE_MATCH'] ?? '';
+  if ($header === '') {
+    return false;
+  }
+  foreach (explode(',', $header) as $candidate) {
+    $candidate = trim($candidate);
+    if ($candidate === '*' || preg_replace('/^W\//', '', $candidate) === $etag) {
+      return true;
+    }
+  }
+  return false;
+}
+
+function respond_json_etag($data, $etag_data = null)
+{
+  // Content-hash validator for live payloads without a pre-built variant, so
+  // pollers such as 45d-fleet-collect get a bodiless 304 while nothing changed.
+  // A hash over $etag_data leaves part of the body out, so it is weak.
+  $etag = ($etag_data === null ? '' : 'W/') . '"' . sha1(json_encode($etag_data ?? $data, JSON_UNESCAPED_SLASHES)) . '"';
+  $headers = ['ETag' => $etag, 'Cache-Control' => 'no-cache'];
+  if (request_etag_matches($etag)) {
+    http_response_code(304);
+    foreach ($headers as $name => $value) {
+      header($name . ': ' . $value);
+    }
+    exit;
+  }
+  respond_json($data, 200, $headers);
+}
+
+function serve_map_variant($name, $map_file, $manifest_file, $headers = [])
+{
+  // Streams the generator's compact (or gzip) body straight from disk and
+  // answers If-None-Match with 304. Returns when no usable variant exists.
+  $manifest = map_manifest($manifest_file, $map_file);
+  $variant = $manifest['variants'][$name] ?? null;
+  if (!is_array($variant) || empty($variant['file']) || empty($variant['etag'])) {
+    return;
+  }
+  $dir = dirname($manifest_file);
+  $accepts_gzip = stripos($_SERVER['HTTP_ACCEPT_ENCODING'] ?? '', 'gzip') !== false
+    && !ini_get('zlib.output_compression');
+  $use_gzip = $accepts_gzip && !empty($variant['gzip']) && is_file($dir . '/' . $variant['gzip']);
+  $path = $dir . '/' . ($use_gzip ? $variant['gzip'] : $variant['file']);
+  if (!is_file($path)) {
+    return;
+  }
+
+  // The variant ETag skips per-run fields such as lastUpdated, so bodies with
+  // the same ETag can differ byte-for-byte: a weak validator.
+  $headers['ETag'] = 'W/"' . $variant['etag'] . ($use_gzip ? '-gz' : '') . '"';
+  $headers['Vary'] = 'Accept-Encoding';
+  $headers['Cache-Control'] = 'no-cache';
+  if (request_etag_matches($headers['ETag'])) {
+    http_response_code(304);
+    foreach ($headers as $header_name => $value) {
+      header($header_name . ': ' . $value);
+    }
+    exit;
+  }
+
+  http_response_code(200);
+  header('Content-Type: application/json');
+  if ($use_gzip) {
+    header('Content-Encoding: gzip');
+  }
+  header('Content-Length: ' . filesize($path));
+  foreach ($headers as $header_name => $value) {
+    header($header_name . ': ' . $value);
+  }
+  readfile($path);
+  exit;
 }
 
 function ensure_last_updated($data, $path)
@@ -176,6 +289,336 @@ function run_server_info_generator($generator, $log_file)
   return run_script($generator, $log_file, 'Server info generator not found');
 }
 
+function run_generator_locked($generator, $log_file, $lock_file, $lock_timeout, $share_in_flight = true)
+{
+  // Single-flight generation: only one generator runs at a time. With
+  // $share_in_flight, callers that find a run in progress wait for it and
+  // reuse its result instead of forking their own smartctl/lsblk work.
+  @mkdir(dirname($lock_file), 0755, true);
+  $handle = @fopen($lock_file, 'c+');
+  if (!$handle) {
+    return run_generator($generator, $log_file);
+  }
+
+  $waited = false;
+  $deadline = microtime(true) + max(1, $lock_timeout);
+  while (!flock($handle, LOCK_EX | LOCK_NB)) {
+    if (microtime(true) >= $deadline) {
+      fclose($handle);
+      return ['ok' => false, 'error' => 'Timed out waiting for drive map generation'];
+    }
+    $waited = true;
+    usleep(100000);
+  }
+
+  if ($waited && $share_in_flight) {
+    // The lock holder records its outcome in the lock file before releasing.
+    rewind($handle);
+    $shared = json_decode((string)stream_get_contents($handle), true);
+    flock($handle, LOCK_UN);
+    fclose($handle);
+    if (is_array($shared) && isset($shared['ok'])) {
+      $shared['shared'] = true;
+      return $shared;
+    }
+    return ['ok' => true, 'shared' => true];
+  }
+
+  $result = run_generator($generator, $log_file);
+  ftruncate($handle, 0);
+  rewind($handle);
+  fwrite($handle, json_encode([
+    'ok' => $result['ok'],
+    'exitCode' => $result['exitCode'] ?? null,
+    'error' => $result['error'] ?? null,
+  ]));
+  fflush($handle);
+  flock($handle, LOCK_UN);
+  fclose($handle);
+  return $result;
+}
+
+function generation_in_flight($lock_file)
+{
+  if (!is_file($lock_file)) {
+    return false;
+  }
+  $handle = @fopen($lock_file, 'r');
+  if (!$handle) {
+    return false;
+  }
+  $busy = !flock($handle, LOCK_EX | LOCK_NB);
+  if (!$busy) {
+    flock($handle, LOCK_UN);
+  }
+  fclose($handle);
+  return $busy;
+}
+
+function start_background_revalidation($lock_file)
+{
+  // Detach a CLI copy of this API in --revalidate mode. Skip the spawn when a
+  // generator already holds the lock; that run produces the fresh map.
+  if (generation_in_flight($lock_file)) {
+    return false;
+  }
+  $command = script_command(__FILE__);
+  if ($command === null) {
+    return false;
+  }
+  exec($command . ' --revalidate > /dev/null 2>&1 &');
+  return true;
+}
+
+function map_age($map_file)
+{
+  if (!is_file($map_file)) {
+    return null;
+  }
+  return max(0, time() - filemtime($map_file));
+}
+
+function map_response_headers($result)
+{
+  $headers = [
+    'X-DriveMap-Stale' => !empty($result['stale']) ? '1' : '0',
+  ];
+  if (isset($result['age'])) {
+    $headers['Age'] = (string)$result['age'];
+  }
+  if (!empty($result['revalidating'])) {
+    $headers['X-DriveMap-Revalidating'] = '1';
+  }
+  return $headers;
+}
+
+function load_changes_since($changes_file, $since)
+{
+  // Merges the generator's change log into one slot delta after $since.
+  // `reset` means the log cannot bridge the gap and the client should refetch
+  // the full map.
+  $log = load_json($changes_file);
+  if (!is_array($log) || !isset($log['version'])) {
+    return ['version' => null, 'since' => $since, 'reset' => true];
+  }
+  $version = (int)$log['version'];
+  $response = ['version' => $version, 'since' => $since];
+  if ($since > $version || $since < (int)($log['base'] ?? $version)) {
+    $response['reset'] = true;
+    return $response;
+  }
+
+  $slots = [];
+  foreach ($log['entries'] ?? [] as $entry) {
+    if ((int)($entry['version'] ?? 0) <= $since) {
+      continue;
+    }
+    foreach ($entry['slots'] ?? [] as $bay_id => $fields) {
+      $previous = $slots[$bay_id] ?? [];
+      $slots[$bay_id] = is_array($fields) ? array_merge(is_array($previous) ? $previous : [], $fields) : null;
+    }
+    if (isset($entry['meta'])) {
+      $response['meta'] = $entry['meta'];
+    }
+  }
+  $response['slots'] = (object)$slots;
+  return $response;
+}
+
+function stream_changes($changes_file, $since, $seconds, $refresh_seconds, $refresh)
+{
+  // Server-Sent Events: one `slots` event per version step, keepalive comments
+  // in between. The stream ends after $seconds; EventSource reconnects with
+  // Last-Event-ID and resumes from there.
+  @set_time_limit($seconds + 10);
+  header('Content-Type: text/event-stream');
+  header('Cache-Control: no-cache');
+  header('X-Accel-Buffering: no');
+  while (ob_get_level() > 0) {
+    ob_end_flush();
+  }
+  echo "retry: 3000\n\n";
+  flush();
+
+  $deadline = microtime(true) + $seconds;
+  $next_refresh = 0;
+  $last_write = microtime(true);
+  $seen_mtime = null;
+  while (true) {
+    $now = microtime(true);
+    if ($refresh_seconds > 0 && $now >= $next_refresh) {
+      $refresh();
+      $next_refresh = $now + $refresh_seconds;
+    }
+    clearstatcache(true, $changes_file);
+    $mtime = @filemtime($changes_file);
+    if ($mtime !== $seen_mtime) {
+      $seen_mtime = $mtime;
+      $delta = load_changes_since($changes_file, $since);
+      if (!empty($delta['reset']) || $delta['version'] > $since) {
+        $event = !empty($delta['reset']) ? 'reset' : 'slots';
+        echo 'id: ' . ($delta['version'] ?? $since) . "\n";
+        echo 'event: ' . $event . "\n";
+        echo 'data: ' . json_encode($delta, JSON_UNESCAPED_SLASHES) . "\n\n";
+        flush();
+        $since = $delta['version'] ?? $since;
+        $last_write = $now;
+      }
+    }
+    if ($now - $last_write >= 15) {
+      echo ": keepalive\n\n";
+      flush();
+      $last_write = $now;
+    }
+    if (connection_aborted() || $now >= $deadline) {
+      break;
+    }
+    usleep(500000);
+  }
+  exit;
+}
+
+function prometheus_value($value)
+{
+  return is_float($value) ? (string)round($value, 6) : (string)(int)$value;
+}
+
+function prometheus_labels($labels)
+{
+  if (!$labels) {
+    return '';
+  }
+  $parts = [];
+  foreach ($labels as $name => $value) {
+    $parts[] = $name . '="' . str_replace(['\\', '"', "\n"], ['\\\\', '\\"', '\\n'], (string)$value) . '"';
+  }
+  return '{' . implode(',', $parts) . '}';
+}
+
+function prometheus_metric($name, $type, $help, $samples)
+{
+  // $samples is a list of [labels, value]; families without samples are omitted.
+  if (!$samples) {
+    return '';
+  }
+  $text = "# HELP $name $help\n# TYPE $name $type\n";
+  foreach ($samples as [$labels, $value]) {
+    $text .= $name . prometheus_labels($labels) . ' ' . prometheus_value($value) . "\n";
+  }
+  return $text;
+}
+
+function prometheus_histogram($name, $help, $histogram)
+{
+  if (!is_array($histogram) || !isset($histogram['buckets'])) {
+    return '';
+  }
+  $text = "# HELP $name $help\n# TYPE $name histogram\n";
+  foreach ($histogram['buckets'] as $bound => $count) {
+    $text .= $name . '_bucket' . prometheus_labels(['le' => (string)$bound]) . ' ' . (int)$count . "\n";
+  }
+  $text .= $name . '_sum ' . prometheus_value((float)$histogram['sum']) . "\n";
+  $text .= $name . '_count ' . (int)$histogram['count'] . "\n";
+  return $text;
+}
+
+function metrics_text($map, $stats, $zfs_stats, $age)
+{
+  // Prometheus text exposition of the generator and zfs_info timings kept in
+  // drivemap.json, drivemap.stats.json and zfs-stats.json.
+  $timings = is_array($map['timings'] ?? null) ? $map['timings'] : [];
+  $runs = is_array($stats['runs'] ?? null) ? $stats['runs'] : [];
+  $last = $runs ? $runs[count($runs) - 1] : [];
+  $histograms = is_array($stats['histograms'] ?? null) ? $stats['histograms'] : [];
+
+  $phases = [];
+  foreach ($last['phases'] ?? [] as $phase => $seconds) {
+    $phases[] = [['phase' => $phase], (float)$seconds];
+  }
+  $commands = [];
+  foreach ($last['commands'] ?? [] as $command) {
+    $commands[] = [['command' => $command['command'] ?? ''], (float)($command['seconds'] ?? 0)];
+  }
+  $server_phases = [];
+  foreach ($timings['serverInfo']['phases'] ?? [] as $phase => $seconds) {
+    $server_phases[] = [['phase' => $phase], (float)$seconds];
+  }
+  $devices = [];
+  foreach ($stats['devices'] ?? [] as $device) {
+    $devices[] = [['bay' => $device['bay-id'] ?? '', 'dev' => $device['dev'] ?? ''], (float)($device['seconds'] ?? 0)];
+  }
+  $slowest = [];
+  if (!empty($last['slowestDevice'])) {
+    $slowest[] = [['bay' => $last['slowestDevice']['bay-id'] ?? '', 'dev' => $last['slowestDevice']['dev'] ?? ''], (float)$last['slowestDevice']['seconds']];
+  }
+  $zfs_commands = [];
+  foreach ($zfs_stats['last']['commands'] ?? [] as $command) {
+    $zfs_commands[] = [['command' => $command['command'] ?? '', 'source' => $command['source'] ?? ''], (float)($command['seconds'] ?? 0)];
+  }
+
+  $text = '';
+  $text .= prometheus_histogram('drivemap_generator_duration_seconds', 'Wall time of 45d-generate-map runs.', $histograms['generator_seconds'] ?? null);
+  $text .= prometheus_histogram('drivemap_slowest_device_seconds', 'smartctl wall time of the slowest probed device per generator run.', $histograms['slowest_device_seconds'] ?? null);
+  $text .= prometheus_metric('drivemap_generator_last_duration_seconds', 'gauge', 'Wall time of the most recent generator run.', $last ? [[[], (float)$last['total']]] : []);
+  $text .= prometheus_metric('drivemap_generator_phase_seconds', 'gauge', 'Per-phase wall time of the most recent generator run.', $phases);
+  $text .= prometheus_metric('drivemap_generator_command_seconds', 'gauge', 'External command wall time in the most recent generator run.', $commands);
+  $text .= prometheus_metric('drivemap_server_info_phase_seconds', 'gauge', 'Per-phase wall time of the most recent server_info generation.', $server_phases);
+  $text .= prometheus_metric('drivemap_device_smart_seconds', 'gauge', 'smartctl wall time per device probed in the latest run.', $devices);
+  $text .= prometheus_metric('drivemap_slowest_device_last_seconds', 'gauge', 'Slowest probed device in the most recent generator run.', $slowest);
+  $text .= prometheus_metric('drivemap_smart_errors', 'gauge', 'Devices whose SMART data could not be read in the most recent run.', $last ? [[[], (int)($last['smartErrors'] ?? 0)]] : []);
+  $text .= prometheus_metric('drivemap_map_version', 'gauge', 'Current drive map version.', $map ? [[[], (int)($map['version'] ?? 0)]] : []);
+  $text .= prometheus_metric('drivemap_map_age_seconds', 'gauge', 'Seconds since drivemap.json was written.', $age !== null ? [[[], (int)$age]] : []);
+  $text .= prometheus_histogram('drivemap_zfs_info_duration_seconds', 'Wall time of zfs_info collection.', $zfs_stats['histograms']['zfs_info_seconds'] ?? null);
+  $text .= prometheus_metric('drivemap_zfs_command_seconds', 'gauge', 'ZFS command wall time in the most recent zfs_info collection.', $zfs_commands);
+  return $text;
+}
+
+function map_zfs_payload($map, $zfs, $index)
+{
+  // Each slot carries its zfs_disks entry, so the UI needs one request and no
+  // client-side join. Pool-level data stays alongside for headers.
+  [$rows, $unmatched] = join_zfs_slots($map['rows'] ?? [], $index['names'] ?? [], $zfs['zfs_disks'] ?? []);
+  return [
+    'version' => $map['version'] ?? 0,
+    'rows' => $rows,
+    'meta' => $map['meta'] ?? [],
+    'lastUpdated' => $map['lastUpdated'] ?? null,
+    'zfs' => [
+      'installed' => !empty($zfs['zfs_installed']),
+      'zpools' => $zfs['zpools'] ?? [],
+      'warnings' => $zfs['warnings'] ?? [],
+      'iostat' => $zfs['iostat'] ?? null,
+      'unmatched' => $unmatched,
+    ],
+  ];
+}
+
+function serve_map_zfs_cache($path, $key, $headers)
+{
+  // Streams the cached body when it was built for this key; returns otherwise.
+  $handle = @fopen($path, 'rb');
+  if (!$handle) {
+    return;
+  }
+  if (rtrim((string)fgets($handle), "\n") !== $key) {
+    fclose($handle);
+    return;
+  }
+  http_response_code(200);
+  header('Content-Type: application/json');
+  header('Content-Length: ' . (filesize($path) - ftell($handle)));
+  foreach ($headers as $name => $value) {
+    header($name . ': ' . $value);
+  }
+  fpassthru($handle);
+  exit;
+}
+
+function watcher_running($pid_file)
+{
+  return pid_file_process($pid_file, '45d-drivemap-watch') > 0;
+}
+
 function should_refresh_map($map_file, $refresh_seconds)
 {
   if (!is_file($map_file)) {
@@ -188,33 +631,52 @@ function should_refresh_map($map_file, $refresh_seconds)
   return $age >= $refresh_seconds;
 }
 
-function ensure_map_data($map_file, $generator, $log_file, $refresh_seconds)
+function ensure_map_data($map_file, $generator, $log_file, $refresh_seconds, $lock_file, $lock_timeout, $revalidate_seconds = 0, $max_age_seconds = 0, $manifest_file = '')
 {
-  $cached = load_json($map_file);
-  $has_cached = is_array($cached);
+  // 'data' is null when the map was validated through its manifest; callers
+  // then stream a pre-serialized variant or decode the file themselves.
+  [$has_cached, $cached] = load_map_data($map_file, $manifest_file);
+  $age = map_age($map_file);
+
+  if ($revalidate_seconds > 0 && $has_cached) {
+    // Stale-while-revalidate: answer from cache right away unless the map is
+    // past the hard max age, refreshing in the background once it goes stale.
+    if ($max_age_seconds <= 0 || $age < $max_age_seconds) {
+      if ($age < $revalidate_seconds) {
+        return ['ok' => true, 'data' => $cached, 'age' => $age];
+      }
+      return [
+        'ok' => true,
+        'data' => $cached,
+        'age' => $age,
+        'stale' => true,
+        'revalidating' => start_background_revalidation($lock_file) || generation_in_flight($lock_file),
+      ];
+    }
+  }
 
   if (!should_refresh_map($map_file, $refresh_seconds)) {
     if ($has_cached) {
-      return ['ok' => true, 'data' => $cached];
+      return ['ok' => true, 'data' => $cached, 'age' => $age];
     }
     return ['ok' => false, 'error' => 'Drive map data unavailable'];
   }
 
-  $result = run_generator($generator, $log_file);
+  $result = run_generator_locked($generator, $log_file, $lock_file, $lock_timeout);
   if (!$result['ok']) {
     if ($has_cached) {
-      return ['ok' => true, 'data' => $cached, 'stale' => true];
+      return ['ok' => true, 'data' => $cached, 'age' => $age, 'stale' => true];
     }
     return $result;
   }
 
-  $fresh = load_json($map_file);
-  if (is_array($fresh)) {
-    return ['ok' => true, 'data' => $fresh];
+  [$has_fresh, $fresh] = load_map_data($map_file, $manifest_file);
+  if ($has_fresh) {
+    return ['ok' => true, 'data' => $fresh, 'age' => map_age($map_file)];
   }
 
   if ($has_cached) {
-    return ['ok' => true, 'data' => $cached, 'stale' => true];
+    return ['ok' => true, 'data' => $cached, 'age' => $age, 'stale' => true];
   }
 
   return ['ok' => false, 'error' => 'Drive map data unavailable'];
@@ -227,40 +689,133 @@ if (is_array($simulation_state)) {
     // Dev simulator synthetic overlays mutate drivemap.json directly. Skip
     // read-time regeneration so those overlays survive API reads.
     $refresh_seconds = 31536000;
+    $revalidate_seconds = 0;
   }
 }
 
+if (watcher_running($watch_pid_file)) {
+  // Hotplug events and the watcher's periodic full runs already refresh the
+  // map, so reads serve it as is. Refresh still forces a full run.
+  $refresh_seconds = 31536000;
+  $revalidate_seconds = 0;
+}
+
+if (PHP_SAPI === 'cli' && in_array('--revalidate', $argv ?? [], true)) {
+  // Detached background refresh started by start_background_revalidation().
+  $result = run_generator_locked($generator, $log_file, $lock_file, $lock_timeout);
+  exit($result['ok'] ? 0 : 1);
+}
+
 $action = $_REQUEST['action'] ?? 'drivemap';
 
 if ($action === 'drivemap' || $action === 'lsdev') {
-  $result = ensure_map_data($map_file, $generator, $log_file, $refresh_seconds);
+  $result = ensure_map_data($map_file, $generator, $log_file, $refresh_seconds, $lock_file, $lock_timeout, $revalidate_seconds, $max_age_seconds, $manifest_file);
   if (!$result['ok']) {
     respond_json($result, 500);
   }
-  $data = $result['data'];
+  serve_map_variant('drivemap', $map_file, $manifest_file, map_response_headers($result));
+  $data = $result['data'] ?? load_json($map_file);
   if ($data === null) {
     respond_json(['error' => 'Drive map data unavailable'], 500);
   }
-  respond_json(ensure_last_updated($data, $map_file));
+  respond_json(ensure_last_updated($data, $map_file), 200, map_response_headers($result));
 }
 
 if ($action === 'disk_info') {
   // Legacy "disk_info" consumers expect a flattened list of bays.
-  $result = ensure_map_data($map_file, $generator, $log_file, $refresh_seconds);
+  $result = ensure_map_data($map_file, $generator, $log_file, $refresh_seconds, $lock_file, $lock_timeout, $revalidate_seconds, $max_age_seconds, $manifest_file);
   if (!$result['ok']) {
     respond_json($result, 500);
   }
-  $data = $result['data'];
+  serve_map_variant('disk_info', $map_file, $manifest_file, map_response_headers($result));
+  $data = $result['data'] ?? load_json($map_file);
   if (!$data || !isset($data['rows'])) {
     respond_json(['error' => 'Drive map data unavailable'], 500);
   }
   respond_json([
     'rows' => normalize_disk_info_rows($data['rows']),
-  ]);
+  ], 200, map_response_headers($result));
+}
+
+if ($action === 'changes') {
+  // Slot deltas since a map version: JSON for `since=<version>` polling, or a
+  // Server-Sent Events stream for `stream=1` / Accept: text/event-stream.
+  $since = (int)($_REQUEST['since'] ?? ($_SERVER['HTTP_LAST_EVENT_ID'] ?? 0));
+  $wants_stream = ($_REQUEST['stream'] ?? '') === '1'
+    || stripos($_SERVER['HTTP_ACCEPT'] ?? '', 'text/event-stream') !== false;
+  $refresh = function () use ($map_file, $generator, $log_file, $refresh_seconds, $lock_file, $lock_timeout, $revalidate_seconds, $max_age_seconds, $manifest_file) {
+    return ensure_map_data($map_file, $generator, $log_file, $refresh_seconds, $lock_file, $lock_timeout, $revalidate_seconds, $max_age_seconds, $manifest_file);
+  };
+  if ($wants_stream) {
+    stream_changes($changes_file, $since, $sse_seconds, $sse_refresh_seconds, $refresh);
+  }
+  $refresh();
+  respond_json(load_changes_since($changes_file, $since));
 }
 
 if ($action === 'zfs_info') {
-  respond_json(generate_zfs_info());
+  $zfs = generate_zfs_info();
+  record_zfs_info_stats(zfs_stats_file(), $zfs['timings']);
+  // Timings differ on every call; the validator covers only the pool data.
+  respond_json_etag($zfs, array_diff_key($zfs, ['timings' => true]));
+}
+
+if ($action === 'drivemap_zfs') {
+  // drivemap + zfs_info joined server-side through the generator's device
+  // index. The joined body is cached until either input changes.
+  $result = ensure_map_data($map_file, $generator, $log_file, $refresh_seconds, $lock_file, $lock_timeout, $revalidate_seconds, $max_age_seconds, $manifest_file);
+  if (!$result['ok']) {
+    respond_json($result, 500);
+  }
+  $zfs = generate_zfs_info();
+  record_zfs_info_stats(zfs_stats_file(), $zfs['timings']);
+  $map_sha1 = (string)sha1_file($map_file);
+  // The map's ETag ignores per-run timings, so a regeneration with the same
+  // slots keeps the joined cache; edited maps fall back to the file hash.
+  $map_key = map_manifest($manifest_file, $map_file)['variants']['drivemap']['etag'] ?? $map_sha1;
+  $key = sha1($map_key . sha1(json_encode(array_diff_key($zfs, ['timings' => true]), JSON_UNESCAPED_SLASHES)));
+  $headers = map_response_headers($result) + ['ETag' => 'W/"' . $key . '"', 'Cache-Control' => 'no-cache'];
+  if (request_etag_matches($headers['ETag'])) {
+    http_response_code(304);
+    foreach ($headers as $name => $value) {
+      header($name . ': ' . $value);
+    }
+    exit;
+  }
+  serve_map_zfs_cache($map_zfs_file, $key, $headers);
+
+  $map = $result['data'] ?? load_json($map_file);
+  if ($map === null) {
+    respond_json(['error' => 'Drive map data unavailable'], 500);
+  }
+  $index = load_json(device_index_file());
+  if (($index['source']['sha1'] ?? '') !== $map_sha1) {
+    // Map written by an older generator or edited in place (dev simulator).
+    $index = device_index_payload((string)@file_get_contents($map_file), $map['rows'] ?? [], device_index_by_id_dir());
+  }
+  $body = json_encode(map_zfs_payload(ensure_last_updated($map, $map_file), $zfs, $index), JSON_UNESCAPED_SLASHES);
+  write_file_atomic($map_zfs_file, $key . "\n" . $body);
+  http_response_code(200);
+  header('Content-Type: application/json');
+  foreach ($headers as $name => $value) {
+    header($name . ': ' . $value);
+  }
+  echo $body;
+  exit;
+}
+
+if ($action === 'smart_history') {
+  // Per-bay SMART trends read straight from the history store; optional
+  // bay=, serial= and since=<unix time> narrow the result.
+  respond_json(smart_history_bays(load_json($map_file), smart_history_dir(), $_REQUEST));
+}
+
+if ($action === 'metrics') {
+  // Reads only what earlier runs recorded; never triggers generation.
+  $zfs_stats = load_json(zfs_stats_file());
+  header('Content-Type: text/plain; version=0.0.4; charset=utf-8');
+  echo metrics_text(load_json($map_file), load_json($stats_file), is_array($zfs_stats) ? $zfs_stats : [], map_age($map_file));
+  exit;
 }
 
 if ($action === 'server_info') {
@@ -276,7 +831,7 @@ if ($action === 'server_info') {
   if ($data === null) {
     respond_json(['error' => 'server_info not available'], 500);
   }
-  respond_json($data);
+  respond_json_etag($data);
 }
 
 if ($action === 'status') {
@@ -289,15 +844,23 @@ if ($action === 'status') {
     $last_updated = gmdate('c', filemtime($map_file));
   }
 
+  $age = map_age($map_file);
+  $soft_ttl = $revalidate_seconds > 0 ? $revalidate_seconds : $refresh_seconds;
   respond_json([
     'exists' => is_file($map_file),
     'lastUpdated' => $last_updated,
+    'age' => $age,
+    'stale' => $age !== null && $soft_ttl > 0 && $age >= $soft_ttl,
+    'revalidating' => generation_in_flight($lock_file),
+    // Reads skip regeneration while the hotplug watcher keeps the map current.
+    'watcher' => watcher_running($watch_pid_file),
   ]);
 }
 
 if ($action === 'refresh') {
-  // Force regeneration without waiting for cache miss.
-  $result = run_generator($generator, $log_file);
+  // Force regeneration without waiting for cache miss. An in-flight run is
+  // waited on but not reused, so the refresh reflects state after the click.
+  $result = run_generator_locked($generator, $log_file, $lock_file, $lock_timeout, false);
   respond_json($result, $result['ok'] ? 200 : 500);
 }
 
@@ -0,0 +1,109 @@
+<?php
+// Device name -> bay index shared by 45d-generate-map (writes it next to
+// drivemap.json) and api.php?action=drivemap_zfs (joins zfs_info onto bays).
+// `zpool status` prints whatever name a pool was created with, so every name
+// a bay's disk is known by points at its bay id: the vdev_id alias and its
+// /dev/disk/by-vdev path, the by-path link, the kernel name and the
+// /dev/disk/by-id links that resolve to the same disk.
+require_once __DIR__ . '/host_io.php';
+
+function device_index_file()
+{
+  $base = getenv('DRIVEMAP_OUTPUT_DIR') ?: '/var/local/45d';
+  return getenv('DRIVEMAP_INDEX_FILE') ?: ($base . '/drivemap.index.json');
+}
+
+function device_index_by_id_dir()
+{
+  return rtrim(getenv('DRIVEMAP_BY_ID_DIR') ?: '/dev/disk/by-id', '/');
+}
+
+function device_index($rows, $by_id_dir)
+{
+  $names = [];
+  $by_dev = [];
+  foreach ($rows as $row) {
+    foreach ($row as $slot) {
+      $bay_id = (string)($slot['bay-id'] ?? '');
+      if ($bay_id === '') {
+        continue;
+      }
+      $names[$bay_id] = $bay_id;
+      $names['/dev/disk/by-vdev/' . $bay_id] = $bay_id;
+      $path = (string)($slot['dev-by-path'] ?? '');
+      if ($path !== '') {
+        $names[$path] = $bay_id;
+        $names[basename($path)] = $bay_id;
+      }
+      $dev = (string)($slot['dev'] ?? '');
+      if ($dev !== '') {
+        $names[$dev] = $bay_id;
+        $names[basename($dev)] = $bay_id;
+        $by_dev[$dev] = $bay_id;
+      }
+    }
+  }
+
+  // by-id links are resolved once here rather than per zfs_info read.
+  foreach (host_scandir($by_id_dir) ?: [] as $entry) {
+    if ($entry === '.' || $entry === '..') {
+      continue;
+    }
+    $real = host_realpath($by_id_dir . '/' . $entry);
+    if ($real !== false && isset($by_dev[$real])) {
+      $names[$entry] = $by_dev[$real];
+      $names[$by_id_dir . '/' . $entry] = $by_dev[$real];
+    }
+  }
+  return $names;
+}
+
+function device_index_payload($map_contents, $rows, $by_id_dir)
+{
+  // Pinned to the map it was built from, like drivemap.manifest.json.
+  return [
+    'source' => ['sha1' => sha1($map_contents)],
+    'names' => device_index($rows, $by_id_dir),
+  ];
+}
+
+function device_index_lookup($names, $name)
+{
+  // Exact name first, then with the partition suffix dropped (pools built on
+  // sdb1, nvme0n1p1 or a by-id "-part1" link still belong to the disk's bay).
+  $candidates = [$name, basename($name)];
+  foreach ([$name, basename($name)] as $candidate) {
+    $candidates[] = preg_replace('/-part\d+$/', '', $candidate);
+    $candidates[] = preg_replace('/^(sd[a-z]+|vd[a-z]+)\d+$|^(nvme\d+n\d+)p\d+$/', '$1$2', $candidate);
+  }
+  foreach ($candidates as $candidate) {
+    if (isset($names[$candidate])) {
+      return $names[$candidate];
+    }
+  }
+  return null;
+}
+
+function join_zfs_slots($rows, $names, $zfs_disks)
+{
+  // Returns [rows with a `zfs` entry per slot (null outside any pool), names
+  // of pool members that map to no bay].
+  $by_bay = [];
+  $unmatched = [];
+  foreach ($zfs_disks as $disk_name => $disk) {
+    $bay_id = device_index_lookup($names, (string)$disk_name);
+    if ($bay_id === null) {
+      $unmatched[] = (string)$disk_name;
+      continue;
+    }
+    $by_bay[$bay_id] = $disk;
+  }
+  foreach ($rows as &$row) {
+    foreach ($row as &$slot) {
+      $slot['zfs'] = $by_bay[$slot['bay-id'] ?? ''] ?? null;
+    }
+    unset($slot);
+  }
+  unset($row);
+  return [$rows, $unmatched];
+}
@@ -0,0 +1,44 @@
+<?php
+// Output-file helpers shared by api.php, the collectors under php/ and the
+// 45d-* scripts that write under /var/local/45d.
+
+function write_file_atomic($path, $contents)
+{
+  // Readers must never observe a half-written file: write a sibling temp file
+  // named after this process and rename it over the target (atomic on the
+  // same filesystem). The temp file is removed when either step fails.
+  $tmp = $path . '.tmp.' . getmypid();
+  if (@file_put_contents($tmp, $contents) === false) {
+    @unlink($tmp);
+    return false;
+  }
+  if (!@rename($tmp, $path)) {
+    @unlink($tmp);
+    return false;
+  }
+  return true;
+}
+
+function log_line($path, $message)
+{
+  @file_put_contents($path, gmdate('c') . " " . $message . "\n", FILE_APPEND);
+}
+
+function load_json($path)
+{
+  if (!is_file($path)) {
+    return null;
+  }
+
+  $contents = @file_get_contents($path);
+  if ($contents === false) {
+    return null;
+  }
+
+  $data = json_decode($contents, true);
+  if (!is_array($data)) {
+    return null;
+  }
+
+  return $data;
+}
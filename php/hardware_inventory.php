@@ -0,0 +1,164 @@
+<?php
+// Storage hardware enumeration used by 45d-generate-vdev-id. One pass over
+// /sys/bus/pci/devices and /dev/disk/by-path replaces lspci and lshw forks;
+// the DRIVEMAP_DMAP_* mock envs stand in for the matching sysfs reads.
+require_once __DIR__ . '/host_io.php';
+
+function hardware_pci_root()
+{
+  return rtrim(getenv('DRIVEMAP_PCI_DEVICES') ?: '/sys/bus/pci/devices', '/');
+}
+
+function hardware_by_path_root()
+{
+  return rtrim(getenv('DRIVEMAP_BY_PATH_DIR') ?: '/dev/disk/by-path', '/');
+}
+
+function hardware_env_json($name)
+{
+  $raw = getenv($name);
+  if ($raw === false || $raw === '') {
+    return null;
+  }
+  $decoded = json_decode($raw, true);
+  return is_array($decoded) ? $decoded : null;
+}
+
+function hardware_sysfs_value($path)
+{
+  $value = host_read($path);
+  return $value === false ? '' : strtolower(trim($value));
+}
+
+function sysfs_storage_controllers($pci_root)
+{
+  // Mass-storage functions (PCI class 01xxxx) in bus order, as lspci lists them.
+  $controllers = [];
+  foreach (host_scandir($pci_root) ?: [] as $address) {
+    $dir = $pci_root . '/' . $address;
+    $class = hardware_sysfs_value($dir . '/class');
+    if (strpos($class, '0x01') !== 0) {
+      continue;
+    }
+    $driver = host_readlink($dir . '/driver');
+    $controllers[] = [
+      'address' => $address,
+      'class' => substr($class, 0, 6),
+      'vendor' => hardware_sysfs_value($dir . '/vendor'),
+      'device' => hardware_sysfs_value($dir . '/device'),
+      'driver' => $driver !== false ? basename($driver) : '',
+      'line' => '',
+    ];
+  }
+  return $controllers;
+}
+
+function mocked_storage_controllers($lines)
+{
+  // DRIVEMAP_DMAP_LSPCI_JSON: raw `lspci` lines, matched by text like upstream.
+  $controllers = [];
+  foreach ($lines as $line) {
+    $line = (string)$line;
+    if (!preg_match('/(\w\w:\w\w.\w)/', $line, $m)) {
+      continue;
+    }
+    $controllers[] = [
+      'address' => '0000:' . $m[1],
+      'class' => '',
+      'vendor' => '',
+      'device' => '',
+      'driver' => '',
+      'line' => $line,
+    ];
+  }
+  return $controllers;
+}
+
+function by_path_ata_ports($by_path_root)
+{
+  // pci-<addr>-ata-N[.0] links grouped by controller and port; the base link
+  // wins over its ".0" twin, as in upstream list_ata_port_paths().
+  $ports = [];
+  foreach (host_scandir($by_path_root) ?: [] as $name) {
+    if (!preg_match('/^pci-(.+)-ata-(\d+)(\.0)?$/', $name, $m)) {
+      continue;
+    }
+    $addr = $m[1];
+    $port = (int)$m[2];
+    $path = $by_path_root . '/' . $name;
+    if (!isset($ports[$addr][$port]) || (substr($ports[$addr][$port], -2) === '.0' && !isset($m[3]))) {
+      $ports[$addr][$port] = $path;
+    }
+  }
+  foreach ($ports as &$by_port) {
+    ksort($by_port);
+  }
+  unset($by_port);
+  return $ports;
+}
+
+function hardware_inventory()
+{
+  // Built once per run; every alias generator queries this index.
+  static $inventory = null;
+  if ($inventory !== null) {
+    return $inventory;
+  }
+
+  $lspci_mock = hardware_env_json('DRIVEMAP_DMAP_LSPCI_JSON');
+  $controllers = is_array($lspci_mock) ? mocked_storage_controllers($lspci_mock) : sysfs_storage_controllers(hardware_pci_root());
+
+  $sata = [];
+  $sata_env = getenv('DRIVEMAP_DMAP_SATA_ADDRS');
+  if (is_string($sata_env) && trim($sata_env) !== '') {
+    $sata = array_values(array_filter(array_map('trim', explode(',', $sata_env)), fn($v) => $v !== ''));
+  } else {
+    foreach ($controllers as $controller) {
+      if ($controller['class'] === '0x0106' || stripos($controller['line'], 'SATA controller') !== false) {
+        $sata[] = $controller['address'];
+      }
+    }
+  }
+
+  $paths_mock = hardware_env_json('DRIVEMAP_DMAP_SATA_PATHS_JSON');
+  if (is_array($paths_mock)) {
+    $ports = [];
+    foreach ($paths_mock as $addr => $paths) {
+      $ports[$addr] = is_array($paths) ? array_values(array_map('strval', $paths)) : [];
+    }
+  } else {
+    $ports = array_map('array_values', by_path_ata_ports(hardware_by_path_root()));
+  }
+
+  $inventory = [
+    'controllers' => $controllers,
+    'by_address' => array_column($controllers, null, 'address'),
+    'sata' => $sata,
+    'ata_ports' => $ports,
+  ];
+  return $inventory;
+}
+
+function find_storage_controller($query)
+{
+  // $query: 'pattern' matches lspci text (mocks); 'vendor', 'device' and
+  // 'class' match sysfs ids. Returns the first controller address in bus order.
+  foreach (hardware_inventory()['controllers'] as $controller) {
+    if ($controller['line'] !== '') {
+      if (isset($query['pattern']) && preg_match($query['pattern'], $controller['line'])) {
+        return $controller['address'];
+      }
+      continue;
+    }
+    $matches = isset($query['vendor']) || isset($query['device']) || isset($query['class']);
+    foreach (['vendor', 'device', 'class'] as $field) {
+      if (isset($query[$field]) && $controller[$field] !== $query[$field]) {
+        $matches = false;
+      }
+    }
+    if ($matches) {
+      return $controller['address'];
+    }
+  }
+  return null;
+}
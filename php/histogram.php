@@ -0,0 +1,22 @@
+<?php
+// Rolling duration histograms shared by 45d-generate-map (drivemap.stats.json)
+// and zfs_info.php (zfs-stats.json); api.php?action=metrics exposes both.
+function observe_histogram($histogram, $bounds, $value)
+{
+  // Prometheus-style cumulative buckets keyed by upper bound, plus sum/count.
+  if (!is_array($histogram) || !isset($histogram['buckets'])) {
+    $histogram = ['buckets' => [], 'sum' => 0.0, 'count' => 0];
+    foreach ($bounds as $bound) {
+      $histogram['buckets'][(string)$bound] = 0;
+    }
+    $histogram['buckets']['+Inf'] = 0;
+  }
+  foreach ($histogram['buckets'] as $bound => $count) {
+    if ($bound === '+Inf' || $value <= (float)$bound) {
+      $histogram['buckets'][$bound] = $count + 1;
+    }
+  }
+  $histogram['sum'] = round($histogram['sum'] + $value, 4);
+  $histogram['count']++;
+  return $histogram;
+}
@@ -0,0 +1,249 @@
+<?php
+// Host access layer for 45d-generate-map, 45d-generate-server-info,
+// 45d-generate-vdev-id and zfs_info.php: external commands and the sysfs,
+// procfs, udev, by-path and ini inputs they read all go through these helpers.
+//
+// DRIVEMAP_RECORD_DIR=<dir> captures every call with its result (commands
+// with exit code and wall time) into <dir>/<script>-<pid>.json.
+// DRIVEMAP_REPLAY_DIR=<dir> answers the same calls from such a bundle without
+// touching the host; DRIVEMAP_REPLAY_LATENCY=1 also waits out the recorded
+// command times. Fixture overrides (DRIVEMAP_LSBLK, DRIVEMAP_SMARTCTL_DIR,
+// DRIVEMAP_ZFS_FIXTURE_DIR, ...) still take precedence in every mode.
+function host_io_mode()
+{
+  // [mode, bundle dir]; mode is 'record', 'replay' or ''.
+  static $mode = null;
+  if ($mode === null) {
+    $replay = getenv('DRIVEMAP_REPLAY_DIR');
+    $record = getenv('DRIVEMAP_RECORD_DIR');
+    if ($replay) {
+      $mode = ['replay', rtrim($replay, '/')];
+    } elseif ($record) {
+      $mode = ['record', rtrim($record, '/')];
+    } else {
+      $mode = ['', ''];
+    }
+  }
+  return $mode;
+}
+
+function host_io_script()
+{
+  $files = get_included_files();
+  return basename($files[0] ?? 'php');
+}
+
+function host_io_encode($value)
+{
+  // JSON needs UTF-8; other bytes (e.g. VPD pages) are kept as base64.
+  if (is_string($value) && !preg_match('//u', $value)) {
+    return ['base64' => base64_encode($value)];
+  }
+  if (is_array($value)) {
+    return array_map('host_io_encode', $value);
+  }
+  return $value;
+}
+
+function host_io_decode($value)
+{
+  if (is_array($value) && array_keys($value) === ['base64']) {
+    return (string)base64_decode($value['base64']);
+  }
+  if (is_array($value)) {
+    return array_map('host_io_decode', $value);
+  }
+  return $value;
+}
+
+function host_io_record($key, $value)
+{
+  // Results are kept in call order per key and written once at exit.
+  static $session = null;
+  if ($session === null) {
+    $session = ['script' => host_io_script(), 'started' => microtime(true), 'calls' => []];
+    $dir = host_io_mode()[1];
+    // Re-queued from shutdown so reads made by the script's own shutdown
+    // functions are still captured.
+    register_shutdown_function(function () use (&$session, $dir) {
+      register_shutdown_function(function () use (&$session, $dir) {
+        @mkdir($dir, 0755, true);
+        $path = $dir . '/' . $session['script'] . '-' . getmypid() . '.json';
+        @file_put_contents($path, json_encode($session, JSON_PRETTY_PRINT | JSON_UNESCAPED_SLASHES));
+      });
+    });
+  }
+  $session['calls'][$key][] = host_io_encode($value);
+}
+
+function host_io_replayed($key)
+{
+  // Returns [found, value]. The first recorded session of this script
+  // answers; keys it never saw fall back to the other sessions in the
+  // bundle. Repeated calls step through the recorded results in order.
+  static $calls = null;
+  static $cursor = [];
+  if ($calls === null) {
+    $sessions = [];
+    foreach (glob(host_io_mode()[1] . '/*.json') ?: [] as $path) {
+      $session = json_decode((string)@file_get_contents($path), true);
+      if (is_array($session) && is_array($session['calls'] ?? null)) {
+        $sessions[] = $session;
+      }
+    }
+    usort($sessions, function ($left, $right) {
+      return ($left['started'] ?? 0) <=> ($right['started'] ?? 0);
+    });
+    $script = host_io_script();
+    $own = array_values(array_filter($sessions, fn($session) => ($session['script'] ?? '') === $script));
+    $calls = $own ? $own[0]['calls'] : [];
+    foreach ($sessions as $session) {
+      $calls += $session['calls'];
+    }
+  }
+  if (!isset($calls[$key]) || !$calls[$key]) {
+    return [false, null];
+  }
+  $index = min($cursor[$key] ?? 0, count($calls[$key]) - 1);
+  $cursor[$key] = $index + 1;
+  return [true, host_io_decode($calls[$key][$index])];
+}
+
+function host_io_value($op, $arg, $live, $missing)
+{
+  [$mode] = host_io_mode();
+  if ($mode === 'replay') {
+    [$found, $value] = host_io_replayed($op . ' ' . $arg);
+    return $found ? $value : $missing;
+  }
+  $value = $live();
+  if ($mode === 'record') {
+    host_io_record($op . ' ' . $arg, $value);
+  }
+  return $value;
+}
+
+function host_io_latency($seconds)
+{
+  if (getenv('DRIVEMAP_REPLAY_LATENCY') === '1' && $seconds > 0) {
+    usleep((int)round($seconds * 1000000));
+  }
+}
+
+function host_exec($command)
+{
+  // Shell command -> ['output' => stdout, 'exit' => code, 'seconds' => wall
+  // time]. stderr is left to the command's own redirections.
+  if (host_io_mode()[0] === 'replay') {
+    [$found, $result] = host_io_replayed('exec ' . $command);
+    if (!$found) {
+      return ['output' => '', 'exit' => 127, 'seconds' => 0.0];
+    }
+    host_io_latency((float)($result['seconds'] ?? 0));
+    return $result;
+  }
+  $started = microtime(true);
+  $pipes = [];
+  $process = @proc_open($command, [0 => ['file', '/dev/null', 'r'], 1 => ['pipe', 'w']], $pipes);
+  $output = '';
+  $exit = 127;
+  if (is_resource($process)) {
+    $output = (string)stream_get_contents($pipes[1]);
+    fclose($pipes[1]);
+    $exit = proc_close($process);
+  }
+  $result = ['output' => $output, 'exit' => $exit, 'seconds' => round(microtime(true) - $started, 4)];
+  if (host_io_mode()[0] === 'record') {
+    host_io_record('exec ' . $command, $result);
+  }
+  return $result;
+}
+
+function host_pool_replay($commands, $workers)
+{
+  // Recorded results for a parallel command pool. With replayed latency the
+  // recorded durations are scheduled across $workers like the live pool.
+  $results = [];
+  $finish = array_fill(0, max(1, (int)$workers), 0.0);
+  foreach ($commands as $key => $command) {
+    [$found, $result] = host_io_replayed('pool ' . $command);
+    $results[$key] = $found ? $result : ['output' => '', 'exit' => 127, 'timed_out' => false, 'duration' => 0.0];
+    $slot = array_keys($finish, min($finish))[0];
+    $finish[$slot] += (float)$results[$key]['duration'];
+  }
+  host_io_latency(max($finish));
+  return $results;
+}
+
+function host_pool_record($commands, $results)
+{
+  if (host_io_mode()[0] !== 'record') {
+    return;
+  }
+  foreach ($commands as $key => $command) {
+    if (isset($results[$key])) {
+      host_io_record('pool ' . $command, $results[$key]);
+    }
+  }
+}
+
+function host_read($path)
+{
+  return host_io_value('read', $path, fn() => @file_get_contents($path), false);
+}
+
+function host_file_lines($path, $flags = 0)
+{
+  // file() with FILE_IGNORE_NEW_LINES and optionally FILE_SKIP_EMPTY_LINES.
+  $contents = host_read($path);
+  if ($contents === false) {
+    return false;
+  }
+  if ($contents === '') {
+    return [];
+  }
+  $lines = preg_split('/\r?\n/', $contents);
+  if (end($lines) === '') {
+    array_pop($lines);
+  }
+  if ($flags & FILE_SKIP_EMPTY_LINES) {
+    $lines = array_values(array_filter($lines, fn($line) => $line !== ''));
+  }
+  return $lines;
+}
+
+function host_parse_ini($path)
+{
+  $contents = host_read($path);
+  return $contents === false ? false : @parse_ini_string($contents, true);
+}
+
+function host_scandir($dir)
+{
+  return host_io_value('scandir', $dir, fn() => @scandir($dir), false);
+}
+
+function host_is_file($path)
+{
+  return host_io_value('is_file', $path, fn() => is_file($path), false);
+}
+
+function host_is_link($path)
+{
+  return host_io_value('is_link', $path, fn() => is_link($path), false);
+}
+
+function host_is_executable($path)
+{
+  return host_io_value('is_executable', $path, fn() => is_executable($path), false);
+}
+
+function host_realpath($path)
+{
+  return host_io_value('realpath', $path, fn() => realpath($path), false);
+}
+
+function host_readlink($path)
+{
+  return host_io_value('readlink', $path, fn() => @readlink($path), false);
+}
@@ -0,0 +1,15 @@
+<?php
+// Single-instance pid files for the long-running 45d-drivemap-watch and
+// 45d-zfs-sampler daemons, also read by api.php.
+
+function pid_file_process($pid_file, $name)
+{
+  // Pid recorded in $pid_file while that process is still $name, else 0. A
+  // SIGKILL or OOM kill leaves the file behind and its pid may since belong
+  // to an unrelated process, so /proc/<pid> existing is not enough.
+  $pid = (int)@file_get_contents($pid_file);
+  if ($pid <= 0) {
+    return 0;
+  }
+  return strpos((string)@file_get_contents('/proc/' . $pid . '/cmdline'), $name) !== false ? $pid : 0;
+}
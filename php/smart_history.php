@@ -0,0 +1,261 @@
+<?php
+// SMART history store shared by 45d-generate-map (writes) and
+// api.php?action=smart_history (reads). Each drive serial gets three files of
+// fixed 19-byte records under /var/local/45d/smart-history:
+//   <serial>.raw     every probe, appended, kept for 24 hours
+//   <serial>.hourly  one record per hour, kept for 30 days
+//   <serial>.daily   one record per day, capped at DRIVEMAP_SMART_HISTORY_DAYS
+// Older raw and hourly records are rolled up in whole buckets, so per-drive
+// size stays bounded on the RAM-backed /var.
+require_once __DIR__ . '/file_io.php';
+
+function smart_history_dir()
+{
+  $base = getenv('DRIVEMAP_OUTPUT_DIR') ?: '/var/local/45d';
+  return rtrim(getenv('DRIVEMAP_SMART_HISTORY_DIR') ?: ($base . '/smart-history'), '/');
+}
+
+function smart_history_limits()
+{
+  return [
+    'raw' => 86400,
+    'hourly' => 30 * 86400,
+    'days' => max(1, (int)(getenv('DRIVEMAP_SMART_HISTORY_DAYS') ?: 1825)),
+  ];
+}
+
+function smart_history_record_size()
+{
+  // time V, temperature v, pending V, offline-uncorrectable V, power-on V,
+  // health C. All-ones marks a value smartctl did not report.
+  return 19;
+}
+
+function smart_history_path($dir, $serial, $tier)
+{
+  return $dir . '/' . rawurlencode($serial) . '.' . $tier;
+}
+
+function smart_history_number($value)
+{
+  $value = trim((string)$value);
+  return preg_match('/^(\d+)/', $value, $m) ? (int)$m[1] : null;
+}
+
+function smart_history_sample($slot, $now)
+{
+  // Slot fields -> record values; null marks a field smartctl did not report.
+  $health = strtoupper(trim((string)($slot['health'] ?? '')));
+  return [
+    'time' => (int)$now,
+    'temp' => smart_history_number($slot['temp-c'] ?? ''),
+    'pending' => smart_history_number($slot['current-pending-sector'] ?? ''),
+    'offline' => smart_history_number($slot['offline-uncorrectable'] ?? ''),
+    'powerOn' => smart_history_number($slot['power-on-time'] ?? ''),
+    'health' => $health === 'OK' ? 1 : ($health === 'POOR' ? 2 : 0),
+  ];
+}
+
+function smart_history_pack($sample)
+{
+  $field = fn($value, $unknown) => $value === null ? $unknown : min((int)$value, $unknown - 1);
+  return pack(
+    'VvVVVC',
+    $sample['time'],
+    $field($sample['temp'], 0xFFFF),
+    $field($sample['pending'], 0xFFFFFFFF),
+    $field($sample['offline'], 0xFFFFFFFF),
+    $field($sample['powerOn'], 0xFFFFFFFF),
+    $sample['health']
+  );
+}
+
+function smart_history_unpack($bytes)
+{
+  $samples = [];
+  $count = intdiv(strlen($bytes), smart_history_record_size());
+  for ($i = 0; $i < $count; $i++) {
+    $sample = unpack('Vtime/vtemp/Vpending/Voffline/VpowerOn/Chealth', $bytes, $i * smart_history_record_size());
+    $sample['temp'] = $sample['temp'] === 0xFFFF ? null : $sample['temp'];
+    foreach (['pending', 'offline', 'powerOn'] as $field) {
+      $sample[$field] = $sample[$field] === 0xFFFFFFFF ? null : $sample[$field];
+    }
+    $samples[] = $sample;
+  }
+  return $samples;
+}
+
+function smart_history_read($path)
+{
+  $bytes = @file_get_contents($path);
+  return $bytes === false ? [] : smart_history_unpack($bytes);
+}
+
+function smart_history_write($path, $samples)
+{
+  if (!$samples) {
+    @unlink($path);
+    return true;
+  }
+  return write_file_atomic($path, implode('', array_map('smart_history_pack', $samples)));
+}
+
+function smart_history_aggregate($samples, $bucket)
+{
+  // One record per bucket start: worst-case temperature, counters and health.
+  $buckets = [];
+  foreach ($samples as $sample) {
+    $start = intdiv($sample['time'], $bucket) * $bucket;
+    if (!isset($buckets[$start])) {
+      $buckets[$start] = ['time' => $start] + array_fill_keys(['temp', 'pending', 'offline', 'powerOn'], null) + ['health' => 0];
+    }
+    foreach (['temp', 'pending', 'offline', 'powerOn'] as $field) {
+      if ($sample[$field] !== null) {
+        $buckets[$start][$field] = max($buckets[$start][$field] ?? $sample[$field], $sample[$field]);
+      }
+    }
+    $buckets[$start]['health'] = max($buckets[$start]['health'], $sample['health']);
+  }
+  ksort($buckets);
+  return array_values($buckets);
+}
+
+function smart_history_rollup($from, $to, $cutoff, $bucket)
+{
+  // Moves whole buckets older than $cutoff from one tier file to the next.
+  $samples = smart_history_read($from);
+  $old = array_filter($samples, fn($sample) => $sample['time'] < $cutoff);
+  if (!$old) {
+    return;
+  }
+  $records = implode('', array_map('smart_history_pack', smart_history_aggregate($old, $bucket)));
+  @file_put_contents($to, $records, FILE_APPEND | LOCK_EX);
+  smart_history_write($from, array_values(array_filter($samples, fn($sample) => $sample['time'] >= $cutoff)));
+}
+
+function smart_history_oldest($path)
+{
+  $handle = @fopen($path, 'rb');
+  if (!$handle) {
+    return null;
+  }
+  $bytes = fread($handle, smart_history_record_size());
+  fclose($handle);
+  return strlen((string)$bytes) === smart_history_record_size() ? unpack('Vtime', $bytes)['time'] : null;
+}
+
+function smart_history_record($dir, $slot, $now, $interval = 0)
+{
+  // Appends one raw sample unless the last one is newer than $interval, then
+  // rolls up tiers once their oldest record crosses a bucket boundary.
+  $serial = trim((string)($slot['serial'] ?? ''));
+  if ($serial === '') {
+    return false;
+  }
+  @mkdir($dir, 0755, true);
+  $raw = smart_history_path($dir, $serial, 'raw');
+  if ($interval > 0 && ($size = (int)@filesize($raw)) >= smart_history_record_size()) {
+    $last = smart_history_unpack((string)@file_get_contents($raw, false, null, $size - smart_history_record_size()));
+    if ($last && $now - $last[0]['time'] < $interval) {
+      return false;
+    }
+  }
+  if (@file_put_contents($raw, smart_history_pack(smart_history_sample($slot, $now)), FILE_APPEND | LOCK_EX) === false) {
+    return false;
+  }
+
+  $limits = smart_history_limits();
+  $hourly = smart_history_path($dir, $serial, 'hourly');
+  $daily = smart_history_path($dir, $serial, 'daily');
+  $hour_cutoff = intdiv($now - $limits['raw'], 3600) * 3600;
+  if (($oldest = smart_history_oldest($raw)) !== null && $oldest < $hour_cutoff) {
+    smart_history_rollup($raw, $hourly, $hour_cutoff, 3600);
+  }
+  $day_cutoff = intdiv($now - $limits['hourly'], 86400) * 86400;
+  if (($oldest = smart_history_oldest($hourly)) !== null && $oldest < $day_cutoff) {
+    smart_history_rollup($hourly, $daily, $day_cutoff, 86400);
+    $days = smart_history_read($daily);
+    if (count($days) > $limits['days']) {
+      smart_history_write($daily, array_slice($days, -$limits['days']));
+    }
+  }
+  return true;
+}
+
+function smart_history_load($dir, $serial, $since = 0)
+{
+  // Tiers cover disjoint time ranges, so daily + hourly + raw is chronological.
+  $samples = [];
+  foreach (['daily', 'hourly', 'raw'] as $tier) {
+    foreach (smart_history_read(smart_history_path($dir, $serial, $tier)) as $sample) {
+      if ($sample['time'] >= $since) {
+        $samples[] = ['tier' => $tier] + $sample;
+      }
+    }
+  }
+  return $samples;
+}
+
+function smart_history_trend($samples)
+{
+  $trend = [];
+  foreach (['pending' => 'pendingSectors', 'offline' => 'offlineUncorrectable'] as $field => $name) {
+    $values = array_values(array_filter(array_column($samples, $field), fn($value) => $value !== null));
+    $trend[$name] = $values ? [
+      'first' => $values[0],
+      'last' => end($values),
+      'delta' => end($values) - $values[0],
+      'growing' => end($values) > $values[0],
+    ] : null;
+  }
+  $temps = array_values(array_filter(array_column($samples, 'temp'), fn($value) => $value !== null));
+  $trend['temperature'] = $temps ? ['min' => min($temps), 'max' => max($temps), 'last' => end($temps)] : null;
+  $health = array_values(array_filter(array_column($samples, 'health')));
+  $trend['health'] = $health ? ['', 'OK', 'POOR'][end($health)] : '';
+  return $trend;
+}
+
+function smart_history_sample_json($sample)
+{
+  return [
+    'time' => gmdate('c', $sample['time']),
+    'tier' => $sample['tier'],
+    'tempC' => $sample['temp'],
+    'pendingSectors' => $sample['pending'],
+    'offlineUncorrectable' => $sample['offline'],
+    'powerOnHours' => $sample['powerOn'],
+    'health' => ['', 'OK', 'POOR'][$sample['health']] ?? '',
+  ];
+}
+
+function smart_history_bays($map, $dir, $request)
+{
+  // Bay -> serial comes from the last written drivemap.json; `serial=` reads
+  // drives that are no longer mapped. Never runs smartctl or the generator.
+  $since = isset($request['since']) ? (int)$request['since'] : 0;
+  $targets = [];
+  foreach ($map['rows'] ?? [] as $row) {
+    foreach ($row as $slot) {
+      $serial = trim((string)($slot['serial'] ?? ''));
+      if ($serial === '' || (isset($request['bay']) && $slot['bay-id'] !== $request['bay'])) {
+        continue;
+      }
+      $targets[$slot['bay-id']] = $serial;
+    }
+  }
+  if (isset($request['serial'])) {
+    $targets = array_filter($targets, fn($serial) => $serial === (string)$request['serial']) ?: ['' => (string)$request['serial']];
+  }
+
+  $bays = [];
+  foreach ($targets as $bay_id => $serial) {
+    $samples = smart_history_load($dir, $serial, $since);
+    $bays[] = [
+      'bay-id' => $bay_id,
+      'serial' => $serial,
+      'trend' => smart_history_trend($samples),
+      'samples' => array_map('smart_history_sample_json', $samples),
+    ];
+  }
+  return ['bays' => $bays];
+}
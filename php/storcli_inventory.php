@@ -0,0 +1,238 @@
+<?php
+// Broadcom controller inventory shared by 45d-generate-vdev-id (9361 JBOD slot
+// -> DID tables) and 45d-generate-map (controller firmware/driver for the meta).
+// Each storcli binary runs `/call show all J` once (plus `/call show jbod J`
+// when that omits the JBOD setting) and the JSON is parsed here instead of
+// per-controller `storcli /cX show all J | jq` pipelines. Results
+// are cached per controller serial in /var/local/45d/storcli-inventory.json
+// until the MegaRAID controllers or their scsi by-path links change.
+require_once __DIR__ . '/host_io.php';
+require_once __DIR__ . '/file_io.php';
+
+function storcli_binaries()
+{
+  // 93xx/94xx cards answer to storcli64, 96xx cards to storcli2.
+  return [
+    'storcli64' => getenv('DRIVEMAP_STORCLI64') ?: '/opt/45drives/tools/storcli64',
+    'storcli2' => getenv('DRIVEMAP_STORCLI2') ?: '/opt/45drives/tools/storcli2',
+  ];
+}
+
+function storcli_cache_file()
+{
+  $base = getenv('DRIVEMAP_OUTPUT_DIR') ?: '/var/local/45d';
+  return getenv('DRIVEMAP_STORCLI_CACHE') ?: ($base . '/storcli-inventory.json');
+}
+
+function storcli_fixture($name)
+{
+  // DRIVEMAP_STORCLI_FIXTURE_DIR/<binary>.json stands in for `show all`,
+  // <binary>-jbod.json for `show jbod`.
+  $dir = getenv('DRIVEMAP_STORCLI_FIXTURE_DIR');
+  if (!$dir) {
+    return null;
+  }
+  $raw = @file_get_contents(rtrim($dir, '/') . '/' . $name . '.json');
+  return $raw === false ? '' : $raw;
+}
+
+function storcli_pci_address($raw)
+{
+  // storcli prints "00:31:00:00" (domain:bus:device:function); server_info
+  // and by-path links use "0000:31:00.0".
+  $parts = explode(':', trim((string)$raw));
+  if (count($parts) !== 4) {
+    return '';
+  }
+  return sprintf('%04x:%02x:%02x.%x', hexdec($parts[0]), hexdec($parts[1]), hexdec($parts[2]), hexdec($parts[3]));
+}
+
+function storcli_parse($json, $binary)
+{
+  $decoded = json_decode((string)$json, true);
+  $controllers = [];
+  foreach ($decoded['Controllers'] ?? [] as $entry) {
+    $data = $entry['Response Data'] ?? null;
+    if (!is_array($data) || ($entry['Command Status']['Status'] ?? '') !== 'Success') {
+      continue;
+    }
+    $basics = $data['Basics'] ?? [];
+    $version = $data['Version'] ?? [];
+    $pci = $basics['PCI Address'] ?? ($data['HostInterface']['PCI Address'] ?? '');
+    // "Enable JBOD" reflects the controller setting; an empty JBOD LIST only
+    // means no drives are attached yet. null: ask `show jbod` instead.
+    $jbod = $data['Capabilities']['Enable JBOD'] ?? null;
+    $slots = [];
+    foreach ($data['JBOD LIST'] ?? [] as $drive) {
+      [$enclosure, $slot] = array_pad(explode(':', (string)($drive['EID:Slt'] ?? '')), 2, '');
+      if ($slot === '' || !is_numeric($slot)) {
+        continue;
+      }
+      $slots[] = [
+        'enclosure' => $enclosure,
+        'slot' => (int)$slot,
+        'did' => (string)($drive['DID'] ?? ''),
+        'state' => (string)($drive['State'] ?? ''),
+      ];
+    }
+    $controllers[] = [
+      'controller' => (int)($basics['Controller'] ?? ($entry['Command Status']['Controller'] ?? 0)),
+      'binary' => $binary,
+      'model' => (string)($basics['Model'] ?? ''),
+      'serial' => trim((string)($basics['Serial Number'] ?? ($basics['SerialNumber'] ?? ''))),
+      'bus' => storcli_pci_address($pci),
+      'firmwareVersion' => (string)($version['Firmware Version'] ?? ''),
+      'driverName' => (string)($version['Driver Name'] ?? ''),
+      'driverVersion' => (string)($version['Driver Version'] ?? ''),
+      'jbod' => $jbod === null ? null : strcasecmp((string)$jbod, 'Yes') === 0,
+      'slots' => $slots,
+    ];
+  }
+  return $controllers;
+}
+
+function storcli_jbod_states($json)
+{
+  // Controller number -> JBOD property from `/call show jbod J`, the value
+  // dmap's check_jbod_enabled() reads; anything but OFF counts as enabled.
+  $decoded = json_decode((string)$json, true);
+  $states = [];
+  foreach ($decoded['Controllers'] ?? [] as $entry) {
+    $property = $entry['Response Data']['Controller Properties'][0] ?? null;
+    if (!is_array($property) || ($entry['Command Status']['Status'] ?? '') !== 'Success') {
+      continue;
+    }
+    $states[(int)($entry['Command Status']['Controller'] ?? 0)] = strtoupper((string)($property['Value'] ?? 'OFF')) !== 'OFF';
+  }
+  return $states;
+}
+
+function storcli_run($name, $binary, $command)
+{
+  $json = storcli_fixture($name);
+  if ($json !== null) {
+    return $json;
+  }
+  if (!host_is_executable($binary)) {
+    return '';
+  }
+  return host_exec(escapeshellarg($binary) . ' ' . $command . ' 2>/dev/null')['output'];
+}
+
+function storcli_fingerprint()
+{
+  // Broadcom (0x1000) PCI functions plus scsi by-path links: a card swap or
+  // a JBOD drive replacement (new DID) changes one of them.
+  $pci_root = rtrim(getenv('DRIVEMAP_PCI_DEVICES') ?: '/sys/bus/pci/devices', '/');
+  $by_path_root = rtrim(getenv('DRIVEMAP_BY_PATH_DIR') ?: '/dev/disk/by-path', '/');
+  $parts = [];
+  foreach (host_scandir($pci_root) ?: [] as $address) {
+    if (trim((string)host_read($pci_root . '/' . $address . '/vendor')) === '0x1000') {
+      $parts[] = $address . ' ' . trim((string)host_read($pci_root . '/' . $address . '/device'));
+    }
+  }
+  foreach (host_scandir($by_path_root) ?: [] as $name) {
+    if (strpos($name, '-scsi-') !== false) {
+      $parts[] = $name;
+    }
+  }
+  return sha1(implode("\n", $parts));
+}
+
+function storcli_inventory()
+{
+  // Controller serial -> parsed controller; built once per process.
+  static $inventory = null;
+  if ($inventory !== null) {
+    return $inventory;
+  }
+  $cache_file = storcli_cache_file();
+  // Unset or empty means a day; an explicit 0 runs storcli every time.
+  $ttl = getenv('DRIVEMAP_STORCLI_TTL');
+  $ttl = ($ttl === false || trim($ttl) === '') ? 86400 : max(0, (int)$ttl);
+  $fingerprint = storcli_fingerprint();
+  $cached = json_decode((string)@file_get_contents($cache_file), true);
+  if (is_array($cached) && ($cached['fingerprint'] ?? '') === $fingerprint && time() - (int)($cached['updated'] ?? 0) < $ttl) {
+    $inventory = $cached['controllers'] ?? [];
+    return $inventory;
+  }
+
+  $inventory = [];
+  foreach (storcli_binaries() as $name => $binary) {
+    $controllers = storcli_parse(storcli_run($name, $binary, '/call show all J'), $name);
+    if (in_array(null, array_column($controllers, 'jbod'), true)) {
+      // Firmware that leaves the setting out of `show all`. Like dmap, an
+      // unreadable property is taken as JBOD off.
+      $states = storcli_jbod_states(storcli_run($name . '-jbod', $binary, '/call show jbod J'));
+      foreach ($controllers as &$controller) {
+        $controller['jbod'] = $controller['jbod'] ?? ($states[$controller['controller']] ?? false);
+      }
+      unset($controller);
+    }
+    foreach ($controllers as $controller) {
+      $key = $controller['serial'] !== '' ? $controller['serial'] : $name . '/c' . $controller['controller'];
+      $inventory[$key] = $controller;
+    }
+  }
+
+  $payload = ['fingerprint' => $fingerprint, 'updated' => time(), 'controllers' => $inventory];
+  @mkdir(dirname($cache_file), 0755, true);
+  write_file_atomic($cache_file, json_encode($payload, JSON_PRETTY_PRINT | JSON_UNESCAPED_SLASHES));
+  return $inventory;
+}
+
+function storcli_controller_for_bus($bus)
+{
+  $bus = strtolower((string)$bus);
+  foreach (storcli_inventory() as $controller) {
+    if ($controller['bus'] === $bus || substr($controller['bus'], 5) === $bus) {
+      return $controller;
+    }
+  }
+  return null;
+}
+
+function storcli_hwraid_order($controller, $model, $alias_style)
+{
+  // Port of dmap hwraid_map(): JBOD slot -> DID (99 for an empty or unknown
+  // slot), then reordered by alias style. Returns null for unknown cards.
+  $port_counts = ['9361-16i' => 16, '9361-24i' => 24];
+  $style_order = [
+    'F8' => [3, 2, 1, 0, 7, 6, 5, 4, 19, 18, 17, 16, 15, 14, 13, 12, 11, 10, 9, 8, 23, 22, 21, 20],
+  ];
+  if (!isset($port_counts[$model])) {
+    return null;
+  }
+  $device_ids = array_fill(0, 24, '99');
+  foreach ($controller['slots'] ?? [] as $slot) {
+    if ($slot['slot'] < $port_counts[$model]) {
+      $device_ids[$slot['slot']] = $slot['did'];
+    }
+  }
+  $order = $style_order[$alias_style] ?? range(0, 23);
+  return array_map(fn($index) => $device_ids[$index], $order);
+}
+
+function storcli_fill_hba_versions($hbas)
+{
+  // Adds the firmware and driver versions server_identifier's getStorcliInfo
+  // would record to HBA entries that lack them. storcli only runs when such
+  // an entry exists and the cache is stale.
+  $models = ['SAS9305-16i', 'SAS9305-24i', 'HBA 9405W-16i', 'HBA 9400-16i', '9600-24i', '9600-16i', '9660-16i', '9361-16i', '9361-24i'];
+  foreach ($hbas as &$hba) {
+    if (!is_array($hba) || !in_array($hba['Model'] ?? '', $models, true) || !empty($hba['Firmware Version'])) {
+      continue;
+    }
+    $controller = storcli_controller_for_bus($hba['Bus Address'] ?? '');
+    if ($controller === null) {
+      continue;
+    }
+    foreach (['Firmware Version' => 'firmwareVersion', 'Driver Version' => 'driverVersion', 'Driver Name' => 'driverName'] as $field => $key) {
+      if (empty($hba[$field]) && $controller[$key] !== '') {
+        $hba[$field] = $controller[$key];
+      }
+    }
+  }
+  unset($hba);
+  return $hbas;
+}
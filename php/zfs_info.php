@@ -1,6 +1,10 @@
 <?php
 // ZFS collector used by api.php?action=zfs_info.
 // Supports fixture overrides so tests can run on hosts without ZFS binaries.
+require_once __DIR__ . '/host_io.php';
+require_once __DIR__ . '/file_io.php';
+require_once __DIR__ . '/histogram.php';
+
 function zfs_fixture_dir()
 {
   $dir = getenv('DRIVEMAP_ZFS_FIXTURE_DIR');
@@ -25,17 +29,63 @@ function read_fixture($name)
   return null;
 }
 
+function zfs_command_timings($entry = null, $collect = null)
+{
+  // Log of external commands (and fixture reads standing in for them) with
+  // wall time, reported in generate_zfs_info()['timings']. Entries are only
+  // kept while a collection runs, so 45d-zfs-sampler's endless iostat calls
+  // never grow it. $collect true starts a fresh log, false ends it; both
+  // return what had been recorded.
+  static $entries = null;
+  if ($collect !== null) {
+    $recorded = $entries ?? [];
+    $entries = $collect ? [] : null;
+    return $recorded;
+  }
+  if ($entry !== null && $entries !== null) {
+    $entries[] = $entry;
+  }
+  return $entries ?? [];
+}
+
+function record_zfs_command($command, $started, $source)
+{
+  zfs_command_timings([
+    'command' => trim(str_replace('2>/dev/null', '', $command)),
+    'seconds' => round(microtime(true) - $started, 4),
+    'source' => $source,
+  ]);
+}
+
 function command_output($command, $fixture_name = '')
 {
   // Fixtures take precedence over command execution when provided.
+  $started = microtime(true);
   if ($fixture_name !== '') {
     $fixture = read_fixture($fixture_name);
     if ($fixture !== null) {
+      record_zfs_command($command, $started, 'fixture');
       return $fixture;
     }
   }
-  $output = shell_exec($command);
-  return $output === null ? '' : $output;
+  $output = host_exec($command)['output'];
+  record_zfs_command($command, $started, host_io_mode()[0] === 'replay' ? 'replay' : 'exec');
+  return $output;
+}
+
+function zfs_batch_output($command, $fixture_name)
+{
+  // Batched all-pool commands. In fixture mode a missing fixture means the
+  // form is unavailable, so callers fall back instead of running commands.
+  if (zfs_fixture_dir() !== '') {
+    $started = microtime(true);
+    $fixture = read_fixture($fixture_name);
+    if ($fixture !== null) {
+      record_zfs_command($command, $started, 'fixture');
+    }
+    return $fixture ?? '';
+  }
+  return command_output($command . ' 2>/dev/null');
 }
 
 function zfs_installed()
@@ -49,7 +99,9 @@ function zfs_installed()
 
 function get_zfs_list()
 {
-  $output = command_output('zfs list -H', 'zfs_list.txt');
+  // Keyed by pool name. -d 0 limits the listing to pool root datasets; the
+  // name filter below still guards fixtures captured from a full `zfs list`.
+  $output = command_output('zfs list -H -d 0 -o name,used,avail,refer,mountpoint', 'zfs_list.txt');
   if ($output === '') {
     return [];
   }
@@ -67,7 +119,7 @@ function get_zfs_list()
     if ($name === '' || strpos($name, '/') !== false || strpos($name, '@') !== false) {
       continue;
     }
-    $zpools[] = [
+    $zpools[$name] = [
       'name' => $name,
       'used' => $parts[1] ?? '-',
       'avail' => $parts[2] ?? '-',
@@ -113,15 +165,13 @@ function get_zpool_list()
 
   $zfs_list = get_zfs_list();
   foreach ($zpools as &$pool) {
-    foreach ($zfs_list as $entry) {
-      if ($entry['name'] === $pool['name']) {
-        $pool['used'] = $entry['used'];
-        $pool['avail'] = $entry['avail'];
-        $pool['refer'] = $entry['refer'];
-        $pool['mountpoint'] = $entry['mountpoint'];
-      }
-    }
-    if (!isset($pool['used'])) {
+    if (isset($zfs_list[$pool['name']])) {
+      $entry = $zfs_list[$pool['name']];
+      $pool['used'] = $entry['used'];
+      $pool['avail'] = $entry['avail'];
+      $pool['refer'] = $entry['refer'];
+      $pool['mountpoint'] = $entry['mountpoint'];
+    } else {
       $pool['used'] = '-';
       $pool['avail'] = '-';
       $pool['refer'] = '-';
@@ -133,8 +183,54 @@ function get_zpool_list()
   return $zpools;
 }
 
+function split_zpool_status($output)
+{
+  // `zpool status` for all pools prints one "pool:" block per pool.
+  $blocks = [];
+  foreach (preg_split('/^(?=[ \t]*pool:\s)/m', (string)$output) as $block) {
+    if (preg_match('/^[ \t]*pool:\s+(\S+)/', $block, $match)) {
+      $blocks[$match[1]] = $block;
+    }
+  }
+  return $blocks;
+}
+
+function split_zpool_iostat($output)
+{
+  // `zpool iostat -v` for all pools is one table. Each pool starts at a
+  // column-0 row; allocation-class labels (logs/cache/...) stay with the pool
+  // above them and header/separator rows are dropped.
+  $labels = ['logs', 'cache', 'spares', 'dedup', 'special'];
+  $blocks = [];
+  $current = null;
+  foreach (preg_split('/\r?\n/', (string)$output) as $line) {
+    if (trim($line) === '' || $line[0] === '-' || preg_match('/^(\s+capacity\s|pool\s+alloc\s)/', $line)) {
+      continue;
+    }
+    $name = strtok($line, " \t");
+    if ($line[0] !== ' ' && !in_array($name, $labels, true)) {
+      $current = $name;
+      $blocks[$current] = '';
+    }
+    if ($current !== null) {
+      $blocks[$current] .= $line . "\n";
+    }
+  }
+  return $blocks;
+}
+
 function zpool_status_output($pool_name, $path_flag)
 {
+  static $batched = [];
+  $key = $path_flag ? 'path' : 'default';
+  if (!isset($batched[$key])) {
+    $command = $path_flag ? 'zpool status -P' : 'zpool status';
+    $batched[$key] = split_zpool_status(zfs_batch_output($command, $path_flag ? 'zpool_status_path.txt' : 'zpool_status.txt'));
+  }
+  if (isset($batched[$key][$pool_name])) {
+    return $batched[$key][$pool_name];
+  }
+
   $fixture = $path_flag ? 'zpool_status_path_' . $pool_name . '.txt' : 'zpool_status_' . $pool_name . '.txt';
   $command = $path_flag ? ('zpool status -P ' . escapeshellarg($pool_name)) : ('zpool status ' . escapeshellarg($pool_name));
   return command_output($command, $fixture);
@@ -142,6 +238,17 @@ function zpool_status_output($pool_name, $path_flag)
 
 function zpool_iostat_output($pool_name, $path_flag)
 {
+  static $batched = [];
+  $key = $path_flag ? 'path' : 'default';
+  if (!isset($batched[$key])) {
+    $command = $path_flag ? 'zpool iostat -vP' : 'zpool iostat -v';
+    $output = zfs_batch_output($command, $path_flag ? 'zpool_iostat_path.txt' : 'zpool_iostat.txt');
+    $batched[$key] = split_zpool_iostat($output);
+  }
+  if (isset($batched[$key][$pool_name])) {
+    return $batched[$key][$pool_name];
+  }
+
   $fixture = $path_flag ? 'zpool_iostat_path_' . $pool_name . '.txt' : 'zpool_iostat_' . $pool_name . '.txt';
   $command = $path_flag ? ('zpool iostat -vP ' . escapeshellarg($pool_name)) : ('zpool iostat -v ' . escapeshellarg($pool_name));
   return command_output($command, $fixture);
@@ -310,21 +417,28 @@ function verify_zfs_device_format($status_obj, $pool_name)
       return !preg_match('/^(\d+-\d+)(?:-part[0-9])/', $name);
     }));
 
-    $alert[] = "ZFS status displayed by this module for zpool '$pool_name' may be incomplete.\n\n";
-    $alert[] = "This module can only display zfs status information for devices that are created using a device alias.\n\n";
-    $alert[] = "This can be done using the 45Drives cockpit-zfs-manager package:\nhttps://github.com/45Drives/cockpit-zfs-manager/releases/\n\n";
-    if ($filtered) {
-      $alert[] = "The following zfs devices do not conform:\n";
-      foreach ($filtered as $disk) {
-        $alert[] = "\t  $disk\n";
-      }
-    }
-    $alert[] = "\n";
+    $alert = zfs_device_format_alert($pool_name, $filtered);
   }
 
   return $alert;
 }
 
+function zfs_device_format_alert($pool_name, $filtered)
+{
+  $alert = [];
+  $alert[] = "ZFS status displayed by this module for zpool '$pool_name' may be incomplete.\n\n";
+  $alert[] = "This module can only display zfs status information for devices that are created using a device alias.\n\n";
+  $alert[] = "This can be done using the 45Drives cockpit-zfs-manager package:\nhttps://github.com/45Drives/cockpit-zfs-manager/releases/\n\n";
+  if ($filtered) {
+    $alert[] = "The following zfs devices do not conform:\n";
+    foreach ($filtered as $disk) {
+      $alert[] = "\t  $disk\n";
+    }
+  }
+  $alert[] = "\n";
+  return $alert;
+}
+
 function zpool_iostat_parse($iostat_obj, $key, $pool_name)
 {
   if (!isset($iostat_obj[$key])) {
@@ -419,14 +533,374 @@ function zpool_iostat_parse($iostat_obj, $key, $pool_name)
   return [$vdevs, $disks, $counts];
 }
 
+function zfs_nicenum($value)
+{
+  // Same rounding as zfs_nicenum() in OpenZFS, so exact (-p) values render
+  // like the human-readable columns the UI already shows.
+  if (!is_numeric($value)) {
+    return (string)$value;
+  }
+  $num = (float)$value;
+  $units = ['', 'K', 'M', 'G', 'T', 'P', 'E'];
+  $index = 0;
+  $scaled = $num;
+  while ($scaled >= 1024 && $index < 6) {
+    $scaled = floor($scaled / 1024);
+    $index++;
+  }
+  if ($index === 0) {
+    return (string)(int)$num;
+  }
+  $divisor = pow(1024, $index);
+  if (fmod($num, $divisor) == 0) {
+    return sprintf('%d%s', $num / $divisor, $units[$index]);
+  }
+  $text = '';
+  foreach ([2, 1, 0] as $precision) {
+    $text = sprintf('%.' . $precision . 'f%s', $num / $divisor, $units[$index]);
+    if (strlen($text) <= 5) {
+      break;
+    }
+  }
+  return $text;
+}
+
+function zpool_status_json()
+{
+  // OpenZFS 2.3+ emits every pool's vdev tree in one `zpool status -j` call.
+  // Returns null on older releases so callers use the text parsers.
+  $data = json_decode(zfs_batch_output('zpool status -j', 'zpool_status.json'), true);
+  if (!is_array($data) || !isset($data['pools']) || !is_array($data['pools'])) {
+    return null;
+  }
+  return $data['pools'];
+}
+
+function iostat_stats_row($parts)
+{
+  return [
+    'alloc' => zfs_nicenum($parts[1] ?? '-'),
+    'free' => zfs_nicenum($parts[2] ?? '-'),
+    'read_ops' => zfs_nicenum($parts[3] ?? '-'),
+    'write_ops' => zfs_nicenum($parts[4] ?? '-'),
+    'read_bw' => zfs_nicenum($parts[5] ?? '-'),
+    'write_bw' => zfs_nicenum($parts[6] ?? '-'),
+  ];
+}
+
+function parse_scripted_iostat($output, $pool_names)
+{
+  // [pool => [vdev name => raw columns]] from `zpool iostat -Hpv` output.
+  // Scripted mode drops indentation, so a row naming a pool starts its block.
+  $rows = [];
+  $current = null;
+  foreach (preg_split('/\r?\n/', trim((string)$output)) as $line) {
+    $parts = explode("\t", $line);
+    if (count($parts) < 7) {
+      continue;
+    }
+    if (in_array($parts[0], $pool_names, true)) {
+      $current = $parts[0];
+    }
+    if ($current !== null) {
+      $rows[$current][zfs_disk_name($parts[0])] = $parts;
+    }
+  }
+  return $rows;
+}
+
+function zpool_names()
+{
+  $names = [];
+  $output = command_output('zpool list -H -o name', 'zpool_list.txt');
+  foreach (preg_split('/\r?\n/', trim($output)) as $line) {
+    $name = trim(explode("\t", $line)[0]);
+    if ($name !== '') {
+      $names[] = $name;
+    }
+  }
+  return $names;
+}
+
+function zpool_iostat_index($pool_names)
+{
+  // [pool => [vdev name => stats]] from one scripted, exact-value iostat run.
+  $index = [];
+  $output = zfs_batch_output('zpool iostat -Hpv', 'zpool_iostat_scripted.txt');
+  foreach (parse_scripted_iostat($output, $pool_names) as $pool_name => $rows) {
+    foreach ($rows as $name => $parts) {
+      $index[$pool_name][$name] = iostat_stats_row($parts);
+    }
+  }
+
+  foreach ($pool_names as $pool_name) {
+    if (isset($index[$pool_name])) {
+      continue;
+    }
+    // No scripted output for this pool: index the text table instead.
+    $index[$pool_name] = [];
+    foreach (preg_split('/\r?\n/', zpool_iostat_output($pool_name, false)) as $line) {
+      $parts = preg_split('/\s+/', trim($line));
+      if (count($parts) === 7) {
+        $index[$pool_name][zfs_disk_name($parts[0])] = iostat_stats_row($parts);
+      }
+    }
+  }
+  return $index;
+}
+
+function zfs_json_is_leaf($vdev)
+{
+  // Devices are vdev_type disk or file; mirror, raidz, draid, spare and
+  // replacing are groupings. Older output without vdev_type falls back to
+  // whether the entry has children.
+  $type = (string)($vdev['vdev_type'] ?? '');
+  if ($type !== '') {
+    return in_array($type, ['disk', 'file'], true);
+  }
+  return empty($vdev['vdevs']) || !is_array($vdev['vdevs']);
+}
+
+function zfs_json_leaves($vdev)
+{
+  if (zfs_json_is_leaf($vdev) || !is_array($vdev['vdevs'] ?? null)) {
+    return [$vdev];
+  }
+  $leaves = [];
+  foreach ($vdev['vdevs'] as $child) {
+    $leaves = array_merge($leaves, zfs_json_leaves($child));
+  }
+  return $leaves;
+}
+
+function zfs_json_top_vdevs($pool_json)
+{
+  // Top-level vdevs sit under the root vdev; dedup, special, log and cache
+  // vdevs are listed beside it in the order `zpool status` prints them and
+  // are reported as vdevs, matching the text parser. Spares are skipped like
+  // their AVAIL lines there.
+  $vdevs = $pool_json['vdevs'] ?? [];
+  $root = is_array($vdevs) ? reset($vdevs) : false;
+  $top = is_array($root) && ($root['vdev_type'] ?? '') === 'root' ? ($root['vdevs'] ?? []) : $vdevs;
+  $top = is_array($top) ? array_values($top) : [];
+  $seen = array_flip(array_map(fn($vdev) => (string)($vdev['name'] ?? ''), $top));
+  foreach (['dedup', 'special', 'logs', 'l2cache'] as $section) {
+    foreach (is_array($pool_json[$section] ?? null) ? $pool_json[$section] : [] as $vdev) {
+      if (is_array($vdev) && !isset($seen[(string)($vdev['name'] ?? '')])) {
+        $top[] = $vdev;
+      }
+    }
+  }
+  return $top;
+}
+
+function zfs_disk_name($name)
+{
+  if (preg_match('/^(\d+-\d+)(?:-part[0-9])/', $name, $match)) {
+    return $match[1];
+  }
+  return $name;
+}
+
+function zpool_json_vdevs($pool_json, $pool_name, $iostat)
+{
+  $vdevs = [];
+  $blank = ['alloc' => '-', 'free' => '-', 'read_ops' => '-', 'write_ops' => '-', 'read_bw' => '-', 'write_bw' => '-'];
+  foreach (zfs_json_top_vdevs($pool_json) as $top) {
+    $name = (string)($top['name'] ?? '');
+    $is_disk = zfs_json_is_leaf($top);
+    $vdev = [
+      'tag' => $pool_name,
+      'name' => $name,
+      'state' => $top['state'] ?? 'UNKNOWN',
+      'read_errors' => (string)($top['read_errors'] ?? '0'),
+      'write_errors' => (string)($top['write_errors'] ?? '0'),
+      'checksum_errors' => (string)($top['checksum_errors'] ?? '0'),
+      'raid_level' => $is_disk ? 'Disk' : $name,
+    ];
+    $vdev += $iostat[$name] ?? $blank;
+    $vdev['disks'] = [];
+    foreach (zfs_json_leaves($top) as $leaf) {
+      $leaf_name = (string)($leaf['name'] ?? '');
+      $disk = [
+        'tag' => $pool_name,
+        'name' => zfs_disk_name($leaf_name),
+        'state' => $leaf['state'] ?? 'UNKNOWN',
+        'read_errors' => (string)($leaf['read_errors'] ?? '0'),
+        'write_errors' => (string)($leaf['write_errors'] ?? '0'),
+        'checksum_errors' => (string)($leaf['checksum_errors'] ?? '0'),
+      ];
+      $disk += $iostat[zfs_disk_name($leaf_name)] ?? $blank;
+      $disk['vdev_idx'] = count($vdevs);
+      $vdev['disks'][] = $disk;
+    }
+    $vdevs[] = $vdev;
+  }
+  return $vdevs;
+}
+
+function verify_zfs_json_device_format($pool_json, $pool_name)
+{
+  $unsupported = [];
+  foreach (zfs_json_top_vdevs($pool_json) as $top) {
+    foreach (zfs_json_leaves($top) as $leaf) {
+      $name = (string)($leaf['name'] ?? '');
+      if (!preg_match('/^\d+-\d+(?:-part[0-9]+)?$/', $name)) {
+        $unsupported[] = $name;
+      }
+    }
+  }
+  return $unsupported ? zfs_device_format_alert($pool_name, $unsupported) : [];
+}
+
+function zfs_iostat_ring_file()
+{
+  $dir = getenv('DRIVEMAP_OUTPUT_DIR') ?: '/var/local/45d';
+  return getenv('DRIVEMAP_ZFS_IOSTAT_RING') ?: ($dir . '/zfs-iostat.json');
+}
+
+function load_iostat_ring($path)
+{
+  $data = is_file($path) ? json_decode((string)@file_get_contents($path), true) : null;
+  return is_array($data) && isset($data['samples']) && is_array($data['samples']) ? $data : null;
+}
+
+function append_iostat_sample($ring, $rows, $interval, $capacity, $now)
+{
+  // Fixed-size ring: slot `next` is overwritten once the window is full.
+  // Rows hold raw [alloc, free, read_ops, write_ops, read_bw, write_bw].
+  if (!is_array($ring) || ($ring['capacity'] ?? 0) !== $capacity || ($ring['interval'] ?? 0) !== $interval) {
+    $ring = ['interval' => $interval, 'capacity' => $capacity, 'next' => 0, 'samples' => []];
+  }
+  $sample = ['time' => $now, 'pools' => []];
+  foreach ($rows as $pool_name => $pool_rows) {
+    foreach ($pool_rows as $name => $parts) {
+      $sample['pools'][$pool_name][$name] = array_map(function ($value) {
+        return is_numeric($value) ? $value + 0 : null;
+      }, array_slice($parts, 1, 6));
+    }
+  }
+  $ring['samples'][$ring['next']] = $sample;
+  $ring['next'] = ($ring['next'] + 1) % $capacity;
+  $ring['updated'] = $now;
+  return $ring;
+}
+
+function iostat_ring_index($ring, $now)
+{
+  // [pool => [vdev name => stats]] from the sampler's ring buffer: current
+  // rates from the newest sample plus min/avg/max over the whole window.
+  // Returns null when the sampler is not running so callers fork iostat.
+  if (!is_array($ring) || !$ring['samples']) {
+    return null;
+  }
+  $interval = max(1, (int)($ring['interval'] ?? 5));
+  if (($ring['updated'] ?? 0) < $now - max(15, 3 * $interval)) {
+    return null;
+  }
+  // Oldest sample first: once the ring has wrapped it starts at `next`.
+  $next = (int)($ring['next'] ?? 0);
+  $samples = array_merge(array_slice($ring['samples'], $next), array_slice($ring['samples'], 0, $next));
+  $latest = end($samples);
+  $metrics = ['read_ops' => 2, 'write_ops' => 3, 'read_bw' => 4, 'write_bw' => 5];
+
+  $index = [];
+  foreach ($latest['pools'] ?? [] as $pool_name => $pool_rows) {
+    foreach ($pool_rows as $name => $values) {
+      $stats = iostat_stats_row(array_merge([$name], $values));
+      $window = ['seconds' => count($samples) * $interval, 'samples' => 0];
+      $series = [];
+      foreach ($samples as $sample) {
+        $row = $sample['pools'][$pool_name][$name] ?? null;
+        if ($row === null) {
+          continue;
+        }
+        $window['samples']++;
+        foreach ($metrics as $metric => $column) {
+          if ($row[$column] !== null) {
+            $series[$metric][] = $row[$column];
+          }
+        }
+      }
+      foreach ($metrics as $metric => $column) {
+        $values_in_window = $series[$metric] ?? [];
+        $window[$metric] = $values_in_window ? [
+          'min' => min($values_in_window),
+          'avg' => round(array_sum($values_in_window) / count($values_in_window), 2),
+          'max' => max($values_in_window),
+        ] : null;
+      }
+      $stats['window'] = $window;
+      $index[$pool_name][$name] = $stats;
+    }
+  }
+  return $index;
+}
+
+function zpool_iostat_from_index($status_vdevs, $status_disks, $status_counts, $iostat)
+{
+  // Text-status counterpart of zpool_iostat_parse() that takes stats from an
+  // indexed source instead of forking `zpool iostat -v`/`-vP`.
+  $blank = ['alloc' => '-', 'free' => '-', 'read_ops' => '-', 'write_ops' => '-', 'read_bw' => '-', 'write_bw' => '-'];
+  $disk_names = array_flip(array_column($status_disks, 'name'));
+  $vdevs = [];
+  foreach ($status_vdevs as $vdev) {
+    $row = $iostat[$vdev['name']] ?? $blank;
+    $row['raid_level'] = isset($disk_names[$vdev['name']]) ? 'Disk' : $vdev['name'];
+    $vdevs[] = $row;
+  }
+  $disks = [];
+  foreach ($status_disks as $disk) {
+    $disks[] = $iostat[$disk['name']] ?? $blank;
+  }
+  return [$vdevs, $disks, $status_counts];
+}
+
+function zfs_stats_file()
+{
+  $dir = getenv('DRIVEMAP_OUTPUT_DIR') ?: '/var/local/45d';
+  return getenv('DRIVEMAP_ZFS_STATS_FILE') ?: ($dir . '/zfs-stats.json');
+}
+
+function record_zfs_info_stats($path, $timings)
+{
+  // zfs_info runs per request, so concurrent reads serialize on a lock file
+  // around the read-modify-write of the rolling stats.
+  $lock = @fopen($path . '.lock', 'c');
+  if (!$lock || !flock($lock, LOCK_EX)) {
+    return false;
+  }
+  $stats = is_file($path) ? json_decode((string)@file_get_contents($path), true) : null;
+  if (!is_array($stats)) {
+    $stats = [];
+  }
+  $stats['last'] = ['time' => time()] + $timings;
+  $stats['histograms']['zfs_info_seconds'] = observe_histogram($stats['histograms']['zfs_info_seconds'] ?? null, [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10], $timings['total']);
+  $ok = write_file_atomic($path, json_encode($stats, JSON_UNESCAPED_SLASHES));
+  flock($lock, LOCK_UN);
+  fclose($lock);
+  return $ok;
+}
+
+function zfs_info_timings($started)
+{
+  return [
+    'total' => round(microtime(true) - $started, 4),
+    'commands' => zfs_command_timings(null, false),
+  ];
+}
+
 function generate_zfs_info()
 {
+  $started = microtime(true);
+  zfs_command_timings(null, true);
   // Keep response shape stable regardless of ZFS availability.
   $json_zfs = [
     'zfs_installed' => false,
   ];
 
   if (!zfs_installed()) {
+    $json_zfs['timings'] = zfs_info_timings($started);
     return $json_zfs;
   }
 
@@ -434,9 +908,37 @@ function generate_zfs_info()
   $json_zfs['zpools'] = get_zpool_list();
   $json_zfs['warnings'] = [];
 
+  // One batched collection pass: JSON status plus scripted iostat for every
+  // pool. Pools missing from the JSON fall through to the text parsers.
+  $status_json = zpool_status_json();
+  // A running 45d-zfs-sampler supplies interval rates, so reads never fork
+  // `zpool iostat` (whose own numbers are averages since import).
+  $ring = load_iostat_ring(zfs_iostat_ring_file());
+  $iostat_index = iostat_ring_index($ring, time());
+  $use_ring = $iostat_index !== null;
+  $json_zfs['iostat'] = [
+    'source' => $use_ring ? 'sampler' : 'zpool',
+    'interval' => $use_ring ? (int)$ring['interval'] : null,
+    'updated' => $use_ring ? gmdate('c', (int)$ring['updated']) : null,
+  ];
+
   foreach ($json_zfs['zpools'] as &$pool) {
+    if ($status_json !== null && isset($status_json[$pool['name']])) {
+      if ($iostat_index === null) {
+        $iostat_index = zpool_iostat_index(array_column($json_zfs['zpools'], 'name'));
+      }
+      $pool_json = $status_json[$pool['name']];
+      $pool['state'] = $pool_json['state'] ?? 'UNKNOWN';
+      $pool['vdevs'] = zpool_json_vdevs($pool_json, $pool['name'], $iostat_index[$pool['name']] ?? []);
+      $alerts = verify_zfs_json_device_format($pool_json, $pool['name']);
+      if ($alerts) {
+        $json_zfs['warnings'] = array_merge($json_zfs['warnings'], $alerts);
+      }
+      continue;
+    }
+
     $status_output = zpool_status($pool['name']);
-    $iostat_output = zpool_iostat($pool['name']);
+    $iostat_output = $use_ring ? [] : zpool_iostat($pool['name']);
     $pool['state'] = $status_output['state'] ?? 'UNKNOWN';
     $pool['vdevs'] = [];
 
@@ -446,11 +948,15 @@ function generate_zfs_info()
     }
 
     foreach ($status_output as $key => $value) {
-      if (!isset($iostat_output[$key])) {
+      if ($use_ring ? $key !== $pool['name'] : !isset($iostat_output[$key])) {
         continue;
       }
       [$status_vdevs, $status_disks, $status_counts] = zpool_status_parse($status_output, $key, $pool['name']);
-      [$iostat_vdevs, $iostat_disks, $iostat_counts] = zpool_iostat_parse($iostat_output, $key, $pool['name']);
+      if ($use_ring) {
+        [$iostat_vdevs, $iostat_disks, $iostat_counts] = zpool_iostat_from_index($status_vdevs, $status_disks, $status_counts, $iostat_index[$pool['name']] ?? []);
+      } else {
+        [$iostat_vdevs, $iostat_disks, $iostat_counts] = zpool_iostat_parse($iostat_output, $key, $pool['name']);
+      }
 
       if (!$status_disks || !$iostat_disks || !$status_counts || !$iostat_counts) {
         continue;
@@ -466,6 +972,9 @@ function generate_zfs_info()
         $status_vdevs[$i]['write_ops'] = $iostat_vdevs[$i]['write_ops'] ?? '-';
         $status_vdevs[$i]['read_bw'] = $iostat_vdevs[$i]['read_bw'] ?? '-';
         $status_vdevs[$i]['write_bw'] = $iostat_vdevs[$i]['write_bw'] ?? '-';
+        if (isset($iostat_vdevs[$i]['window'])) {
+          $status_vdevs[$i]['window'] = $iostat_vdevs[$i]['window'];
+        }
         $status_vdevs[$i]['disks'] = [];
 
         $limit = $status_counts[$i] ?? 0;
@@ -476,6 +985,9 @@ function generate_zfs_info()
           $status_disks[$j]['write_ops'] = $iostat_disks[$j]['write_ops'] ?? '-';
           $status_disks[$j]['read_bw'] = $iostat_disks[$j]['read_bw'] ?? '-';
           $status_disks[$j]['write_bw'] = $iostat_disks[$j]['write_bw'] ?? '-';
+          if (isset($iostat_disks[$j]['window'])) {
+            $status_disks[$j]['window'] = $iostat_disks[$j]['window'];
+          }
           $status_disks[$j]['vdev_idx'] = count($pool['vdevs']);
           $status_vdevs[$i]['disks'][] = $status_disks[$j];
         }
@@ -522,10 +1034,14 @@ function generate_zfs_info()
           'checksum_errors' => $disk['checksum_errors'] ?? '0',
           'tag' => $disk['tag'] ?? $pool['name'],
         ];
+        if (isset($disk['window'])) {
+          $disk_entries[$disk['name']]['window'] = $disk['window'];
+        }
       }
     }
   }
   $json_zfs['zfs_disks'] = $disk_entries;
+  $json_zfs['timings'] = zfs_info_timings($started);
 
   return $json_zfs;
 }
@@ -0,0 +1,428 @@
+<?php
+// Benchmark harness: builds synthetic fixture sets at increasing bay counts and
+// times the generator, every api.php action and generate_zfs_info().
+//
+// Usage: php tests/bench.php [--bays=15,30,45,60,120,240] [--iterations=5]
+//                            [--case=storinator_xl60] [--output=bench.json]
+//
+// Layouts come from the vendor dmap CASES (tests/vendor_dmap_case.py), which
+// resolve to the chassis row templates in 45d-generate-map. Bay counts no
+// single case covers are built by tiling the largest case that divides them.
+$root = dirname(__DIR__);
+$fixtures = __DIR__ . '/fixtures';
+$map_script = $root . '/scripts/45d-generate-map';
+$api_script = $root . '/php/api.php';
+$zfs_script = $root . '/php/zfs_info.php';
+$case_script = __DIR__ . '/vendor_dmap_case.py';
+$vendor_dmap = $root . '/vendor/45drives/tools/tools/dmap';
+
+$cli_opts = getopt('', ['bays:', 'iterations:', 'case:', 'output:', 'keep']);
+$scales = array_values(array_filter(array_map('intval', explode(',', (string)($cli_opts['bays'] ?? '15,30,45,60,120,240')))));
+$iterations = max(1, (int)($cli_opts['iterations'] ?? 5));
+$forced_case = (string)($cli_opts['case'] ?? '');
+$output_path = (string)($cli_opts['output'] ?? '');
+$keep_fixtures = isset($cli_opts['keep']);
+
+// Read from api.php's dispatch so actions added there are timed too.
+preg_match_all('/\\$action === \'([a-z_]+)\'/', (string)file_get_contents($api_script), $action_matches);
+$api_actions = array_values(array_unique($action_matches[1]));
+$cleanup_dirs = [];
+
+function ensure_dir($path)
+{
+  if (!is_dir($path)) {
+    mkdir($path, 0755, true);
+  }
+}
+
+function rrmdir($dir)
+{
+  if (!is_dir($dir) || is_link($dir)) {
+    @unlink($dir);
+    return;
+  }
+  foreach (scandir($dir) as $item) {
+    if ($item === '.' || $item === '..') {
+      continue;
+    }
+    rrmdir($dir . '/' . $item);
+  }
+  @rmdir($dir);
+}
+
+function case_command($case_script, $vendor_dmap, $args)
+{
+  $cmd = 'python3 ' . escapeshellarg($case_script);
+  foreach ($args as $arg) {
+    $cmd .= ' ' . escapeshellarg($arg);
+  }
+  $output = [];
+  $code = 0;
+  exec($cmd . ' 2>/dev/null', $output, $code);
+  if ($code !== 0) {
+    return null;
+  }
+  return json_decode(implode("\n", $output), true);
+}
+
+function load_case_layouts($case_script, $vendor_dmap, $forced_case)
+{
+  // Alias lines and server_info for each vendor dmap case, keyed by bay count.
+  $args = [$vendor_dmap, '--batch', '--jobs', '4'];
+  if ($forced_case !== '') {
+    $args[] = $forced_case;
+  }
+  $batch = case_command($case_script, $vendor_dmap, $args);
+  $layouts = [];
+  foreach (is_array($batch) ? $batch : [] as $name => $result) {
+    if (!is_array($result['aliases'] ?? null) || !is_array($result['server'] ?? null)) {
+      continue;
+    }
+    $aliases = [];
+    foreach ($result['aliases'] as $line) {
+      if (preg_match('/^alias\s+(\d+-\d+)\s+(\S+)/', (string)$line, $match)) {
+        $aliases[$match[1]] = basename($match[2]);
+      }
+    }
+    $count = count($aliases);
+    if ($count > 0 && !isset($layouts[$count])) {
+      $layouts[$count] = ['case' => $name, 'aliases' => $aliases, 'server' => $result['server']];
+    }
+  }
+  krsort($layouts);
+  return $layouts;
+}
+
+function layout_for_scale($layouts, $bays)
+{
+  if (isset($layouts[$bays])) {
+    return $layouts[$bays] + ['tiles' => 1];
+  }
+  foreach ($layouts as $count => $layout) {
+    if ($count > 0 && $bays % $count === 0) {
+      return tile_layout($layout, intdiv($bays, $count));
+    }
+  }
+  return null;
+}
+
+function tile_layout($layout, $tiles)
+{
+  // Repeat a chassis as if several HBA sets were attached: cards are renumbered
+  // and by-path names move to a new PCI domain per tile.
+  $max_card = 0;
+  foreach (array_keys($layout['aliases']) as $bay_id) {
+    $max_card = max($max_card, (int)explode('-', $bay_id, 2)[0]);
+  }
+  $aliases = [];
+  for ($tile = 0; $tile < $tiles; $tile++) {
+    foreach ($layout['aliases'] as $bay_id => $path) {
+      [$card, $drive] = explode('-', $bay_id, 2);
+      $tiled_path = preg_replace('/^pci-[0-9a-f]{4}:/', sprintf('pci-%04x:', $tile), $path);
+      $aliases[((int)$card + $tile * $max_card) . '-' . $drive] = $tiled_path;
+    }
+  }
+  return [
+    'case' => $layout['case'] . ' x' . $tiles,
+    'aliases' => $aliases,
+    'server' => $layout['server'],
+    'tiles' => $tiles,
+  ];
+}
+
+function bench_dev_name($index)
+{
+  // 0 -> sda, 25 -> sdz, 26 -> sdaa, like the kernel's sd naming.
+  $name = '';
+  $index++;
+  while ($index > 0) {
+    $index--;
+    $name = chr(ord('a') + $index % 26) . $name;
+    $index = intdiv($index, 26);
+  }
+  return 'sd' . $name;
+}
+
+function write_zfs_fixtures($dir, $bay_ids, $paths)
+{
+  // One pool per 60 bays, raidz2 vdevs of up to 15 disks, in both the plain
+  // and -P forms so the batched text parsers see the full multi-pool tables.
+  ensure_dir($dir);
+  $pools = array_chunk($bay_ids, 60);
+  $zpool_list = $zfs_list = '';
+  $status = $status_path = '';
+  $rule = str_repeat('-', 37) . '  -----  -----  -----  -----  -----  -----';
+  $header = str_repeat(' ', 41) . "capacity     operations     bandwidth\n"
+    . str_pad('pool', 39) . "alloc   free   read  write   read  write\n" . $rule . "\n";
+  $iostat = $iostat_path = $header;
+  foreach ($pools as $p => $members) {
+    $pool = 'tank' . $p;
+    $zpool_list .= "$pool\t100T\t10T\t90T\t-\t-\t10%\t10%\t1.00x\tONLINE\t-\n";
+    $zfs_list .= "$pool\t10T\t90T\t10T\t/mnt/$pool\n";
+    $head = "  pool: $pool\n state: ONLINE\nconfig:\n\n\tNAME        STATE     READ WRITE CKSUM\n\t$pool        ONLINE       0     0     0\n";
+    $status .= $head;
+    $status_path .= $head;
+    $row = "10T    90T    1      2      10M    20M\n";
+    $iostat .= str_pad($pool, 39) . $row;
+    $iostat_path .= str_pad($pool, 39) . $row;
+    foreach (array_chunk($members, 15) as $v => $disks) {
+      $status .= "\t  raidz2-$v  ONLINE       0     0     0\n";
+      $status_path .= "\t  raidz2-$v  ONLINE       0     0     0\n";
+      $iostat .= str_pad("  raidz2-$v", 39) . $row;
+      $iostat_path .= str_pad("  raidz2-$v", 39) . $row;
+      foreach ($disks as $bay_id) {
+        $by_path = '/dev/disk/by-path/' . $paths[$bay_id];
+        $status .= "\t    $bay_id        ONLINE       0     0     0\n";
+        $status_path .= "\t    $by_path ONLINE       0     0     0\n";
+        $iostat .= str_pad("    $bay_id", 39) . "700G   6T     1      2      1M     2M\n";
+        $iostat_path .= str_pad("    $by_path", 38) . " 700G   6T     1      2      1M     2M\n";
+      }
+    }
+    $status .= "\nerrors: No known data errors\n\n";
+    $status_path .= "\nerrors: No known data errors\n\n";
+    $iostat .= $rule . "\n";
+    $iostat_path .= $rule . "\n";
+  }
+  file_put_contents($dir . '/zpool_list.txt', $zpool_list);
+  file_put_contents($dir . '/zfs_list.txt', $zfs_list);
+  file_put_contents($dir . '/zpool_status.txt', $status);
+  file_put_contents($dir . '/zpool_status_path.txt', $status_path);
+  file_put_contents($dir . '/zpool_iostat.txt', $iostat);
+  file_put_contents($dir . '/zpool_iostat_path.txt', $iostat_path);
+  return count($pools);
+}
+
+function build_fixture_set($layout, $fixtures)
+{
+  // Everything the generator and API read, rooted in one temp directory:
+  // by-path symlinks, sysfs entries, lsblk text, /proc/partitions, emhttp ini
+  // files, one SMART JSON blob per disk and multi-pool ZFS command output.
+  $tmp = sys_get_temp_dir() . '/45d-drivemap-bench-' . uniqid() . '-' . count($layout['aliases']);
+  $set = [
+    'tmp' => $tmp,
+    'dev_dir' => $tmp . '/dev',
+    'by_path_dir' => $tmp . '/by-path',
+    'out_dir' => $tmp . '/out',
+    'sys_block_dir' => $tmp . '/sys/block',
+    'smart_dir' => $tmp . '/smart',
+    'zfs_dir' => $tmp . '/zfs',
+    'alias_file' => $tmp . '/vdev_id.conf',
+    'lsblk' => $tmp . '/lsblk.txt',
+    'proc_partitions' => $tmp . '/proc_partitions',
+    'disks_ini' => $tmp . '/disks.ini',
+    'devs_ini' => $tmp . '/devs.ini',
+    'server_info' => $tmp . '/server_info.json',
+  ];
+  foreach (['dev_dir', 'by_path_dir', 'out_dir', 'sys_block_dir', 'smart_dir'] as $key) {
+    ensure_dir($set[$key]);
+  }
+
+  $smart_templates = [];
+  foreach (['sda', 'sdb', 'sdc'] as $name) {
+    $smart_templates[] = json_decode((string)file_get_contents($fixtures . '/smart/' . $name . '.json'), true);
+  }
+
+  $alias_lines = $lsblk_lines = [];
+  $partitions = ["major minor  #blocks  name", ""];
+  $disks_ini = '';
+  $index = 0;
+  foreach ($layout['aliases'] as $bay_id => $path) {
+    $dev = bench_dev_name($index);
+    $serial = sprintf('BENCH%05d', $index);
+    $template = $smart_templates[$index % count($smart_templates)];
+    $rota = isset($template['rotation_rate']) && $template['rotation_rate'] > 0 ? '1' : '0';
+    $bytes = (int)($template['user_capacity']['bytes'] ?? 1099511627776);
+    $model = (string)($template['model_name'] ?? 'BENCH');
+
+    file_put_contents($set['dev_dir'] . '/' . $dev, '');
+    @symlink($set['dev_dir'] . '/' . $dev, $set['by_path_dir'] . '/' . $path);
+    $alias_lines[] = 'alias ' . $bay_id . ' ' . $set['by_path_dir'] . '/' . $path;
+
+    $block = $set['sys_block_dir'] . '/' . $dev;
+    ensure_dir($block . '/queue');
+    ensure_dir($block . '/device');
+    file_put_contents($block . '/queue/rotational', $rota . "\n");
+    file_put_contents($block . '/device/model', $model . "\n");
+    file_put_contents($block . '/device/serial', $serial . "\n");
+    file_put_contents($block . '/size', intdiv($bytes, 512) . "\n");
+    $lsblk_lines[] = sprintf('NAME="%s" MODEL="%s" SERIAL="%s" SIZE="%d" ROTA="%s"', $dev, $model, $serial, $bytes, $rota);
+
+    // sd majors (8, then 65+) hold 16 minors each; two data partitions per disk.
+    $major = $index < 16 ? 8 : 65 + intdiv($index - 16, 16);
+    $minor = ($index % 16) * 16;
+    $partitions[] = sprintf('%4d %7d %10d %s', $major, $minor, intdiv($bytes, 1024), $dev);
+    for ($part = 1; $part <= 2; $part++) {
+      $partitions[] = sprintf('%4d %7d %10d %s%d', $major, $minor + $part, 1048576, $dev, $part);
+      ensure_dir($block . '/' . $dev . $part);
+      file_put_contents($block . '/' . $dev . $part . '/partition', $part . "\n");
+    }
+
+    $blob = $template;
+    $blob['serial_number'] = $serial;
+    $blob['temperature'] = ['current' => 30 + $index % 15];
+    file_put_contents($set['smart_dir'] . '/' . $dev . '.json', json_encode($blob, JSON_UNESCAPED_SLASHES) . "\n");
+
+    $disks_ini .= sprintf("[disk%d]\ndevice=%s\nid=%s_%s\nsectors=%d\nsector_size=512\ntemp=%d\nrotational=%s\n\n",
+      $index + 1, $dev, str_replace(' ', '_', $model), $serial, intdiv($bytes, 512), 30 + $index % 15, $rota);
+    $index++;
+  }
+  // Real hosts list loop, zram and dm devices alongside the disks.
+  for ($i = 0; $i < 64; $i++) {
+    $partitions[] = sprintf('%4d %7d %10d loop%d', 7, $i, 65536, $i);
+  }
+  for ($i = 0; $i < 8; $i++) {
+    $partitions[] = sprintf('%4d %7d %10d dm-%d', 253, $i, 10485760, $i);
+  }
+
+  file_put_contents($set['alias_file'], implode("\n", $alias_lines) . "\n");
+  file_put_contents($set['lsblk'], implode("\n", $lsblk_lines) . "\n");
+  file_put_contents($set['proc_partitions'], implode("\n", $partitions) . "\n");
+  file_put_contents($set['disks_ini'], $disks_ini);
+  file_put_contents($set['devs_ini'], "; bench fixture\n");
+  file_put_contents($set['server_info'], json_encode($layout['server'], JSON_PRETTY_PRINT | JSON_UNESCAPED_SLASHES) . "\n");
+  $set['pools'] = write_zfs_fixtures($set['zfs_dir'], array_keys($layout['aliases']), $layout['aliases']);
+  $set['bays'] = count($layout['aliases']);
+  return $set;
+}
+
+function set_bench_env($set)
+{
+  putenv('DRIVEMAP_OUTPUT_DIR=' . $set['out_dir']);
+  putenv('DRIVEMAP_ALIAS_FILE=' . $set['alias_file']);
+  putenv('DRIVEMAP_LSBLK=' . $set['lsblk']);
+  putenv('DRIVEMAP_DISKS_INI=' . $set['disks_ini']);
+  putenv('DRIVEMAP_DEVS_INI=' . $set['devs_ini']);
+  putenv('DRIVEMAP_PROC_PARTITIONS=' . $set['proc_partitions']);
+  putenv('DRIVEMAP_SYS_BLOCK=' . $set['sys_block_dir']);
+  putenv('DRIVEMAP_UDEV_DATA=' . $set['tmp'] . '/udev');
+  putenv('DRIVEMAP_SERVER_INFO_INPUT=' . $set['server_info']);
+  putenv('DRIVEMAP_SERVER_INFO=' . $set['server_info']);
+  putenv('DRIVEMAP_VENDOR_SERVER_IDENTIFIER=/bin/false');
+  putenv('DRIVEMAP_SMARTCTL_DIR=' . $set['smart_dir']);
+  putenv('DRIVEMAP_DISABLE_SMART=');
+  putenv('DRIVEMAP_ZFS_FIXTURE_DIR=' . $set['zfs_dir']);
+  putenv('DRIVEMAP_ZFS_FORCE=1');
+  // Reads are served from the map the timed generator runs produced.
+  putenv('DRIVEMAP_REFRESH_SECONDS=3600');
+}
+
+function timed_php($args, $peak_file)
+{
+  // Wall time of one child php process plus the peak memory it reported
+  // from a shutdown hook (see write_peak_hook()).
+  @unlink($peak_file);
+  $output = [];
+  $code = 0;
+  $start = microtime(true);
+  exec('php -d auto_prepend_file=' . escapeshellarg(dirname($peak_file) . '/peak_hook.php') . ' ' . $args . ' 2>/dev/null', $output, $code);
+  $elapsed = microtime(true) - $start;
+  return [
+    'ok' => $code === 0,
+    'seconds' => $elapsed,
+    'peak' => (int)@file_get_contents($peak_file),
+  ];
+}
+
+function write_peak_hook($dir, $peak_file)
+{
+  $hook = "<?php\nregister_shutdown_function(function () {\n"
+    . "  @file_put_contents(" . var_export($peak_file, true) . ", (string)memory_get_peak_usage());\n"
+    . "});\n";
+  file_put_contents($dir . '/peak_hook.php', $hook);
+}
+
+function percentile($values, $pct)
+{
+  // Nearest-rank percentile over the sorted samples.
+  sort($values);
+  $rank = (int)ceil($pct / 100 * count($values));
+  return $values[max(0, min(count($values) - 1, $rank - 1))];
+}
+
+function summarize($runs)
+{
+  $seconds = array_column($runs, 'seconds');
+  return [
+    'runs' => count($runs),
+    'failures' => count(array_filter($runs, function ($run) {
+      return !$run['ok'];
+    })),
+    'p50_ms' => round(percentile($seconds, 50) * 1000, 2),
+    'p95_ms' => round(percentile($seconds, 95) * 1000, 2),
+    'peak_memory_bytes' => max(array_column($runs, 'peak')),
+  ];
+}
+
+function bench_repeat($iterations, $args, $peak_file)
+{
+  $runs = [];
+  for ($i = 0; $i < $iterations; $i++) {
+    $runs[] = timed_php($args, $peak_file);
+  }
+  return summarize($runs);
+}
+
+function api_snippet($api_script, $action)
+{
+  $request = '$_REQUEST["action"]="' . addslashes($action) . '";';
+  if ($action === 'changes') {
+    $request .= '$_REQUEST["since"]="0";';
+  }
+  return '-r ' . escapeshellarg($request . ' include "' . addslashes($api_script) . '";');
+}
+
+$layouts = load_case_layouts($case_script, $vendor_dmap, $forced_case);
+if (!$layouts) {
+  fwrite(STDERR, "No dmap case layouts available (python3 and vendor/45drives/tools are required)\n");
+  exit(1);
+}
+
+$results = [];
+foreach ($scales as $bays) {
+  $layout = layout_for_scale($layouts, $bays);
+  if ($layout === null) {
+    fwrite(STDERR, "Skipping $bays bays: no case layout divides it\n");
+    continue;
+  }
+  $set = build_fixture_set($layout, $fixtures);
+  $cleanup_dirs[] = $set['tmp'];
+  $peak_file = $set['tmp'] . '/peak';
+  write_peak_hook($set['tmp'], $peak_file);
+  set_bench_env($set);
+  fwrite(STDERR, sprintf("%d bays (%s): %d pools\n", $set['bays'], $layout['case'], $set['pools']));
+
+  $result = [
+    'bays' => $set['bays'],
+    'layout' => $layout['case'],
+    'chassis' => trim(($layout['server']['Alias Style'] ?? '') . ' ' . ($layout['server']['Chassis Size'] ?? '')),
+    'tiles' => $layout['tiles'],
+    'pools' => $set['pools'],
+    'generator' => bench_repeat($iterations, escapeshellarg($map_script), $peak_file),
+    'api' => [],
+  ];
+  foreach ($api_actions as $action) {
+    $result['api'][$action] = bench_repeat($iterations, api_snippet($api_script, $action), $peak_file);
+  }
+  $zfs_snippet = 'require "' . addslashes($zfs_script) . '"; generate_zfs_info();';
+  $result['generate_zfs_info'] = bench_repeat($iterations, '-r ' . escapeshellarg($zfs_snippet), $peak_file);
+  $results[] = $result;
+}
+
+$report = json_encode([
+  'generated' => gmdate('c'),
+  'php' => PHP_VERSION,
+  'iterations' => $iterations,
+  'results' => $results,
+], JSON_PRETTY_PRINT | JSON_UNESCAPED_SLASHES) . "\n";
+
+if ($output_path !== '') {
+  file_put_contents($output_path, $report);
+} else {
+  echo $report;
+}
+
+if (!$keep_fixtures) {
+  foreach ($cleanup_dirs as $dir) {
+    rrmdir($dir);
+  }
+}
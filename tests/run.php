@@ -168,6 +168,71 @@ function run_api_action($root, $action)
   return [$code, implode("\n", $output)];
 }
 
+function run_api_request($root, $request, $server = [])
+{
+  // Raw response body (binary-safe) for requests that need headers such as
+  // If-None-Match or Accept-Encoding.
+  $script = $root . '/php/api.php';
+  $snippet = '$_REQUEST=' . var_export($request, true) . '; $_SERVER=array_merge($_SERVER,' . var_export($server, true) . '); include ' . var_export($script, true) . ';';
+  return (string)shell_exec('php -r ' . escapeshellarg($snippet));
+}
+
+function run_api_actions_concurrently($root, $action, $count)
+{
+  $script = $root . '/php/api.php';
+  $snippet = '$_REQUEST["action"]="' . addslashes($action) . '"; include "' . addslashes($script) . '";';
+  $descriptors = [1 => ['pipe', 'w'], 2 => ['pipe', 'w']];
+  $jobs = [];
+  for ($i = 0; $i < $count; $i++) {
+    $pipes = [];
+    $process = proc_open('php -r ' . escapeshellarg($snippet), $descriptors, $pipes);
+    if (is_resource($process)) {
+      $jobs[] = [$process, $pipes];
+    }
+  }
+  $results = [];
+  foreach ($jobs as [$process, $pipes]) {
+    $body = stream_get_contents($pipes[1]);
+    stream_get_contents($pipes[2]);
+    fclose($pipes[1]);
+    fclose($pipes[2]);
+    $results[] = [proc_close($process), $body];
+  }
+  return $results;
+}
+
+function free_local_port()
+{
+  $socket = stream_socket_server('tcp://127.0.0.1:0');
+  $name = stream_socket_get_name($socket, false);
+  fclose($socket);
+  return (int)substr($name, strrpos($name, ':') + 1);
+}
+
+function start_php_server($docroot)
+{
+  // Stand-in host: `php -S` inherits the current DRIVEMAP_* environment.
+  $port = free_local_port();
+  $devnull = ['file', '/dev/null', 'w'];
+  $pipes = [];
+  $process = proc_open('exec php -S 127.0.0.1:' . $port . ' -t ' . escapeshellarg($docroot), [1 => $devnull, 2 => $devnull], $pipes);
+  for ($i = 0; $i < 50; $i++) {
+    $probe = @fsockopen('127.0.0.1', $port, $errno, $errstr, 0.1);
+    if ($probe) {
+      fclose($probe);
+      break;
+    }
+    usleep(100000);
+  }
+  return ['process' => $process, 'url' => 'http://127.0.0.1:' . $port . '/php/api.php'];
+}
+
+function stop_php_server($server)
+{
+  proc_terminate($server['process']);
+  proc_close($server['process']);
+}
+
 function load_json_file($path)
 {
   $raw = @file_get_contents($path);
@@ -193,117 +258,94 @@ function find_slot($rows, $bay_id)
   return null;
 }
 
+function vendor_templates($root)
+{
+  // Whole upstream alias_template (style -> chassis -> row lengths), parsed
+  // once per run; vendor_template.py also caches it by the lsdev hash.
+  static $templates = [];
+  if (!array_key_exists($root, $templates)) {
+    $script = $root . '/tests/vendor_template.py';
+    $vendor_lsdev = $root . '/vendor/45drives/tools/tools/lsdev';
+    $cmd = 'python3 ' . escapeshellarg($script) . ' ' . escapeshellarg($vendor_lsdev) . ' --all';
+    $output = [];
+    $code = 0;
+    exec($cmd, $output, $code);
+    $decoded = $code === 0 ? json_decode(implode("\n", $output), true) : null;
+    $templates[$root] = is_array($decoded) ? $decoded : null;
+  }
+  return $templates[$root];
+}
+
 function vendor_template_lengths($root, $style, $chassis)
 {
-  $script = $root . '/tests/vendor_template.py';
-  $vendor_lsdev = $root . '/vendor/45drives/tools/tools/lsdev';
-  $cmd = 'python3 ' . escapeshellarg($script) . ' ' . escapeshellarg($vendor_lsdev) . ' ' . escapeshellarg($style) . ' ' . escapeshellarg($chassis);
-  $output = [];
-  $code = 0;
-  exec($cmd, $output, $code);
-  if ($code !== 0) {
+  $templates = vendor_templates($root);
+  $lengths = $templates[$style][$chassis] ?? null;
+  if (!is_array($lengths)) {
     return null;
   }
-  $decoded = json_decode(implode("\n", $output), true);
-  if (!is_array($decoded)) {
-    return null;
+  return array_values(array_map('intval', $lengths));
+}
+
+function vendor_dmap_batch($root)
+{
+  // One `--batch` run loads the vendored dmap once and returns every case's
+  // aliases, full output, server_info and local env; later lookups are free.
+  static $batch = [];
+  if (!array_key_exists($root, $batch)) {
+    $script = $root . '/tests/vendor_dmap_case.py';
+    $vendor_dmap = $root . '/vendor/45drives/tools/tools/dmap';
+    $cmd = 'python3 '
+      . escapeshellarg($script) . ' '
+      . escapeshellarg($vendor_dmap) . ' --batch --jobs 4';
+    $output = [];
+    $code = 0;
+    exec($cmd, $output, $code);
+    $decoded = $code === 0 ? json_decode(implode("\n", $output), true) : null;
+    $batch[$root] = is_array($decoded) ? $decoded : null;
   }
-  return array_values(array_map('intval', $decoded));
+  return $batch[$root];
+}
+
+function vendor_dmap_case_result($root, $case_name)
+{
+  $batch = vendor_dmap_batch($root);
+  return is_array($batch) && isset($batch[$case_name]) ? $batch[$case_name] : null;
 }
 
 function vendor_dmap_alias_lines($root, $case_name)
 {
-  $script = $root . '/tests/vendor_dmap_case.py';
-  $vendor_dmap = $root . '/vendor/45drives/tools/tools/dmap';
-  $cmd = 'python3 '
-    . escapeshellarg($script) . ' '
-    . escapeshellarg($vendor_dmap) . ' '
-    . escapeshellarg($case_name);
-  $output = [];
-  $code = 0;
-  exec($cmd, $output, $code);
-  if ($code !== 0) {
+  $result = vendor_dmap_case_result($root, $case_name);
+  if (!is_array($result['aliases'] ?? null)) {
     return null;
   }
-  $decoded = json_decode(implode("\n", $output), true);
-  if (!is_array($decoded)) {
-    return null;
-  }
-  return array_values(array_map('strval', $decoded));
+  return array_values(array_map('strval', $result['aliases']));
 }
 
 function vendor_dmap_cases($root)
 {
-  $script = $root . '/tests/vendor_dmap_case.py';
-  $cmd = 'python3 ' . escapeshellarg($script) . ' --list';
-  $output = [];
-  $code = 0;
-  exec($cmd, $output, $code);
-  if ($code !== 0) {
-    return null;
-  }
-  $decoded = json_decode(implode("\n", $output), true);
-  if (!is_array($decoded)) {
+  $batch = vendor_dmap_batch($root);
+  if (!is_array($batch)) {
     return null;
   }
-  return array_values(array_map('strval', $decoded));
+  return array_values(array_map('strval', array_keys($batch)));
 }
 
 function vendor_dmap_case_server($root, $case_name)
 {
-  $script = $root . '/tests/vendor_dmap_case.py';
-  $vendor_dmap = $root . '/vendor/45drives/tools/tools/dmap';
-  $cmd = 'python3 '
-    . escapeshellarg($script) . ' '
-    . escapeshellarg($vendor_dmap) . ' '
-    . escapeshellarg($case_name) . ' --server';
-  $output = [];
-  $code = 0;
-  exec($cmd, $output, $code);
-  if ($code !== 0) {
-    return null;
-  }
-  $decoded = json_decode(implode("\n", $output), true);
-  return is_array($decoded) ? $decoded : null;
+  $result = vendor_dmap_case_result($root, $case_name);
+  return is_array($result['server'] ?? null) ? $result['server'] : null;
 }
 
 function vendor_dmap_case_local_env($root, $case_name)
 {
-  $script = $root . '/tests/vendor_dmap_case.py';
-  $vendor_dmap = $root . '/vendor/45drives/tools/tools/dmap';
-  $cmd = 'python3 '
-    . escapeshellarg($script) . ' '
-    . escapeshellarg($vendor_dmap) . ' '
-    . escapeshellarg($case_name) . ' --local-env';
-  $output = [];
-  $code = 0;
-  exec($cmd, $output, $code);
-  if ($code !== 0) {
-    return [];
-  }
-  $decoded = json_decode(implode("\n", $output), true);
-  return is_array($decoded) ? $decoded : [];
+  $result = vendor_dmap_case_result($root, $case_name);
+  return is_array($result['local_env'] ?? null) ? $result['local_env'] : [];
 }
 
 function vendor_dmap_case_full_text($root, $case_name)
 {
-  $script = $root . '/tests/vendor_dmap_case.py';
-  $vendor_dmap = $root . '/vendor/45drives/tools/tools/dmap';
-  $cmd = 'python3 '
-    . escapeshellarg($script) . ' '
-    . escapeshellarg($vendor_dmap) . ' '
-    . escapeshellarg($case_name) . ' --full';
-  $output = [];
-  $code = 0;
-  exec($cmd, $output, $code);
-  if ($code !== 0) {
-    return null;
-  }
-  $decoded = json_decode(implode("\n", $output), true);
-  if ($decoded === null) {
-    return null;
-  }
-  return is_string($decoded) ? $decoded : null;
+  $result = vendor_dmap_case_result($root, $case_name);
+  return is_string($result['full'] ?? null) ? $result['full'] : null;
 }
 
 function validate_alias_lines($lines, $label)
@@ -350,6 +392,9 @@ function run_ported_dmap($root, $ctx, $server, $env = [])
   $env_pairs = [
     'DRIVEMAP_DMAP_SERVER_INFO' => $server_file,
     'DRIVEMAP_DMAP_OUTPUT' => $output_file,
+    // Keep hardware enumeration off the host's real sysfs and by-path links.
+    'DRIVEMAP_PCI_DEVICES' => $ctx['tmp'] . '/no-pci',
+    'DRIVEMAP_BY_PATH_DIR' => $ctx['by_path_dir'],
   ];
   foreach ($env as $key => $value) {
     if (!is_string($key) || $key === '') {
@@ -525,6 +570,116 @@ assert_equal($smart_1_1['health'] ?? '', 'OK', 'smart health');
 assert_equal($smart_1_1['power-on-time'] ?? '', '12345', 'smart power on time');
 assert_equal($smart_1_2['temp-c'] ?? '', '30 C', 'smart non-ata temperature');
 
+// Scenario 2b: pooled smartctl collection with a per-device timeout.
+$fake_smartctl = $ctx['tmp'] . '/fake-smartctl';
+file_put_contents($fake_smartctl, "#!/bin/sh\n"
+  . "for arg in \"\$@\"; do case \"\$arg\" in /*) dev=\$(basename \"\$arg\");; esac; done\n"
+  . "[ \"\$dev\" = sdc ] && sleep 5\n"
+  . "cat " . escapeshellarg($fixtures . '/smart') . "/\$dev.json\n");
+chmod($fake_smartctl, 0755);
+putenv('DRIVEMAP_SMARTCTL_DIR=');
+putenv('DRIVEMAP_SMARTCTL=' . $fake_smartctl);
+putenv('DRIVEMAP_SMART_WORKERS=4');
+putenv('DRIVEMAP_SMART_TIMEOUT=1');
+putenv('DRIVEMAP_SMART_CACHE_FILE=' . $ctx['tmp'] . '/smart-cache-pool.json');
+[$pool_code] = run_php_script($map_script);
+assert_equal($pool_code, 0, 'generator exits successfully with pooled smartctl');
+$pool_map = load_json_file($ctx['out_dir'] . '/drivemap.json');
+assert_true(is_array($pool_map), 'pooled smart map parses as JSON');
+assert_equal(find_slot($pool_map['rows'] ?? [], '1-1')['model-family'] ?? '', 'Seagate Exos X16', 'pooled smart populates 1-1');
+assert_equal(find_slot($pool_map['rows'] ?? [], '1-2')['temp-c'] ?? '', '30 C', 'pooled smart populates 1-2');
+assert_equal(find_slot($pool_map['rows'] ?? [], '2-1')['model-family'] ?? null, '', 'timed-out device keeps base fields');
+assert_equal($pool_map['smartErrors'] ?? null, [
+  ['bay-id' => '2-1', 'dev' => realpath($ctx['dev_dir'] . '/sdc'), 'reason' => 'timeout'],
+], 'timed-out device reported in smartErrors');
+assert_true(($pool_map['lsdevDuration'] ?? 99) < 4, 'hung device does not stall generation');
+putenv('DRIVEMAP_SMARTCTL');
+putenv('DRIVEMAP_SMART_WORKERS');
+putenv('DRIVEMAP_SMART_TIMEOUT');
+
+// Scenario 2c: serial-keyed SMART cache skips probes while fields are fresh.
+$counting_smartctl = $ctx['tmp'] . '/counting-smartctl';
+$smartctl_calls = $ctx['tmp'] . '/smartctl-calls.log';
+file_put_contents($counting_smartctl, "#!/bin/sh\n"
+  . "echo \"\$*\" >> " . escapeshellarg($smartctl_calls) . "\n"
+  . "for arg in \"\$@\"; do case \"\$arg\" in /*) dev=\$(basename \"\$arg\");; esac; done\n"
+  . "cat " . escapeshellarg($fixtures . '/smart') . "/\$dev.json\n");
+chmod($counting_smartctl, 0755);
+$smart_cache_path = $ctx['tmp'] . '/smart-cache.json';
+putenv('DRIVEMAP_SMARTCTL=' . $counting_smartctl);
+putenv('DRIVEMAP_SMART_CACHE_FILE=' . $smart_cache_path);
+run_php_script($map_script);
+$cold_calls = @file($smartctl_calls, FILE_IGNORE_NEW_LINES) ?: [];
+assert_equal(count($cold_calls), 3, 'cold cache probes every occupied device');
+assert_true(strpos($cold_calls[0] ?? '', '-a ') === 0, 'cold cache uses a full smartctl report');
+$smart_cache = load_json_file($smart_cache_path);
+assert_true(isset($smart_cache['serial:SAMPLE0001']['fields']['firm-ver']), 'smart cache keyed by serial');
+run_php_script($map_script);
+$warm_calls = @file($smartctl_calls, FILE_IGNORE_NEW_LINES) ?: [];
+assert_equal(count($warm_calls), 3, 'warm cache runs no smartctl');
+$warm_map = load_json_file($ctx['out_dir'] . '/drivemap.json');
+assert_equal(find_slot($warm_map['rows'] ?? [], '1-1')['firm-ver'] ?? '', 'SC60', 'warm cache fills smart fields');
+putenv('DRIVEMAP_SMART_TTL_COUNTERS=0');
+run_php_script($map_script);
+$counter_calls = @file($smartctl_calls, FILE_IGNORE_NEW_LINES) ?: [];
+assert_equal(count($counter_calls), 6, 'expired counters re-probe each device');
+assert_true(strpos($counter_calls[3] ?? '', '-A -H ') === 0, 'fresh identity is not re-requested');
+putenv('DRIVEMAP_SMART_TTL_COUNTERS');
+@unlink($ctx['by_path_dir'] . '/' . $alias_map['2-1']);
+run_php_script($map_script);
+$evicted_cache = load_json_file($smart_cache_path);
+assert_true(!isset($evicted_cache['serial:SAMPLE0003']), 'smart cache evicts drives no longer present');
+@symlink($symlinks['2-1'], $ctx['by_path_dir'] . '/' . $alias_map['2-1']);
+putenv('DRIVEMAP_SMARTCTL');
+putenv('DRIVEMAP_SMART_CACHE_FILE');
+
+// Scenario 2d: standby-aware probing never wakes spun-down disks.
+$standby_smartctl = $ctx['tmp'] . '/standby-smartctl';
+$standby_calls = $ctx['tmp'] . '/standby-calls.log';
+file_put_contents($standby_smartctl, "#!/bin/sh\n"
+  . "echo \"\$*\" >> " . escapeshellarg($standby_calls) . "\n"
+  . "for arg in \"\$@\"; do case \"\$arg\" in /*) dev=\$(basename \"\$arg\");; esac; done\n"
+  . "case \"\$*\" in *'-n standby'*) [ \"\$dev\" = sdc ] && { cat " . escapeshellarg($fixtures . '/smart/standby.json') . "; exit 2; };; esac\n"
+  . "cat " . escapeshellarg($fixtures . '/smart') . "/\$dev.json\n");
+chmod($standby_smartctl, 0755);
+$standby_ini = $ctx['tmp'] . '/disks-standby.ini';
+file_put_contents($standby_ini, (string)file_get_contents($fixtures . '/disks.ini') . "spundown=1\n");
+putenv('DRIVEMAP_SMARTCTL=' . $standby_smartctl);
+putenv('DRIVEMAP_SMART_CACHE_FILE=' . $smart_cache_path);
+putenv('DRIVEMAP_SMART_STANDBY=wake');
+run_php_script($map_script);
+@unlink($standby_calls);
+putenv('DRIVEMAP_SMART_STANDBY');
+putenv('DRIVEMAP_SMART_TTL_COUNTERS=0');
+putenv('DRIVEMAP_DISKS_INI=' . $standby_ini);
+run_php_script($map_script);
+$standby_log = @file($standby_calls, FILE_IGNORE_NEW_LINES) ?: [];
+assert_equal(count($standby_log), 2, 'ini-reported standby disk is not probed');
+assert_true(strpos($standby_log[0] ?? '', '-n standby ') === 0, 'probes ask smartctl not to wake the disk');
+$standby_map = load_json_file($ctx['out_dir'] . '/drivemap.json');
+$standby_1_1 = find_slot($standby_map['rows'] ?? [], '1-1');
+$standby_1_2 = find_slot($standby_map['rows'] ?? [], '1-2');
+$standby_2_1 = find_slot($standby_map['rows'] ?? [], '2-1');
+assert_equal($standby_1_1['power-state'] ?? '', 'active', 'probed disk reports active power state');
+assert_equal($standby_1_1['smart-stale'] ?? null, false, 'probed disk is not stale');
+assert_equal($standby_1_2['power-state'] ?? '', 'standby', 'ini spundown disk reports standby');
+assert_equal($standby_1_2['smart-stale'] ?? null, true, 'ini spundown disk is marked stale');
+assert_equal($standby_1_2['temp-c'] ?? '', '30 C', 'ini spundown disk keeps last known temperature');
+assert_equal($standby_2_1['power-state'] ?? '', 'standby', 'smartctl standby exit reports standby');
+assert_equal($standby_2_1['smart-stale'] ?? null, true, 'smartctl standby disk is marked stale');
+assert_equal($standby_2_1['firm-ver'] ?? '', 'A3J0', 'smartctl standby disk keeps last known fields');
+assert_equal($standby_map['smartErrors'] ?? null, [], 'standby is not reported as a smart error');
+putenv('DRIVEMAP_SMART_CACHE_FILE=' . $ctx['tmp'] . '/smart-cache-empty.json');
+run_php_script($map_script);
+$standby_uncached = load_json_file($ctx['out_dir'] . '/drivemap.json');
+assert_equal(find_slot($standby_uncached['rows'] ?? [], '1-2')['smart-stale'] ?? null, false, 'spun-down disk without cached fields is not stale');
+assert_equal(find_slot($standby_uncached['rows'] ?? [], '2-1')['smart-stale'] ?? null, false, 'standby probe without cached fields is not stale');
+@unlink($ctx['tmp'] . '/smart-cache-empty.json');
+putenv('DRIVEMAP_SMARTCTL');
+putenv('DRIVEMAP_SMART_CACHE_FILE');
+putenv('DRIVEMAP_SMART_TTL_COUNTERS');
+putenv('DRIVEMAP_DISKS_INI=' . $fixtures . '/disks.ini');
+
 // Scenario 3: H16/Q30 row parity against upstream lsdev alias_template.
 $ctx_h16_q30 = create_context('h16q30');
 $h16_q30_map = alias_map_from_fixture($fixtures . '/vdev_id_h16_q30.conf');
@@ -662,6 +817,1065 @@ if (is_array($invalid_server)) {
   assert_true($invalid_aliases === null || $invalid_aliases === [], 'ported dmap does not emit aliases on invalid style');
 }
 
+// Scenario 9: concurrent API reads share one in-flight generation.
+$ctx_flight = create_context('single-flight');
+set_common_env($ctx_flight, $fixtures);
+$flight_counter = $ctx_flight['tmp'] . '/generator-runs.log';
+$slow_generator = $ctx_flight['tmp'] . '/slow-generator';
+file_put_contents($slow_generator, "#!/usr/bin/php\n<?php\n"
+  . "file_put_contents(" . var_export($flight_counter, true) . ", \"run\\n\", FILE_APPEND);\n"
+  . "usleep(1500000);\n"
+  . "file_put_contents(getenv('DRIVEMAP_OUTPUT_DIR') . '/drivemap.json', json_encode(['rows' => [[['bay-id' => '1-1']]], 'lastUpdated' => gmdate('c')]));\n");
+putenv('DRIVEMAP_GENERATOR=' . $slow_generator);
+$flight_results = run_api_actions_concurrently($root, 'drivemap', 4);
+$flight_runs = @file($flight_counter, FILE_IGNORE_NEW_LINES) ?: [];
+assert_equal(count($flight_results), 4, 'concurrent drivemap requests complete');
+assert_equal(count($flight_runs), 1, 'concurrent drivemap requests share one generator run');
+foreach ($flight_results as $i => [$flight_code, $flight_body]) {
+  $flight_json = json_decode($flight_body, true);
+  assert_equal($flight_code, 0, "concurrent request $i exits successfully");
+  assert_equal($flight_json['rows'][0][0]['bay-id'] ?? null, '1-1', "concurrent request $i receives shared map");
+}
+assert_true(!glob($ctx_flight['out_dir'] . '/drivemap.json.tmp.*'), 'no temp files left behind');
+putenv('DRIVEMAP_GENERATOR');
+
+// Scenario 10: stale-while-revalidate answers from cache and refreshes in the background.
+$ctx_swr = create_context('swr');
+set_common_env($ctx_swr, $fixtures);
+$swr_map = $ctx_swr['out_dir'] . '/drivemap.json';
+$swr_counter = $ctx_swr['tmp'] . '/generator-runs.log';
+$swr_generator = $ctx_swr['tmp'] . '/marker-generator';
+file_put_contents($swr_generator, "#!/usr/bin/php\n<?php\n"
+  . "file_put_contents(" . var_export($swr_counter, true) . ", \"run\\n\", FILE_APPEND);\n"
+  . "file_put_contents(getenv('DRIVEMAP_OUTPUT_DIR') . '/drivemap.json', json_encode(['rows' => [[['bay-id' => 'fresh']]]]));\n");
+$write_swr_map = function ($age) use ($swr_map) {
+  file_put_contents($swr_map, json_encode(['rows' => [[['bay-id' => 'cached']]]]));
+  touch($swr_map, time() - $age);
+};
+putenv('DRIVEMAP_GENERATOR=' . $swr_generator);
+putenv('DRIVEMAP_REVALIDATE_SECONDS=60');
+putenv('DRIVEMAP_MAX_AGE_SECONDS=600');
+
+$write_swr_map(10);
+[$swr_code, $swr_body] = run_api_action($root, 'drivemap');
+$swr_json = json_decode($swr_body, true);
+assert_equal($swr_json['rows'][0][0]['bay-id'] ?? null, 'cached', 'fresh cache served without regeneration');
+assert_true(!is_file($swr_counter), 'fresh cache does not start generator');
+
+$write_swr_map(120);
+[$swr_code, $swr_body] = run_api_action($root, 'status');
+$swr_status = json_decode($swr_body, true);
+assert_true(($swr_status['age'] ?? 0) >= 120, 'status reports cache age');
+assert_equal($swr_status['stale'] ?? null, true, 'status reports stale cache');
+[$swr_code, $swr_body] = run_api_action($root, 'drivemap');
+$swr_json = json_decode($swr_body, true);
+assert_equal($swr_code, 0, 'stale drivemap request succeeds');
+assert_equal($swr_json['rows'][0][0]['bay-id'] ?? null, 'cached', 'stale cache served immediately');
+$swr_deadline = microtime(true) + 5;
+while (microtime(true) < $swr_deadline) {
+  $swr_disk = load_json_file($swr_map);
+  if (($swr_disk['rows'][0][0]['bay-id'] ?? null) === 'fresh') {
+    break;
+  }
+  usleep(100000);
+}
+$swr_disk = load_json_file($swr_map);
+assert_equal($swr_disk['rows'][0][0]['bay-id'] ?? null, 'fresh', 'background revalidation rewrites map');
+assert_equal(count(@file($swr_counter, FILE_IGNORE_NEW_LINES) ?: []), 1, 'background revalidation runs generator once');
+
+$write_swr_map(900);
+[$swr_code, $swr_body] = run_api_action($root, 'disk_info');
+$swr_json = json_decode($swr_body, true);
+assert_equal($swr_json['rows'][0]['bay-id'] ?? null, 'fresh', 'map past max age regenerates before responding');
+assert_equal(count(@file($swr_counter, FILE_IGNORE_NEW_LINES) ?: []), 2, 'max age forces synchronous generator run');
+
+putenv('DRIVEMAP_GENERATOR');
+putenv('DRIVEMAP_REVALIDATE_SECONDS');
+putenv('DRIVEMAP_MAX_AGE_SECONDS');
+
+// Scenario 11: block inventory is read from sysfs when no lsblk or
+// partitions fixture is supplied.
+$ctx_sysfs = create_context('sysfs');
+write_alias_file($ctx_sysfs, [
+  '1-1' => 'pci-0000:01:00.0-sas-phy0-lun-0',
+  '1-2' => 'pci-0000:01:00.0-sas-phy1-lun-0',
+  '1-3' => 'pci-0000:01:00.0-sas-phy2-lun-0',
+], [
+  '1-1' => $ctx_sysfs['dev_dir'] . '/sda',
+  '1-2' => $ctx_sysfs['dev_dir'] . '/sdb',
+]);
+set_common_env($ctx_sysfs, $fixtures);
+putenv('DRIVEMAP_LSBLK');
+putenv('DRIVEMAP_PROC_PARTITIONS');
+putenv('DRIVEMAP_DISKS_INI=' . $ctx_sysfs['tmp'] . '/missing-disks.ini');
+putenv('DRIVEMAP_DEVS_INI=' . $ctx_sysfs['tmp'] . '/missing-devs.ini');
+putenv('DRIVEMAP_UDEV_DATA=' . $ctx_sysfs['tmp'] . '/udev');
+putenv('DRIVEMAP_DISABLE_SMART=1');
+putenv('DRIVEMAP_CHASSIS_SIZE=S45');
+putenv('DRIVEMAP_SERVER_MODEL=Storinator-S45');
+putenv('DRIVEMAP_ALIAS_STYLE=STORINATOR');
+$sysfs_sda = $ctx_sysfs['sys_block_dir'] . '/sda';
+ensure_dir($sysfs_sda . '/device');
+file_put_contents($sysfs_sda . '/device/model', "ST12000NM0007   \n");
+file_put_contents($sysfs_sda . '/device/vpd_pg80', "\x00\x80\x00\x0aSYSFS00001");
+file_put_contents($sysfs_sda . '/size', "2147483648\n");
+foreach (['sda1', 'sda2'] as $part) {
+  ensure_dir($sysfs_sda . '/' . $part);
+  file_put_contents($sysfs_sda . '/' . $part . '/partition', "1\n");
+}
+$sysfs_sdb = $ctx_sysfs['sys_block_dir'] . '/sdb';
+file_put_contents($sysfs_sdb . '/dev', "8:16\n");
+file_put_contents($sysfs_sdb . '/size', "1073741824\n");
+ensure_dir($ctx_sysfs['tmp'] . '/udev');
+ensure_dir($sysfs_sdb . '/device');
+file_put_contents($sysfs_sdb . '/device/model', "Samsung SSD 870 \n");
+file_put_contents($ctx_sysfs['tmp'] . '/udev/b8:16', "S:disk/by-id/ata-sample\nE:ID_MODEL=Samsung_SSD_870_EVO_1TB\nE:ID_SERIAL_SHORT=UDEV00002\n");
+[$sysfs_code] = run_php_script($map_script);
+assert_equal($sysfs_code, 0, 'sysfs inventory generator exits successfully');
+$sysfs_map = load_json_file($ctx_sysfs['out_dir'] . '/drivemap.json');
+$sysfs_1_1 = find_slot($sysfs_map['rows'] ?? [], '1-1');
+$sysfs_1_2 = find_slot($sysfs_map['rows'] ?? [], '1-2');
+assert_equal($sysfs_1_1['model-name'] ?? null, 'ST12000NM0007', 'sysfs model is trimmed');
+assert_equal($sysfs_1_1['serial'] ?? null, 'SYSFS00001', 'sysfs serial read from VPD page 0x80');
+assert_equal($sysfs_1_1['capacity'] ?? null, '1 TiB', 'sysfs size counts 512-byte sectors');
+assert_equal($sysfs_1_1['partitions'] ?? null, '2', 'sysfs partition count');
+assert_equal($sysfs_1_1['disk_type'] ?? null, 'HDD', 'sysfs rotational flag');
+assert_equal($sysfs_1_2['serial'] ?? null, 'UDEV00002', 'udev serial fallback');
+assert_equal($sysfs_1_2['model-name'] ?? null, 'Samsung SSD 870 EVO 1TB', 'udev ID_MODEL preferred over the truncated sysfs model');
+assert_equal($sysfs_1_2['partitions'] ?? null, '0', 'sysfs device without partitions');
+assert_equal($sysfs_1_2['disk_type'] ?? null, 'SSD', 'sysfs non-rotational flag');
+putenv('DRIVEMAP_UDEV_DATA');
+putenv('DRIVEMAP_DISABLE_SMART');
+putenv('DRIVEMAP_CHASSIS_SIZE');
+putenv('DRIVEMAP_SERVER_MODEL');
+putenv('DRIVEMAP_ALIAS_STYLE');
+
+// Scenario 12: batched ZFS collection. The zpool status -j fast path must
+// match the per-pool text parsers, and multi-pool text output must split
+// back into per-pool blocks.
+putenv('DRIVEMAP_ZFS_FORCE=1');
+putenv('DRIVEMAP_ZFS_FIXTURE_DIR=' . $fixtures . '/zfs');
+[, $zfs_text_body] = run_api_action($root, 'zfs_info');
+putenv('DRIVEMAP_ZFS_FIXTURE_DIR=' . $fixtures . '/zfs_json');
+[$zfs_json_code, $zfs_json_body] = run_api_action($root, 'zfs_info');
+assert_equal($zfs_json_code, 0, 'zfs_info JSON path exits successfully');
+$zfs_json = json_decode($zfs_json_body, true);
+$zfs_text = json_decode($zfs_text_body, true);
+// Timings name the commands each path ran, so they legitimately differ.
+unset($zfs_json['timings'], $zfs_text['timings']);
+assert_equal($zfs_json, $zfs_text, 'zfs_info JSON path matches text parser output');
+putenv('DRIVEMAP_ZFS_FIXTURE_DIR=' . $fixtures . '/zfs_batch');
+[$zfs_batch_code, $zfs_batch_body] = run_api_action($root, 'zfs_info');
+$zfs_batch = json_decode($zfs_batch_body, true);
+assert_equal($zfs_batch_code, 0, 'zfs_info batched text path exits successfully');
+assert_equal(array_column($zfs_batch['zpools'] ?? [], 'name'), ['tank', 'backup'], 'batched zpool list keeps pool order');
+assert_equal($zfs_batch['zpools'][1]['mountpoint'] ?? null, '/mnt/backup', 'zfs list joined by pool name');
+assert_equal($zfs_batch['zfs_disks']['1-1']['zpool_name'] ?? null, 'tank', 'batched status assigns 1-1 to tank');
+assert_equal($zfs_batch['zfs_disks']['2-1']['zpool_name'] ?? null, 'backup', 'batched status assigns 2-1 to backup');
+assert_equal($zfs_batch['zfs_disks']['2-1']['alloc'] ?? null, '2G', 'batched iostat stats for backup disk');
+assert_equal($zfs_batch['zfs_disks']['1-2']['read_bw'] ?? null, '5M', 'batched iostat stats for tank disk');
+assert_true(strpos(implode('', $zfs_batch['warnings'] ?? []), 'sdx1') !== false, 'batched status warns on non-alias device');
+// Special, log and cache vdevs sit beside the root vdev in JSON output; leaf
+// disks are told apart from groupings by vdev_type and spares are skipped.
+putenv('DRIVEMAP_ZFS_FIXTURE_DIR=' . $fixtures . '/zfs_json_classes');
+[$zfs_class_code, $zfs_class_body] = run_api_action($root, 'zfs_info');
+$zfs_class = json_decode($zfs_class_body, true);
+assert_equal($zfs_class_code, 0, 'zfs_info JSON path with class vdevs exits successfully');
+assert_equal(array_column($zfs_class['zpools'][0]['vdevs'] ?? [], 'name'), ['mirror-0', 'mirror-1', '1-5', '1-6'], 'JSON status lists special, log and cache vdevs in order');
+assert_equal($zfs_class['zfs_disks']['1-3']['vdev_raid_level'] ?? null, 'mirror-1', 'special mirror member keeps its vdev');
+assert_equal($zfs_class['zfs_disks']['1-5']['vdev_raid_level'] ?? null, 'Disk', 'single log device reported as a disk vdev');
+assert_equal($zfs_class['zfs_disks']['1-6']['read_bw'] ?? null, '4M', 'cache device gets iostat stats');
+assert_true(!isset($zfs_class['zfs_disks']['1-7']), 'JSON status skips spares');
+putenv('DRIVEMAP_ZFS_FORCE');
+putenv('DRIVEMAP_ZFS_FIXTURE_DIR');
+
+// Scenario 13: the ZFS sampler ring buffer feeds zfs_info interval rates and
+// window min/avg/max without reading iostat output on the API path.
+$ctx_sampler = create_context('zfs-sampler');
+$sampler_script = $root . '/scripts/45d-zfs-sampler';
+$sampler_input = $ctx_sampler['tmp'] . '/iostat-sample.txt';
+putenv('DRIVEMAP_OUTPUT_DIR=' . $ctx_sampler['out_dir']);
+putenv('DRIVEMAP_ZFS_FORCE=1');
+putenv('DRIVEMAP_ZFS_FIXTURE_DIR=' . $fixtures . '/zfs');
+putenv('DRIVEMAP_ZFS_SAMPLE_INTERVAL=5');
+putenv('DRIVEMAP_ZFS_SAMPLE_WINDOW=15');
+putenv('DRIVEMAP_ZFS_IOSTAT_SAMPLE=' . $sampler_input);
+foreach ([100, 200, 300, 400] as $sample_ops) {
+  $sample_rows = [
+    ['tank', 10737418240, 96636764160, 2 * $sample_ops, 10, 2097152, 1048576],
+    ['mirror-0', 10737418240, 96636764160, 2 * $sample_ops, 10, 2097152, 1048576],
+    ['1-1', 5368709120, 48318382080, $sample_ops, 5, 1048576, 524288],
+    ['1-2', 5368709120, 48318382080, $sample_ops, 5, 1048576, 524288],
+  ];
+  file_put_contents($sampler_input, implode("\n", array_map(function ($row) {
+    return implode("\t", $row);
+  }, $sample_rows)) . "\n");
+  $sampler_output = [];
+  exec('php ' . escapeshellarg($sampler_script) . ' --once', $sampler_output, $sampler_code);
+  assert_equal($sampler_code, 0, "sampler pass with $sample_ops read ops exits successfully");
+}
+$sampler_ring = load_json_file($ctx_sampler['out_dir'] . '/zfs-iostat.json');
+assert_equal(count($sampler_ring['samples'] ?? []), 3, 'sampler ring keeps a fixed window of samples');
+
+foreach (['zfs' => 'text status', 'zfs_json' => 'JSON status'] as $sampler_fixture => $sampler_label) {
+  putenv('DRIVEMAP_ZFS_FIXTURE_DIR=' . $fixtures . '/' . $sampler_fixture);
+  [$sampler_api_code, $sampler_body] = run_api_action($root, 'zfs_info');
+  $sampler_zfs = json_decode($sampler_body, true);
+  $sampler_disk = $sampler_zfs['zfs_disks']['1-1'] ?? [];
+  assert_equal($sampler_api_code, 0, "zfs_info with sampler ($sampler_label) exits successfully");
+  assert_equal($sampler_zfs['iostat']['source'] ?? null, 'sampler', "zfs_info reports sampler source ($sampler_label)");
+  assert_equal($sampler_disk['read_ops'] ?? null, '400', "disk rate comes from newest sample ($sampler_label)");
+  assert_equal($sampler_disk['read_bw'] ?? null, '1M', "disk bandwidth is formatted ($sampler_label)");
+  assert_equal($sampler_disk['alloc'] ?? null, '5G', "disk allocation comes from sampler ($sampler_label)");
+  assert_equal($sampler_disk['window']['samples'] ?? null, 3, "window covers ring samples ($sampler_label)");
+  assert_equal($sampler_disk['window']['read_ops'] ?? null, ['min' => 200, 'avg' => 300.0, 'max' => 400], "window read ops min/avg/max ($sampler_label)");
+  assert_equal($sampler_zfs['zpools'][0]['vdevs'][0]['read_ops'] ?? null, '800', "vdev rate comes from sampler ($sampler_label)");
+}
+
+$sampler_ring['updated'] = time() - 3600;
+file_put_contents($ctx_sampler['out_dir'] . '/zfs-iostat.json', json_encode($sampler_ring));
+putenv('DRIVEMAP_ZFS_FIXTURE_DIR=' . $fixtures . '/zfs');
+[, $sampler_body] = run_api_action($root, 'zfs_info');
+$sampler_zfs = json_decode($sampler_body, true);
+assert_equal($sampler_zfs['iostat']['source'] ?? null, 'zpool', 'stale sampler ring falls back to zpool iostat');
+assert_equal($sampler_zfs['zfs_disks']['1-1']['read_ops'] ?? null, '1', 'fallback uses zpool iostat values');
+// A pid file left by a killed sampler whose pid now belongs to another
+// process must not keep a new sampler from starting.
+$sampler_pid_file = $ctx_sampler['out_dir'] . '/zfs-sampler.pid';
+file_put_contents($sampler_pid_file, getmypid() . "\n");
+$sampler_process = proc_open('exec php ' . escapeshellarg($sampler_script), [1 => ['file', '/dev/null', 'w'], 2 => ['file', '/dev/null', 'w']], $sampler_pipes);
+$sampler_pid = proc_get_status($sampler_process)['pid'];
+for ($i = 0; $i < 50 && (int)@file_get_contents($sampler_pid_file) !== $sampler_pid; $i++) {
+  usleep(100000);
+}
+assert_equal((int)@file_get_contents($sampler_pid_file), $sampler_pid, 'sampler overwrites a pid file naming another process');
+proc_terminate($sampler_process);
+proc_close($sampler_process);
+@unlink($sampler_pid_file);
+putenv('DRIVEMAP_ZFS_FORCE');
+putenv('DRIVEMAP_ZFS_FIXTURE_DIR');
+putenv('DRIVEMAP_ZFS_SAMPLE_INTERVAL');
+putenv('DRIVEMAP_ZFS_SAMPLE_WINDOW');
+putenv('DRIVEMAP_ZFS_IOSTAT_SAMPLE');
+
+// Scenario 14: pre-serialized compact/gzip payloads with ETag revalidation.
+$ctx_etag = create_context('etag');
+write_alias_file($ctx_etag, [
+  '1-1' => 'pci-0000:01:00.0-sas-phy0-lun-0',
+  '1-2' => 'pci-0000:01:00.0-sas-phy1-lun-0',
+  '2-1' => 'pci-0000:02:00.0-sas-phy0-lun-0',
+], [
+  '1-1' => $ctx_etag['dev_dir'] . '/sda',
+  '2-1' => $ctx_etag['dev_dir'] . '/sdc',
+]);
+set_common_env($ctx_etag, $fixtures);
+putenv('DRIVEMAP_DISABLE_SMART=1');
+putenv('DRIVEMAP_REFRESH_SECONDS=3600');
+[$etag_code] = run_php_script($map_script);
+assert_equal($etag_code, 0, 'generator exits successfully for payload variants');
+$etag_manifest = load_json_file($ctx_etag['out_dir'] . '/drivemap.manifest.json');
+$etag_map = load_json_file($ctx_etag['out_dir'] . '/drivemap.json');
+$etag_compact = (string)@file_get_contents($ctx_etag['out_dir'] . '/drivemap.compact.json');
+$etag_flat = (string)@file_get_contents($ctx_etag['out_dir'] . '/disk_info.compact.json');
+assert_equal($etag_manifest['source']['sha1'] ?? null, sha1_file($ctx_etag['out_dir'] . '/drivemap.json'), 'manifest pins drivemap.json hash');
+assert_equal(json_decode($etag_compact, true), $etag_map, 'compact variant matches drivemap.json');
+$etag_stable = array_diff_key(json_decode($etag_compact, true), ['lsdevDuration' => true, 'timings' => true, 'lastUpdated' => true]);
+assert_equal($etag_manifest['variants']['drivemap']['etag'] ?? null, sha1(json_encode($etag_stable, JSON_UNESCAPED_SLASHES)), 'drivemap variant etag hashes the content without per-run fields');
+assert_equal(gzdecode((string)@file_get_contents($ctx_etag['out_dir'] . '/drivemap.compact.json.gz')), $etag_compact, 'gzip variant matches compact body');
+
+assert_equal(run_api_request($root, ['action' => 'drivemap']), $etag_compact, 'drivemap streams compact variant');
+assert_equal(run_api_request($root, ['action' => 'lsdev']), $etag_compact, 'lsdev streams compact variant');
+$etag_value = 'W/"' . $etag_manifest['variants']['drivemap']['etag'] . '"';
+assert_equal(run_api_request($root, ['action' => 'drivemap'], ['HTTP_IF_NONE_MATCH' => $etag_value]), '', 'matching If-None-Match returns empty 304 body');
+assert_equal(run_api_request($root, ['action' => 'drivemap'], ['HTTP_IF_NONE_MATCH' => '"stale"']), $etag_compact, 'mismatched If-None-Match returns body');
+$etag_gzip = run_api_request($root, ['action' => 'drivemap'], ['HTTP_ACCEPT_ENCODING' => 'gzip, deflate']);
+assert_equal(gzdecode($etag_gzip), $etag_compact, 'gzip-accepting client receives gzip variant');
+assert_equal(run_api_request($root, ['action' => 'disk_info']), $etag_flat, 'disk_info streams flattened variant');
+$etag_flat_rows = json_decode($etag_flat, true)['rows'] ?? [];
+assert_equal(array_column($etag_flat_rows, 'bay-id'), array_column(array_merge(...$etag_map['rows']), 'bay-id'), 'flattened variant keeps bay order');
+// The ETag leaves lastUpdated and timings out, so it goes out as a weak validator.
+$etag_server = start_php_server($root);
+@file_get_contents($etag_server['url'] . '?action=drivemap');
+$etag_header = preg_grep('/^ETag:/i', $http_response_header ?? []);
+stop_php_server($etag_server);
+assert_equal(trim(substr((string)reset($etag_header), 5)), $etag_value, 'drivemap variant is served with a weak ETag');
+
+// Regenerating unchanged hardware rewrites timings but keeps the ETag, so
+// the default refresh-on-every-read mode still answers 304.
+usleep(1100000);
+putenv('DRIVEMAP_REFRESH_SECONDS=0');
+assert_equal(run_api_request($root, ['action' => 'drivemap'], ['HTTP_IF_NONE_MATCH' => $etag_value]), '', 'regenerated map with unchanged slots keeps its ETag');
+assert_true(load_json_file($ctx_etag['out_dir'] . '/drivemap.json')['lastUpdated'] !== $etag_map['lastUpdated'], 'the revalidated read did regenerate the map');
+putenv('DRIVEMAP_REFRESH_SECONDS=3600');
+$etag_map = load_json_file($ctx_etag['out_dir'] . '/drivemap.json');
+
+// Out-of-band edits (dev simulator overlays) bypass the stale variants.
+$etag_map['rows'][0][0]['model-name'] = 'SIMULATED';
+file_put_contents($ctx_etag['out_dir'] . '/drivemap.json', json_encode($etag_map, JSON_PRETTY_PRINT));
+$etag_edited = json_decode(run_api_request($root, ['action' => 'drivemap']), true);
+assert_equal($etag_edited['rows'][0][0]['model-name'] ?? null, 'SIMULATED', 'edited drivemap.json is served instead of stale variant');
+$etag_edited_flat = json_decode(run_api_request($root, ['action' => 'disk_info']), true);
+assert_equal($etag_edited_flat['rows'][0]['model-name'] ?? null, 'SIMULATED', 'edited drivemap.json is flattened for disk_info');
+putenv('DRIVEMAP_DISABLE_SMART');
+putenv('DRIVEMAP_REFRESH_SECONDS');
+
+// Scenario 15: versioned change feed with since= deltas and an SSE stream.
+$ctx_feed = create_context('changes');
+$feed_symlinks = [
+  '1-1' => $ctx_feed['dev_dir'] . '/sda',
+  '1-2' => $ctx_feed['dev_dir'] . '/sdb',
+  '2-1' => $ctx_feed['dev_dir'] . '/sdc',
+];
+$feed_aliases = [
+  '1-1' => 'pci-0000:01:00.0-sas-phy0-lun-0',
+  '1-2' => 'pci-0000:01:00.0-sas-phy1-lun-0',
+  '2-1' => 'pci-0000:02:00.0-sas-phy0-lun-0',
+];
+write_alias_file($ctx_feed, $feed_aliases, $feed_symlinks);
+set_common_env($ctx_feed, $fixtures);
+putenv('DRIVEMAP_DISABLE_SMART=1');
+putenv('DRIVEMAP_REFRESH_SECONDS=3600');
+run_php_script($map_script);
+$feed_map = load_json_file($ctx_feed['out_dir'] . '/drivemap.json');
+assert_equal($feed_map['version'] ?? null, 1, 'first generation starts the map at version 1');
+$feed_delta = json_decode(run_api_request($root, ['action' => 'changes', 'since' => '1']), true);
+assert_equal($feed_delta['version'] ?? null, 1, 'changes reports current version');
+assert_equal($feed_delta['slots'] ?? null, [], 'no slot changes at current version');
+run_php_script($map_script);
+assert_equal(load_json_file($ctx_feed['out_dir'] . '/drivemap.json')['version'] ?? null, 1, 'unchanged generation keeps version');
+
+// Hot-unplug 2-1.
+unlink($ctx_feed['by_path_dir'] . '/' . $feed_aliases['2-1']);
+run_php_script($map_script);
+$feed_body = run_api_request($root, ['action' => 'changes', 'since' => '1']);
+$feed_delta = json_decode($feed_body, true);
+assert_equal($feed_delta['version'] ?? null, 2, 'slot change bumps version');
+assert_equal(array_keys($feed_delta['slots'] ?? []), ['2-1'], 'delta only carries the changed bay');
+assert_equal($feed_delta['slots']['2-1']['occupied'] ?? null, false, 'delta carries changed field value');
+assert_true(!array_key_exists('bay-id', $feed_delta['slots']['2-1'] ?? []), 'delta omits unchanged fields');
+assert_true(strlen($feed_body) < 1024, 'delta payload stays small');
+$feed_reset = json_decode(run_api_request($root, ['action' => 'changes', 'since' => '0']), true);
+assert_equal($feed_reset['reset'] ?? null, true, 'versions older than the log base ask for a full refetch');
+
+putenv('DRIVEMAP_SSE_SECONDS=1');
+putenv('DRIVEMAP_SSE_REFRESH_SECONDS=0');
+$feed_stream = run_api_request($root, ['action' => 'changes', 'stream' => '1'], ['HTTP_LAST_EVENT_ID' => '1']);
+assert_true(strpos($feed_stream, "id: 2\nevent: slots\ndata: ") !== false, 'SSE stream emits slot event from Last-Event-ID');
+$feed_stream = run_api_request($root, ['action' => 'changes', 'stream' => '1', 'since' => '2']);
+assert_true(strpos($feed_stream, 'event:') === false, 'SSE stream is quiet when client is current');
+putenv('DRIVEMAP_SSE_SECONDS');
+putenv('DRIVEMAP_SSE_REFRESH_SECONDS');
+putenv('DRIVEMAP_DISABLE_SMART');
+putenv('DRIVEMAP_REFRESH_SECONDS');
+
+// Scenario 16: per-phase/per-device timings in the payload, rolling stats and
+// the Prometheus metrics action.
+$ctx_metrics = create_context('metrics');
+write_alias_file($ctx_metrics, [
+  '1-1' => 'pci-0000:01:00.0-sas-phy0-lun-0',
+  '1-2' => 'pci-0000:01:00.0-sas-phy1-lun-0',
+], [
+  '1-1' => $ctx_metrics['dev_dir'] . '/sda',
+  '1-2' => $ctx_metrics['dev_dir'] . '/sdb',
+]);
+set_common_env($ctx_metrics, $fixtures);
+putenv('DRIVEMAP_SMARTCTL_DIR=' . $fixtures . '/smart');
+putenv('DRIVEMAP_REFRESH_SECONDS=3600');
+run_php_script($map_script);
+$metrics_map = load_json_file($ctx_metrics['out_dir'] . '/drivemap.json');
+$metrics_timings = $metrics_map['timings'] ?? [];
+assert_equal(array_keys($metrics_timings['phases'] ?? []), ['server_info', 'aliases', 'inventory', 'ini', 'slots', 'smart', 'layout'], 'payload timings list generator phases in order');
+assert_true(!isset($metrics_timings['devices']), 'per-device timings stay out of the payload');
+assert_equal($metrics_timings['commands'][0]['command'] ?? null, '45d-generate-server-info', 'payload timings record the server_info command');
+assert_true(isset($metrics_timings['serverInfo']['phases']['alias_inference']), 'server_info phase timings are folded into the payload');
+assert_equal($metrics_timings['serverInfo']['source'] ?? null, 'inferred', 'server_info timings record the source used');
+$metrics_stats = load_json_file($ctx_metrics['out_dir'] . '/drivemap.stats.json');
+assert_equal(count($metrics_stats['runs'] ?? []), 1, 'stats file records the run');
+assert_true(isset($metrics_stats['runs'][0]['phases']['write']), 'stats file includes the write phase');
+assert_equal($metrics_stats['histograms']['generator_seconds']['count'] ?? null, 1, 'generator histogram counts the run');
+assert_equal(array_column($metrics_stats['devices'] ?? [], 'bay-id'), ['1-1', '1-2'], 'stats file lists each probed device');
+
+putenv('DRIVEMAP_ZFS_FORCE=1');
+putenv('DRIVEMAP_ZFS_FIXTURE_DIR=' . $fixtures . '/zfs_batch');
+$metrics_zfs = json_decode(run_api_action($root, 'zfs_info')[1], true);
+assert_true(in_array('zpool list -H', array_column($metrics_zfs['timings']['commands'] ?? [], 'command'), true), 'zfs_info timings list zpool commands');
+// Commands run outside a collection (the sampler loop) are not logged, and
+// each collection reports only its own commands.
+$timings_snippet = 'require "' . addslashes($root . '/php/zfs_info.php') . '";'
+  . ' for ($i = 0; $i < 50; $i++) { command_output("true"); }'
+  . ' $idle = count(zfs_command_timings());'
+  . ' $first = count(generate_zfs_info()["timings"]["commands"]);'
+  . ' $second = count(generate_zfs_info()["timings"]["commands"]);'
+  . ' echo json_encode([$idle, $first === $second, count(zfs_command_timings())]);';
+assert_equal(json_decode((string)shell_exec('php -r ' . escapeshellarg($timings_snippet)), true), [0, true, 0], 'zfs command log is bounded to one collection');
+[$metrics_code, $metrics_body] = run_api_action($root, 'metrics');
+assert_equal($metrics_code, 0, 'metrics action exits successfully');
+assert_true(strpos($metrics_body, "# TYPE drivemap_generator_duration_seconds histogram\n") !== false, 'metrics exposes the generator histogram');
+assert_true(strpos($metrics_body, 'drivemap_generator_duration_seconds_bucket{le="+Inf"} 1') !== false, 'metrics histogram +Inf bucket counts runs');
+assert_true(strpos($metrics_body, 'drivemap_slowest_device_seconds_count 1') !== false, 'metrics exposes the slowest-device histogram');
+assert_true(strpos($metrics_body, 'drivemap_device_smart_seconds{bay="1-2",dev=') !== false, 'metrics exposes per-device SMART time');
+assert_true(strpos($metrics_body, 'drivemap_generator_phase_seconds{phase="smart"}') !== false, 'metrics exposes generator phases');
+assert_true(strpos($metrics_body, 'drivemap_zfs_info_duration_seconds_count 1') !== false, 'metrics exposes the zfs_info histogram');
+run_php_script($map_script);
+$metrics_stats = load_json_file($ctx_metrics['out_dir'] . '/drivemap.stats.json');
+assert_equal($metrics_stats['histograms']['generator_seconds']['count'] ?? null, 2, 'generator histogram accumulates across runs');
+putenv('DRIVEMAP_ZFS_FORCE');
+putenv('DRIVEMAP_ZFS_FIXTURE_DIR');
+putenv('DRIVEMAP_REFRESH_SECONDS');
+
+// Scenario 17: every generator row template matches upstream lsdev in one
+// bulk comparison.
+$generator_templates = json_decode((string)shell_exec('php ' . escapeshellarg($map_script) . ' --row-templates'), true);
+$upstream_templates = vendor_templates($root);
+assert_true(is_array($generator_templates) && $generator_templates, 'generator dumps its row templates');
+assert_true(is_array($upstream_templates) && $upstream_templates, 'vendor alias_template table is available');
+assert_equal($generator_templates, $upstream_templates, 'row_templates() matches upstream alias_template for every style/chassis');
+
+// Scenario 18: a matching sysfs hardware fingerprint skips identification;
+// hardware or alias changes and --force re-run it.
+$ctx_fp = create_context('fingerprint');
+write_alias_file($ctx_fp, alias_map_from_fixture($fixtures . '/vdev_id_h16_q30.conf'), []);
+set_common_env($ctx_fp, $fixtures);
+$fp_dmi = $ctx_fp['tmp'] . '/dmi';
+$fp_hba = $ctx_fp['tmp'] . '/pci/0000:01:00.0';
+ensure_dir($fp_dmi);
+ensure_dir($fp_hba);
+file_put_contents($fp_dmi . '/product_name', "Storinator\n");
+file_put_contents($fp_dmi . '/product_serial', "FP-0001\n");
+file_put_contents($fp_hba . '/class', "0x010700\n");
+file_put_contents($fp_hba . '/vendor', "0x1000\n");
+file_put_contents($fp_hba . '/device', "0x00c9\n");
+$fp_counter = $ctx_fp['tmp'] . '/identifier.count';
+$fp_identifier = $ctx_fp['tmp'] . '/server_identifier';
+file_put_contents($fp_identifier, "#!/bin/sh\necho x >> " . escapeshellarg($fp_counter) . "\nexit 1\n");
+chmod($fp_identifier, 0755);
+putenv('DRIVEMAP_VENDOR_SERVER_IDENTIFIER=' . $fp_identifier);
+putenv('DRIVEMAP_DMI_ROOT=' . $fp_dmi);
+putenv('DRIVEMAP_PCI_DEVICES=' . dirname($fp_hba));
+$fp_runs = function () use ($fp_counter) {
+  return count(@file($fp_counter) ?: []);
+};
+$fp_source = function () use ($ctx_fp) {
+  return load_json_file($ctx_fp['out_dir'] . '/server-info.timings.json')['source'] ?? null;
+};
+run_php_script($server_script);
+assert_equal($fp_runs(), 1, 'first identification runs server_identifier');
+assert_true(!is_file($ctx_fp['out_dir'] . '/server_info.fingerprint'), 'failed identification does not store a fingerprint');
+run_php_script($server_script);
+assert_equal($fp_runs(), 2, 'inferred result after a failed identification is not pinned');
+// Without a server_identifier, inference is the final answer and is pinned.
+putenv('DRIVEMAP_VENDOR_SERVER_IDENTIFIER=' . $ctx_fp['tmp'] . '/no-server_identifier');
+run_php_script($server_script);
+assert_equal($fp_source(), 'inferred', 'identification falls back to inference');
+assert_true(is_file($ctx_fp['out_dir'] . '/server_info.fingerprint'), 'fingerprint stored next to server_info.json');
+run_php_script($server_script);
+assert_equal($fp_source(), 'fingerprint', 'matching fingerprint skips identification');
+exec('php ' . escapeshellarg($server_script) . ' --force');
+assert_equal($fp_source(), 'inferred', '--force re-identifies despite a matching fingerprint');
+file_put_contents($fp_hba . '/device', "0x00e6\n");
+run_php_script($server_script);
+assert_equal($fp_source(), 'inferred', 'storage controller change re-identifies');
+run_php_script($server_script);
+assert_equal($fp_source(), 'fingerprint', 'new fingerprint is pinned');
+file_put_contents($ctx_fp['alias_file'], "alias 1-1 /dev/disk/by-path/pci-0000:01:00.0-sas-phy0-lun-0\n");
+run_php_script($server_script);
+assert_equal($fp_source(), 'inferred', 'alias file change re-identifies');
+assert_equal(load_json_file($ctx_fp['out_dir'] . '/server_info.json')['Serial'] ?? null, 'FP-0001', 'inference reads DMI from the fingerprinted root');
+putenv('DRIVEMAP_DMI_ROOT');
+putenv('DRIVEMAP_PCI_DEVICES');
+putenv('DRIVEMAP_VENDOR_SERVER_IDENTIFIER=/bin/false');
+
+// Scenario 19: 45d-generate-vdev-id enumerates controllers and SATA ports from
+// sysfs and by-path links, matching the lspci/lshw-mocked parity cases.
+$ctx_hw = create_context('hwenum');
+$hw_pci = $ctx_hw['tmp'] . '/pci';
+$hw_devices = [
+  '0000:00:17.0' => ['0x010601', '0x8086', '0xa182'],
+  '0000:00:1f.6' => ['0x020000', '0x8086', '0x15b8'],
+  '0000:05:00.0' => ['0x010700', '0x1000', '0x0097'],
+  '0000:06:00.0' => ['0x010601', '0x1b21', '0x1166'],
+];
+foreach ($hw_devices as $hw_address => [$hw_class, $hw_vendor, $hw_device]) {
+  ensure_dir($hw_pci . '/' . $hw_address);
+  file_put_contents($hw_pci . '/' . $hw_address . '/class', $hw_class . "\n");
+  file_put_contents($hw_pci . '/' . $hw_address . '/vendor', $hw_vendor . "\n");
+  file_put_contents($hw_pci . '/' . $hw_address . '/device', $hw_device . "\n");
+}
+$hw_env = ['DRIVEMAP_PCI_DEVICES' => $hw_pci];
+$hw_av15 = run_ported_dmap($root, $ctx_hw, vendor_dmap_case_server($root, 'av15_base'), $hw_env);
+assert_equal($hw_av15['code'], 0, 'sysfs AV15-BASE enumeration succeeds');
+assert_equal($hw_av15['aliases'], vendor_dmap_alias_lines($root, 'av15_base'), 'sysfs SAS3008/Intel SATA lookup matches lspci-mocked upstream');
+$hw_hl8 = run_ported_dmap($root, $ctx_hw, vendor_dmap_case_server($root, 'homelab_hl8'), $hw_env);
+assert_equal($hw_hl8['aliases'][0] ?? null, 'alias 1-1 /dev/disk/by-path/pci-0000:00:17.0-ata-4', 'HL8 first SATA controller from sysfs class');
+assert_equal($hw_hl8['aliases'][4] ?? null, 'alias 2-1 /dev/disk/by-path/pci-0000:06:00.0-ata-4', 'HL8 second SATA controller from sysfs class');
+$hw_none = run_ported_dmap($root, $ctx_hw, vendor_dmap_case_server($root, 'homelab_hl8'));
+assert_true($hw_none['code'] !== 0, 'HL8 without SATA controllers fails');
+putenv('DRIVEMAP_BY_PATH_DIR=' . $ctx_hw['by_path_dir']);
+foreach (['pci-0000:00:17.0-ata-2', 'pci-0000:00:17.0-ata-2.0', 'pci-0000:00:17.0-ata-10.0', 'pci-0000:00:17.0-ata-1'] as $hw_link) {
+  @symlink($ctx_hw['dev_dir'] . '/sda', $ctx_hw['by_path_dir'] . '/' . $hw_link);
+}
+$hw_ports = json_decode((string)shell_exec('php -r ' . escapeshellarg('require "' . addslashes($root . '/php/hardware_inventory.php') . '"; echo json_encode(hardware_inventory()["ata_ports"]);')), true);
+assert_equal($hw_ports['0000:00:17.0'] ?? null, [
+  $ctx_hw['by_path_dir'] . '/pci-0000:00:17.0-ata-1',
+  $ctx_hw['by_path_dir'] . '/pci-0000:00:17.0-ata-2',
+  $ctx_hw['by_path_dir'] . '/pci-0000:00:17.0-ata-10.0',
+], 'by-path ATA ports are sorted numerically and prefer the base link');
+putenv('DRIVEMAP_BY_PATH_DIR');
+
+// Scenario 20: fleet collection from stand-in api.php hosts serving fixture
+// maps; the second pass revalidates every action with If-None-Match.
+if (!function_exists('curl_multi_init')) {
+  fwrite(STDOUT, "Skipping fleet collection checks: PHP curl extension not available.\n");
+} else {
+  $fleet_script = $root . '/scripts/45d-fleet-collect';
+  // Host a's pool was built on a kernel partition name for bay 1-2.
+  $fleet_zfs_dir = create_context('fleet-zfs')['tmp'] . '/zfs';
+  ensure_dir($fleet_zfs_dir);
+  foreach (glob($fixtures . '/zfs/*') as $fleet_fixture) {
+    $fleet_text = (string)file_get_contents($fleet_fixture);
+    if (strpos(basename($fleet_fixture), '_path_') === false) {
+      $fleet_text = preg_replace('/(?<=\s)1-2(?=\s)/', 'sdb1', $fleet_text);
+    }
+    file_put_contents($fleet_zfs_dir . '/' . basename($fleet_fixture), $fleet_text);
+  }
+  $fleet_hosts = [
+    'a' => [['1-1' => 'sda', '1-2' => 'sdb', '2-1' => 'sdc'], $fleet_zfs_dir, 'FLEET-A'],
+    'b' => [['1-1' => 'sdc'], '', 'FLEET-B'],
+  ];
+  $fleet_servers = [];
+  foreach ($fleet_hosts as $fleet_name => [$fleet_bays, $fleet_zfs, $fleet_serial]) {
+    $ctx_host = create_context('fleet-' . $fleet_name);
+    $fleet_alias = [];
+    $fleet_links = [];
+    foreach ($fleet_bays as $bay_id => $dev) {
+      $fleet_alias[$bay_id] = 'pci-0000:01:00.0-sas-phy' . count($fleet_alias) . '-lun-0';
+      $fleet_links[$bay_id] = $ctx_host['dev_dir'] . '/' . $dev;
+    }
+    write_alias_file($ctx_host, $fleet_alias, $fleet_links);
+    file_put_contents($ctx_host['tmp'] . '/server_info.json', json_encode(['Model' => 'Storinator-H16', 'Serial' => $fleet_serial]));
+    set_common_env($ctx_host, $fixtures);
+    putenv('DRIVEMAP_SERVER_INFO=' . $ctx_host['tmp'] . '/server_info.json');
+    putenv('DRIVEMAP_SMARTCTL_DIR=' . $fixtures . '/smart');
+    putenv('DRIVEMAP_REFRESH_SECONDS=3600');
+    putenv('DRIVEMAP_ZFS_FORCE=' . ($fleet_zfs !== '' ? '1' : ''));
+    putenv('DRIVEMAP_ZFS_FIXTURE_DIR=' . $fleet_zfs);
+    [$fleet_gen_code] = run_php_script($map_script);
+    assert_equal($fleet_gen_code, 0, "fleet host $fleet_name map generated");
+    $fleet_servers[$fleet_name] = start_php_server($root);
+  }
+  putenv('DRIVEMAP_SMARTCTL_DIR=');
+  putenv('DRIVEMAP_REFRESH_SECONDS');
+  putenv('DRIVEMAP_ZFS_FORCE');
+  putenv('DRIVEMAP_ZFS_FIXTURE_DIR');
+  putenv('DRIVEMAP_SERVER_INFO=');
+
+  $ctx_fleet = create_context('fleet');
+  ensure_dir($ctx_fleet['tmp'] . '/slow/php');
+  file_put_contents($ctx_fleet['tmp'] . '/slow/php/api.php', "<?php sleep(5);\n");
+  $fleet_slow = start_php_server($ctx_fleet['tmp'] . '/slow');
+  $fleet_dead = 'http://127.0.0.1:' . free_local_port() . '/php/api.php';
+  putenv('DRIVEMAP_OUTPUT_DIR=' . $ctx_fleet['out_dir']);
+  $fleet_run = function ($args) use ($fleet_script) {
+    $output = [];
+    $code = 0;
+    exec('php ' . escapeshellarg($fleet_script) . ' ' . implode(' ', array_map('escapeshellarg', $args)) . ' 2>/dev/null', $output, $code);
+    return [$code, json_decode(implode("\n", $output), true)];
+  };
+  $fleet_urls = [$fleet_servers['a']['url'] . ' host-a', $fleet_servers['b']['url'] . ' host-b', $fleet_slow['url'] . ' host-slow', $fleet_dead . ' host-dead'];
+  file_put_contents($ctx_fleet['tmp'] . '/hosts.txt', "# rack 1\n" . implode("\n", $fleet_urls) . "\n");
+
+  $fleet_started = microtime(true);
+  [$fleet_code, $fleet_summary] = $fleet_run(['--hosts-file=' . $ctx_fleet['tmp'] . '/hosts.txt', '--timeout=2', '--concurrency=3']);
+  assert_true(microtime(true) - $fleet_started < 4.5, 'slow host is cut off by the per-request timeout');
+  assert_equal($fleet_code, 1, 'fleet collector exits 1 when a host fails');
+  $fleet = load_json_file($ctx_fleet['out_dir'] . '/fleet.json');
+  assert_equal($fleet_summary['drives'] ?? null, 4, 'fleet summary counts drives from reachable hosts');
+  assert_equal([$fleet['hosts']['host-a']['ok'] ?? null, $fleet['hosts']['host-b']['ok'] ?? null], [true, true], 'stand-in hosts collected');
+  assert_equal([$fleet['hosts']['host-slow']['ok'] ?? null, $fleet['hosts']['host-dead']['ok'] ?? null], [false, false], 'slow and dead hosts reported');
+  assert_equal($fleet['hosts']['host-a']['serial'] ?? null, 'FLEET-A', 'server_info merged per host');
+  assert_equal($fleet['hosts']['host-a']['pools'] ?? null, [['name' => 'tank', 'state' => 'ONLINE']], 'zfs pools merged per host');
+  assert_equal(array_map(fn($drive) => $drive['host'] . '/' . $drive['bay-id'], $fleet['drives'] ?? []), ['host-a/1-1', 'host-a/1-2', 'host-a/2-1', 'host-b/1-1'], 'fleet drives keep host and bay order');
+  assert_equal($fleet['drives'][0]['zpool'] ?? null, 'tank', 'drives joined with zfs membership');
+  assert_equal([$fleet['drives'][1]['zpool'] ?? null, $fleet['drives'][1]['zfs-state'] ?? null], ['tank', 'ONLINE'], 'pool members named by kernel partition join their bay');
+
+  [, $fleet_serial_hits] = $fleet_run(['--cached', '--serial=SAMPLE0002']);
+  assert_equal(array_map(fn($drive) => [$drive['host'], $drive['bay-id'], $drive['temperature']], $fleet_serial_hits ?? []), [['host-a', '1-2', 30]], 'query by serial');
+  [, $fleet_health_hits] = $fleet_run(['--cached', '--health=ok']);
+  assert_equal(count($fleet_health_hits ?? []), 4, 'query by health');
+  [, $fleet_temp_hits] = $fleet_run(['--cached', '--temp-min=33', '--temp-max=34']);
+  assert_equal(array_map(fn($drive) => $drive['host'] . '/' . $drive['bay-id'], $fleet_temp_hits ?? []), ['host-a/2-1', 'host-b/1-1'], 'query by temperature range');
+
+  [, $fleet_again] = $fleet_run([$fleet_servers['a']['url'] . ' host-a', $fleet_servers['b']['url'] . ' host-b']);
+  assert_equal([$fleet_again['hosts']['host-a']['notModified'] ?? null, $fleet_again['hosts']['host-b']['notModified'] ?? null], [2, 2], 'unchanged hosts answer every action with 304');
+  assert_equal($fleet_again['drives'] ?? null, 4, '304 responses reuse cached bodies');
+
+  stop_php_server($fleet_servers['a']);
+  [$fleet_down_code, $fleet_down] = $fleet_run(['--timeout=1', $fleet_servers['a']['url'] . ' host-a']);
+  assert_equal($fleet_down_code, 1, 'unreachable host fails the run');
+  assert_equal([$fleet_down['hosts']['host-a']['stale'] ?? null, $fleet_down['drives'] ?? null], [true, 3], 'unreachable host keeps last snapshot as stale');
+
+  // A host behind the webGUI login answers with its HTML login page until the
+  // per-host (or default) session header is sent.
+  ensure_dir($ctx_fleet['tmp'] . '/login/php');
+  file_put_contents($ctx_fleet['tmp'] . '/login/php/api.php', "<?php\nif ((\$_SERVER['HTTP_COOKIE'] ?? '') !== 'unraid_fleet=ok') {\n  echo '<!DOCTYPE html><title>Login</title>';\n  exit;\n}\necho json_encode(['rows' => [], 'Model' => 'Storinator-Q30']);\n");
+  $fleet_login = start_php_server($ctx_fleet['tmp'] . '/login');
+  [$fleet_login_code, $fleet_anon] = $fleet_run([$fleet_login['url'] . ' host-login']);
+  assert_equal($fleet_login_code, 1, 'login page fails the run');
+  assert_true(strpos(implode('', $fleet_anon['hosts']['host-login']['errors'] ?? []), 'authentication required (non-JSON response)') !== false, 'non-JSON 200 is reported as an auth error');
+  [, $fleet_authed] = $fleet_run([$fleet_login['url'] . ' host-login Cookie: unraid_fleet=ok']);
+  assert_equal($fleet_authed['hosts']['host-login']['ok'] ?? null, true, 'per-host header authenticates');
+  putenv('DRIVEMAP_FLEET_HEADER=Cookie: unraid_fleet=ok');
+  [, $fleet_default_auth] = $fleet_run([$fleet_login['url']]);
+  putenv('DRIVEMAP_FLEET_HEADER');
+  assert_equal(array_column($fleet_default_auth['hosts'] ?? [], 'ok'), [true], 'DRIVEMAP_FLEET_HEADER applies to hosts without their own');
+  stop_php_server($fleet_login);
+  stop_php_server($fleet_servers['b']);
+  stop_php_server($fleet_slow);
+}
+
+// Scenario 21: SMART history store. Fresh probes append fixed-size records
+// per serial; smart_history serves per-bay trends, and old samples roll up
+// into hourly and daily tiers.
+$ctx_hist = create_context('smart-history');
+write_alias_file($ctx_hist, [
+  '1-1' => 'pci-0000:01:00.0-sas-phy0-lun-0',
+  '1-2' => 'pci-0000:01:00.0-sas-phy1-lun-0',
+], [
+  '1-1' => $ctx_hist['dev_dir'] . '/sda',
+  '1-2' => $ctx_hist['dev_dir'] . '/sdb',
+]);
+set_common_env($ctx_hist, $fixtures);
+putenv('DRIVEMAP_SMARTCTL_DIR=' . $fixtures . '/smart');
+putenv('DRIVEMAP_SMART_TTL_COUNTERS=0');
+putenv('DRIVEMAP_SMART_TTL_HEALTH=0');
+putenv('DRIVEMAP_SMART_HISTORY_INTERVAL=0');
+putenv('DRIVEMAP_REFRESH_SECONDS=3600');
+run_php_script($map_script);
+[$hist_code] = run_php_script($map_script);
+assert_equal($hist_code, 0, 'generator exits successfully with SMART history');
+assert_equal(@filesize($ctx_hist['out_dir'] . '/smart-history/SAMPLE0001.raw'), 38, 'two fixed-size raw records per probed serial');
+$hist = json_decode(run_api_request($root, ['action' => 'smart_history', 'bay' => '1-1']), true);
+assert_equal(array_column($hist['bays'] ?? [], 'serial'), ['SAMPLE0001'], 'smart_history filters by bay');
+assert_equal(array_column($hist['bays'][0]['samples'] ?? [], 'tempC'), [35, 35], 'smart_history returns raw samples');
+assert_equal($hist['bays'][0]['trend']['pendingSectors'] ?? null, ['first' => 0, 'last' => 0, 'delta' => 0, 'growing' => false], 'flat pending-sector trend');
+assert_equal($hist['bays'][0]['trend']['health'] ?? null, 'OK', 'trend carries last health');
+$hist_all = json_decode(run_api_request($root, ['action' => 'smart_history']), true);
+assert_equal(array_column($hist_all['bays'] ?? [], 'bay-id'), ['1-1', '1-2'], 'smart_history covers every mapped serial');
+putenv('DRIVEMAP_SMARTCTL_DIR=');
+putenv('DRIVEMAP_SMART_TTL_COUNTERS');
+putenv('DRIVEMAP_SMART_TTL_HEALTH');
+putenv('DRIVEMAP_SMART_HISTORY_INTERVAL');
+putenv('DRIVEMAP_REFRESH_SECONDS');
+
+// 40 days of half-hourly samples with one new pending sector per day.
+$hist_snippet = 'require ' . var_export($root . '/php/smart_history.php', true) . ';'
+  . '$dir = ' . var_export($ctx_hist['tmp'] . '/tiers', true) . '; $t0 = 86400 * 19700;'
+  . 'for ($i = 0; $i < 40 * 48; $i++) {'
+  . '  $now = $t0 + $i * 1800;'
+  . '  smart_history_record($dir, ["serial" => "TREND 1", "temp-c" => (30 + $i % 10) . " C", "current-pending-sector" => (string)intdiv($i, 48), "health" => "OK"], $now);'
+  . '}'
+  . '$samples = smart_history_load($dir, "TREND 1");'
+  . 'echo json_encode(["tiers" => array_count_values(array_column($samples, "tier")), "trend" => smart_history_trend($samples), "last" => end($samples)["time"] - $t0]);';
+$hist_tiers = json_decode((string)shell_exec('php -r ' . escapeshellarg($hist_snippet)), true);
+assert_equal($hist_tiers['tiers'] ?? null, ['daily' => 9, 'hourly' => 719, 'raw' => 50], 'raw kept 24h, hourly 30 days, daily beyond');
+assert_equal($hist_tiers['last'] ?? null, 40 * 86400 - 1800, 'newest raw sample is the last probe');
+assert_equal($hist_tiers['trend']['pendingSectors'] ?? null, ['first' => 0, 'last' => 39, 'delta' => 39, 'growing' => true], 'growing pending sectors survive downsampling');
+assert_equal($hist_tiers['trend']['temperature'] ?? null, ['min' => 30, 'max' => 39, 'last' => 39], 'rolled-up buckets keep peak temperature');
+assert_true(is_file($ctx_hist['tmp'] . '/tiers/TREND%201.daily'), 'serials are URL-encoded into file names');
+putenv('DRIVEMAP_SMART_HISTORY_DAYS=5');
+$hist_capped = json_decode((string)shell_exec('php -r ' . escapeshellarg(str_replace('/tiers', '/tiers-capped', $hist_snippet))), true);
+assert_equal($hist_capped['tiers']['daily'] ?? null, 5, 'daily tier is capped by DRIVEMAP_SMART_HISTORY_DAYS');
+putenv('DRIVEMAP_SMART_HISTORY_DAYS');
+
+// Scenario 22: streaming table renderer and the 45d-drivemap-table CLI.
+$table_script = $root . '/scripts/45d-drivemap-table';
+$table_map = (string)shell_exec('python3 ' . escapeshellarg($table_script) . ' --plain ' . escapeshellarg($ctx_hist['out_dir'] . '/drivemap.json'));
+$table_lines = explode("\n", rtrim($table_map, "\n"));
+assert_equal(count(array_unique(array_map('strlen', $table_lines))), 1, 'drivemap table lines share one width');
+assert_equal(count(preg_grep('/^\| 1-[12] /', $table_lines)), 2, 'drivemap table has one line per bay');
+assert_true((bool)preg_grep('/^\| 1-1 .*\| SAMPLE0001 .*\| OK /', $table_lines), 'drivemap table shows serial and health');
+file_put_contents($ctx_hist['tmp'] . '/zfs_info.json', $zfs_body);
+$table_zfs = (string)shell_exec('python3 ' . escapeshellarg($table_script) . ' --zfs --plain --columns=name,zpool_name,state - < ' . escapeshellarg($ctx_hist['tmp'] . '/zfs_info.json'));
+assert_true((bool)preg_match('/^\| 1-1 +\| tank +\| ONLINE +\|$/m', $table_zfs), 'zfs table lists pool members');
+$table_twice = (string)shell_exec('python3 -c ' . escapeshellarg(
+  'import io, sys; sys.path.insert(0, ' . var_export($root . '/vendor/45drives/tools/tools', true) . ');'
+  . 'from table_print import table_print;'
+  . 'h, l, c = ["Head"], ["A", "B"], [[("a", "GREEN"), ("aa", "")], [("b", "")]];'
+  . 'out = io.StringIO(); sys.stdout, real = out, sys.stdout;'
+  . 'table_print(True, 2, h, l, c, 1); first = out.getvalue(); table_print(True, 2, h, l, c, 1);'
+  . 'sys.stdout = real; print(out.getvalue() == first * 2 and (h, l, c) == (["Head"], ["A", "B"], [[("a", "GREEN"), ("aa", "")], [("b", "")]]))'
+));
+assert_equal(trim($table_twice), 'True', 'table_print leaves its inputs untouched between renders');
+$table_big = ['rows' => []];
+for ($row = 1; $row <= 10; $row++) {
+  for ($bay = 1; $bay <= 24; $bay++) {
+    $table_big['rows'][$row - 1][] = ['bay-id' => "$row-$bay", 'occupied' => true, 'serial' => str_repeat('S', 20), 'health' => 'OK'];
+  }
+}
+file_put_contents($ctx_hist['tmp'] . '/big.json', json_encode($table_big));
+shell_exec('python3 ' . escapeshellarg($table_script) . ' --plain ' . escapeshellarg($ctx_hist['tmp'] . '/big.json')
+  . ' 2>' . escapeshellarg($ctx_hist['tmp'] . '/table.err') . ' | head -n 1 >/dev/null');
+assert_equal((string)@file_get_contents($ctx_hist['tmp'] . '/table.err'), '', 'piping into head exits quietly');
+
+// Scenario 23: 45d-drivemap-watch regenerates only bays whose by-path link
+// changed (--slots), and reads skip regeneration while the watcher runs.
+$watch_script = $root . '/scripts/45d-drivemap-watch';
+$ctx_watch = create_context('watch');
+$watch_alias = [
+  '1-1' => 'pci-0000:01:00.0-sas-phy0-lun-0',
+  '1-2' => 'pci-0000:01:00.0-sas-phy1-lun-0',
+  '2-1' => 'pci-0000:02:00.0-sas-phy0-lun-0',
+];
+write_alias_file($ctx_watch, $watch_alias, [
+  '1-1' => $ctx_watch['dev_dir'] . '/sda',
+  '1-2' => $ctx_watch['dev_dir'] . '/sdb',
+]);
+set_common_env($ctx_watch, $fixtures);
+putenv('DRIVEMAP_SMARTCTL_DIR=' . $fixtures . '/smart');
+putenv('DRIVEMAP_SMART_TTL_COUNTERS=0');
+$watch_map_file = $ctx_watch['out_dir'] . '/drivemap.json';
+$watch_once = function () use ($watch_script) {
+  $output = [];
+  $code = 0;
+  exec('php ' . escapeshellarg($watch_script) . ' --once', $output, $code);
+  return $code;
+};
+$watch_code = $watch_once();
+assert_equal($watch_code, 0, 'watcher --once exits successfully');
+$watch_first = load_json_file($watch_map_file);
+assert_true(is_array($watch_first) && !isset($watch_first['timings']['partial']), 'first watcher pass builds the full map');
+$watch_first_raw = (string)@file_get_contents($watch_map_file);
+$watch_once();
+assert_equal((string)@file_get_contents($watch_map_file), $watch_first_raw, 'unchanged links do not regenerate the map');
+
+unlink($ctx_watch['by_path_dir'] . '/' . $watch_alias['1-2']);
+symlink($ctx_watch['dev_dir'] . '/sdc', $ctx_watch['by_path_dir'] . '/' . $watch_alias['1-2']);
+symlink($ctx_watch['dev_dir'] . '/sdb', $ctx_watch['by_path_dir'] . '/' . $watch_alias['2-1']);
+$watch_once();
+$watch_partial = load_json_file($watch_map_file);
+assert_equal($watch_partial['timings']['partial'] ?? null, ['1-2', '2-1'], 'retargeted and new links regenerate only their bays');
+assert_equal(array_column(load_json_file($ctx_watch['out_dir'] . '/drivemap.stats.json')['devices'] ?? [], 'bay-id'), ['1-2', '2-1'], 'carried-over bays are not probed');
+assert_equal(find_slot($watch_partial['rows'], '1-2')['serial'] ?? null, 'SAMPLE0003', 'retargeted bay shows the new drive');
+assert_equal(find_slot($watch_partial['rows'], '2-1')['serial'] ?? null, 'SAMPLE0002', 'new link fills its bay');
+assert_equal(find_slot($watch_partial['rows'], '1-1'), find_slot($watch_first['rows'], '1-1'), 'untouched bay is carried over verbatim');
+
+file_put_contents($ctx_watch['alias_file'], "alias 2-2 " . $ctx_watch['by_path_dir'] . "/pci-0000:02:00.0-sas-phy1-lun-0\n", FILE_APPEND);
+$watch_once();
+$watch_full = load_json_file($watch_map_file);
+assert_true(is_array(find_slot($watch_full['rows'] ?? [], '2-2')) && !isset($watch_full['timings']['partial']), 'alias file edits trigger a full run');
+
+putenv('DRIVEMAP_WATCH_MODE=poll');
+putenv('DRIVEMAP_WATCH_POLL=1');
+putenv('DRIVEMAP_WATCH_FULL_INTERVAL=0');
+$watch_devnull = ['file', '/dev/null', 'w'];
+$watch_pipes = [];
+$watch_process = proc_open('exec php ' . escapeshellarg($watch_script), [1 => $watch_devnull, 2 => $watch_devnull], $watch_pipes);
+for ($i = 0; $i < 50 && !is_file($ctx_watch['out_dir'] . '/drivemap-watch.pid'); $i++) {
+  usleep(100000);
+}
+unlink($ctx_watch['by_path_dir'] . '/' . $watch_alias['1-1']);
+$watch_removed = null;
+for ($i = 0; $i < 100; $i++) {
+  $watch_removed = find_slot(load_json_file($watch_map_file)['rows'] ?? [], '1-1');
+  if (is_array($watch_removed) && $watch_removed['occupied'] === false) {
+    break;
+  }
+  usleep(100000);
+}
+assert_equal($watch_removed['occupied'] ?? null, false, 'running watcher picks up a removed drive');
+$watch_before_read = (string)@file_get_contents($watch_map_file);
+run_api_action($root, 'drivemap');
+assert_equal((string)@file_get_contents($watch_map_file), $watch_before_read, 'reads do not regenerate while the watcher runs');
+assert_equal(json_decode(run_api_action($root, 'status')[1], true)['watcher'] ?? null, true, 'status reports the running watcher');
+// Bays added under a by-path directory that was not watched at startup.
+$watch_late_dir = $ctx_watch['tmp'] . '/by-path-late';
+ensure_dir($watch_late_dir);
+file_put_contents($ctx_watch['alias_file'], "alias 3-1 " . $watch_late_dir . "/pci-0000:03:00.0-sas-phy0-lun-0\n", FILE_APPEND);
+for ($i = 0; $i < 100 && strpos((string)@file_get_contents($ctx_watch['out_dir'] . '/drivemap.log'), 'watch: alias file changed') === false; $i++) {
+  usleep(100000);
+}
+symlink($ctx_watch['dev_dir'] . '/sda', $watch_late_dir . '/pci-0000:03:00.0-sas-phy0-lun-0');
+$watch_late = null;
+for ($i = 0; $i < 100; $i++) {
+  $watch_late = find_slot(load_json_file($watch_map_file)['rows'] ?? [], '3-1');
+  if (($watch_late['occupied'] ?? false) === true) {
+    break;
+  }
+  usleep(100000);
+}
+assert_equal($watch_late['occupied'] ?? null, true, 'watcher follows by-path directories added to the alias file');
+proc_terminate($watch_process);
+proc_close($watch_process);
+if (function_exists('pcntl_async_signals')) {
+  assert_true(!is_file($ctx_watch['out_dir'] . '/drivemap-watch.pid'), 'terminated watcher removes its pid file');
+}
+// A leftover pid file naming some other live process must not freeze the map.
+$watch_before_read = (string)@file_get_contents($watch_map_file);
+file_put_contents($ctx_watch['out_dir'] . '/drivemap-watch.pid', getmypid() . "\n");
+putenv('DRIVEMAP_REFRESH_SECONDS=0');
+run_api_action($root, 'drivemap');
+assert_true((string)@file_get_contents($watch_map_file) !== $watch_before_read, 'a stale pid file does not disable read-time regeneration');
+putenv('DRIVEMAP_REFRESH_SECONDS');
+// The watcher itself takes such a pid file over instead of refusing to start.
+$watch_process = proc_open('exec php ' . escapeshellarg($watch_script), [1 => $watch_devnull, 2 => $watch_devnull], $watch_pipes);
+$watch_pid = proc_get_status($watch_process)['pid'];
+for ($i = 0; $i < 50 && (int)@file_get_contents($ctx_watch['out_dir'] . '/drivemap-watch.pid') !== $watch_pid; $i++) {
+  usleep(100000);
+}
+assert_equal((int)@file_get_contents($ctx_watch['out_dir'] . '/drivemap-watch.pid'), $watch_pid, 'watcher overwrites a pid file naming another process');
+proc_terminate($watch_process);
+proc_close($watch_process);
+@unlink($ctx_watch['out_dir'] . '/drivemap-watch.pid');
+putenv('DRIVEMAP_WATCH_MODE');
+putenv('DRIVEMAP_WATCH_POLL');
+putenv('DRIVEMAP_WATCH_FULL_INTERVAL');
+putenv('DRIVEMAP_SMARTCTL_DIR=');
+putenv('DRIVEMAP_SMART_TTL_COUNTERS');
+
+// Scenario 24: drivemap_zfs joins zfs_disks onto bays through the generator's
+// device index (kernel and by-id names included) and caches the joined body.
+$ctx_join = create_context('drivemap_zfs');
+write_alias_file($ctx_join, [
+  '1-1' => 'pci-0000:01:00.0-sas-phy0-lun-0',
+  '1-2' => 'pci-0000:01:00.0-sas-phy1-lun-0',
+  '2-1' => 'pci-0000:02:00.0-sas-phy0-lun-0',
+], [
+  '1-1' => $ctx_join['dev_dir'] . '/sda',
+  '1-2' => $ctx_join['dev_dir'] . '/sdb',
+  '2-1' => $ctx_join['dev_dir'] . '/sdc',
+]);
+set_common_env($ctx_join, $fixtures);
+putenv('DRIVEMAP_DISABLE_SMART=1');
+putenv('DRIVEMAP_REFRESH_SECONDS=3600');
+$join_by_id = $ctx_join['tmp'] . '/by-id';
+ensure_dir($join_by_id);
+symlink($ctx_join['dev_dir'] . '/sdb', $join_by_id . '/wwn-0x5000c500a1b2c3d4');
+putenv('DRIVEMAP_BY_ID_DIR=' . $join_by_id);
+// Same pool as tests/fixtures/zfs, created on sda1 and a by-id partition.
+$join_zfs_dir = $ctx_join['tmp'] . '/zfs';
+ensure_dir($join_zfs_dir);
+foreach (glob($fixtures . '/zfs/*') as $join_fixture) {
+  $join_text = (string)file_get_contents($join_fixture);
+  if (strpos(basename($join_fixture), '_path_') === false) {
+    $join_text = preg_replace(['/(?<=\s)1-1(?=\s)/', '/(?<=\s)1-2(?=\s)/'], ['sda1', 'wwn-0x5000c500a1b2c3d4-part1'], $join_text);
+  }
+  file_put_contents($join_zfs_dir . '/' . basename($join_fixture), $join_text);
+}
+putenv('DRIVEMAP_ZFS_FORCE=1');
+putenv('DRIVEMAP_ZFS_FIXTURE_DIR=' . $join_zfs_dir);
+[$join_code] = run_php_script($map_script);
+assert_equal($join_code, 0, 'generator exits successfully for device index');
+$join_index = load_json_file($ctx_join['out_dir'] . '/drivemap.index.json');
+assert_equal($join_index['source']['sha1'] ?? null, sha1_file($ctx_join['out_dir'] . '/drivemap.json'), 'device index pins drivemap.json hash');
+assert_equal($join_index['names']['sda'] ?? null, '1-1', 'device index maps kernel names');
+assert_equal($join_index['names']['wwn-0x5000c500a1b2c3d4'] ?? null, '1-2', 'device index maps by-id links');
+assert_equal($join_index['names']['/dev/disk/by-vdev/2-1'] ?? null, '2-1', 'device index maps by-vdev paths');
+
+$join_body = run_api_request($root, ['action' => 'drivemap_zfs']);
+$join_data = json_decode($join_body, true);
+$join_slot = find_slot($join_data['rows'] ?? [], '1-1');
+assert_equal($join_slot['zfs']['zpool_name'] ?? null, 'tank', 'kernel partition member joins its bay');
+assert_equal($join_slot['zfs']['vdev_raid_level'] ?? null, 'mirror-0', 'joined slot carries vdev fields');
+assert_equal(find_slot($join_data['rows'] ?? [], '1-2')['zfs']['name'] ?? null, 'wwn-0x5000c500a1b2c3d4-part1', 'by-id partition member joins its bay');
+assert_true(array_key_exists('zfs', find_slot($join_data['rows'] ?? [], '2-1') ?? []) && find_slot($join_data['rows'], '2-1')['zfs'] === null, 'bays outside any pool carry a null zfs entry');
+assert_equal($join_data['zfs']['unmatched'] ?? null, [], 'every pool member maps to a bay');
+assert_equal(array_column($join_data['zfs']['zpools'] ?? [], 'name'), ['tank'], 'pool list is included');
+
+$join_cache_file = $ctx_join['out_dir'] . '/drivemap-zfs.json';
+$join_key = strtok((string)@file_get_contents($join_cache_file), "\n");
+assert_equal(run_api_request($root, ['action' => 'drivemap_zfs'], ['HTTP_IF_NONE_MATCH' => 'W/"' . $join_key . '"']), '', 'matching If-None-Match returns empty 304 body');
+file_put_contents($join_cache_file, $join_key . "\n" . json_encode(['cached' => true]));
+assert_equal(json_decode(run_api_request($root, ['action' => 'drivemap_zfs']), true), ['cached' => true], 'unchanged inputs are served from the joined cache');
+
+$join_map = load_json_file($ctx_join['out_dir'] . '/drivemap.json');
+$join_map['rows'][0][0]['model-name'] = 'SIMULATED';
+file_put_contents($ctx_join['out_dir'] . '/drivemap.json', json_encode($join_map, JSON_PRETTY_PRINT));
+$join_edited = json_decode(run_api_request($root, ['action' => 'drivemap_zfs']), true);
+assert_equal(find_slot($join_edited['rows'] ?? [], '1-1')['model-name'] ?? null, 'SIMULATED', 'map edits invalidate the joined cache');
+assert_equal(find_slot($join_edited['rows'] ?? [], '1-1')['zfs']['zpool_name'] ?? null, 'tank', 'stale device index is rebuilt for the edited map');
+
+putenv('DRIVEMAP_ZFS_FIXTURE_DIR=' . $fixtures . '/zfs');
+$join_alias = json_decode(run_api_request($root, ['action' => 'drivemap_zfs']), true);
+assert_equal(find_slot($join_alias['rows'] ?? [], '1-2')['zfs']['name'] ?? null, '1-2', 'zfs changes invalidate the joined cache; alias names join directly');
+putenv('DRIVEMAP_ZFS_FORCE');
+putenv('DRIVEMAP_ZFS_FIXTURE_DIR');
+putenv('DRIVEMAP_BY_ID_DIR');
+putenv('DRIVEMAP_DISABLE_SMART');
+putenv('DRIVEMAP_REFRESH_SECONDS');
+
+// Scenario 25: 9361 JBOD slot -> DID tables come from one recorded
+// `storcli64 /call show all J` and match the hwraid-mocked parity cases; the
+// parsed inventory is cached and also fills controller versions in the map.
+$ctx_storcli = create_context('storcli');
+$storcli_cache = $ctx_storcli['tmp'] . '/storcli-inventory.json';
+foreach (['storinator_av15_9361', 'h32_q30_9361_hybrid', 'c8_9361', 'f8_x1_9361'] as $storcli_case) {
+  $storcli_env = vendor_dmap_case_local_env($root, $storcli_case);
+  unset($storcli_env['DRIVEMAP_DMAP_HWRAID_JSON']);
+  $storcli_env['DRIVEMAP_STORCLI_FIXTURE_DIR'] = $fixtures . '/storcli';
+  $storcli_env['DRIVEMAP_STORCLI_CACHE'] = $storcli_cache;
+  $storcli_result = run_ported_dmap($root, $ctx_storcli, vendor_dmap_case_server($root, $storcli_case), $storcli_env);
+  assert_equal($storcli_result['code'], 0, "storcli-backed vdev_id generation succeeds ($storcli_case)");
+  assert_equal($storcli_result['aliases'], vendor_dmap_alias_lines($root, $storcli_case), "storcli JBOD table matches hwraid mock ($storcli_case)");
+}
+$storcli_cached = load_json_file($storcli_cache);
+assert_equal(array_keys($storcli_cached['controllers'] ?? []), ['SK31900101', 'SK31900102', 'SK31900103', 'SK31900104', 'SPC4400201'], 'inventory is keyed by controller serial');
+assert_equal($storcli_cached['controllers']['SK31900104']['bus'] ?? null, '0000:35:00.0', 'storcli PCI address is normalized');
+assert_equal(array_column(array_slice($storcli_cached['controllers'] ?? [], 0, 4), 'jbod'), [true, true, true, true], 'JBOD setting read from show all, else from show jbod');
+// JBOD on with no drives attached yet is still JBOD; only the setting warns.
+$storcli_empty_dir = $ctx_storcli['tmp'] . '/storcli-empty';
+ensure_dir($storcli_empty_dir);
+foreach (['No' => true, 'Yes' => false] as $storcli_setting => $storcli_warns) {
+  $storcli_empty = json_decode((string)file_get_contents($fixtures . '/storcli/storcli64.json'), true);
+  unset($storcli_empty['Controllers'][3]['Response Data']['JBOD LIST']);
+  $storcli_empty['Controllers'][3]['Response Data']['Capabilities'] = ['Enable JBOD' => $storcli_setting];
+  file_put_contents($storcli_empty_dir . '/storcli64.json', json_encode($storcli_empty));
+  $storcli_empty_result = run_ported_dmap($root, $ctx_storcli, vendor_dmap_case_server($root, 'f8_x1_9361'), [
+    'DRIVEMAP_STORCLI_FIXTURE_DIR' => $storcli_empty_dir,
+    'DRIVEMAP_STORCLI_CACHE' => $storcli_empty_dir . '/cache-' . $storcli_setting . '.json',
+  ]);
+  $storcli_warned = strpos(implode("\n", $storcli_empty_result['stdout']), 'JBOD mode is not enabled') !== false;
+  assert_equal($storcli_warned, $storcli_warns, "JBOD warning follows the controller setting (Enable JBOD: $storcli_setting)");
+}
+$storcli_offline = run_ported_dmap($root, $ctx_storcli, vendor_dmap_case_server($root, 'f8_x1_9361'), [
+  'DRIVEMAP_STORCLI_FIXTURE_DIR' => $ctx_storcli['tmp'] . '/no-storcli',
+  'DRIVEMAP_STORCLI_CACHE' => $storcli_cache,
+]);
+assert_equal($storcli_offline['aliases'], vendor_dmap_alias_lines($root, 'f8_x1_9361'), 'unchanged hardware reuses the cached inventory');
+$storcli_uncached = run_ported_dmap($root, $ctx_storcli, vendor_dmap_case_server($root, 'f8_x1_9361'), [
+  'DRIVEMAP_STORCLI_FIXTURE_DIR' => $ctx_storcli['tmp'] . '/no-storcli',
+  'DRIVEMAP_STORCLI_CACHE' => $storcli_cache,
+  'DRIVEMAP_STORCLI_TTL' => '0',
+]);
+assert_true($storcli_uncached['code'] !== 0, 'DRIVEMAP_STORCLI_TTL=0 skips the cached inventory');
+@symlink($ctx_storcli['dev_dir'] . '/sda', $ctx_storcli['by_path_dir'] . '/pci-0000:35:00.0-scsi-0:0:523:0');
+$storcli_swapped = run_ported_dmap($root, $ctx_storcli, vendor_dmap_case_server($root, 'f8_x1_9361'), [
+  'DRIVEMAP_STORCLI_FIXTURE_DIR' => $ctx_storcli['tmp'] . '/no-storcli',
+  'DRIVEMAP_STORCLI_CACHE' => $storcli_cache,
+]);
+assert_true($storcli_swapped['code'] !== 0, 'a changed scsi by-path link invalidates the cached inventory');
+
+write_alias_file($ctx_storcli, ['1-1' => 'pci-0000:31:00.0-scsi-0:0:200:0'], ['1-1' => $ctx_storcli['dev_dir'] . '/sda']);
+set_common_env($ctx_storcli, $fixtures);
+file_put_contents($ctx_storcli['tmp'] . '/server_info.json', json_encode([
+  'Alias Style' => 'STORINATOR',
+  'Chassis Size' => 'AV15',
+  'HBA' => [
+    ['Model' => '9361-16i', 'Bus Address' => '0000:31:00.0'],
+    ['Model' => '9600-24i', 'Bus Address' => '0000:05:00.0'],
+  ],
+]));
+putenv('DRIVEMAP_SERVER_INFO_INPUT=' . $ctx_storcli['tmp'] . '/server_info.json');
+putenv('DRIVEMAP_STORCLI_FIXTURE_DIR=' . $fixtures . '/storcli');
+putenv('DRIVEMAP_DISABLE_SMART=1');
+[$storcli_map_code] = run_php_script($map_script);
+$storcli_map = load_json_file($ctx_storcli['out_dir'] . '/drivemap.json');
+assert_equal($storcli_map_code, 0, 'generator exits successfully with storcli inventory');
+assert_equal($storcli_map['meta']['firmware-version'] ?? null, '4.680.00-8577, 8.8.1.0-00000-00001', 'storcli firmware versions fill the map meta');
+assert_equal($storcli_map['meta']['driver-version'] ?? null, '07.725.01.00-rc1, 8.8.1.0.0', 'storcli driver versions fill the map meta');
+putenv('DRIVEMAP_SERVER_INFO_INPUT=' . $ctx_storcli['tmp'] . '/missing_server_info.json');
+putenv('DRIVEMAP_STORCLI_FIXTURE_DIR');
+putenv('DRIVEMAP_DISABLE_SMART');
+
+// Scenario 26: a recorded bundle replays the generator, its server_info child
+// and zfs_info without the host inputs, optionally at the recorded speed.
+$ctx_replay = create_context('replay');
+$replay_aliases = ['1-1' => 'pci-0000:00:1f.2-ata-1', '1-2' => 'pci-0000:00:1f.2-ata-2'];
+write_alias_file($ctx_replay, $replay_aliases, [
+  '1-1' => $ctx_replay['dev_dir'] . '/sda',
+  '1-2' => $ctx_replay['dev_dir'] . '/sdb',
+]);
+set_common_env($ctx_replay, $fixtures);
+$replay_smartctl = $ctx_replay['tmp'] . '/fake-smartctl';
+file_put_contents($replay_smartctl, "#!/bin/sh\n"
+  . "for arg in \"\$@\"; do case \"\$arg\" in /*) dev=\$(basename \"\$arg\");; esac; done\n"
+  . "[ \"\$dev\" = sdb ] && sleep 1\n"
+  . "cat " . escapeshellarg($fixtures . '/smart') . "/\$dev.json\n");
+chmod($replay_smartctl, 0755);
+$replay_bundle = $ctx_replay['tmp'] . '/bundle';
+putenv('DRIVEMAP_SMARTCTL=' . $replay_smartctl);
+putenv('DRIVEMAP_SMART_WORKERS=4');
+putenv('DRIVEMAP_SMART_TIMEOUT=5');
+putenv('DRIVEMAP_SMART_CACHE_FILE=' . $ctx_replay['tmp'] . '/smart-cache-record.json');
+putenv('DRIVEMAP_RECORD_DIR=' . $replay_bundle);
+[$record_code] = run_php_script($map_script);
+assert_equal($record_code, 0, 'generator exits successfully while recording');
+$recorded_map = load_json_file($ctx_replay['out_dir'] . '/drivemap.json');
+$map_sessions = glob($replay_bundle . '/45d-generate-map-*.json') ?: [];
+assert_equal(count($map_sessions), 1, 'recording writes one session per generator run');
+assert_true(count(glob($replay_bundle . '/45d-generate-server-info-*.json') ?: []) === 1, 'server_info child records its own session');
+$map_session = load_json_file($map_sessions[0] ?? '');
+assert_true(isset($map_session['calls']['is_link ' . $ctx_replay['by_path_dir'] . '/' . $replay_aliases['1-1']]), 'by-path link checks are recorded');
+$recorded_pool = [];
+foreach ($map_session['calls'] ?? [] as $call => $results) {
+  if (strpos($call, 'pool ') === 0 && strpos($call, '/sdb') !== false) {
+    $recorded_pool = $results[0];
+  }
+}
+assert_true(($recorded_pool['duration'] ?? 0) >= 1, 'smartctl pool results are recorded with their duration');
+
+// Replay with the links, sysfs tree, alias file and smartctl all gone.
+foreach ($replay_aliases as $path) {
+  @unlink($ctx_replay['by_path_dir'] . '/' . $path);
+}
+exec('rm -rf ' . escapeshellarg($ctx_replay['sys_block_dir']));
+@unlink($ctx_replay['alias_file']);
+@unlink($replay_smartctl);
+putenv('DRIVEMAP_RECORD_DIR');
+putenv('DRIVEMAP_REPLAY_DIR=' . $replay_bundle);
+foreach (['fast' => '', 'timed' => '1'] as $replay_mode => $latency) {
+  $replay_out = $ctx_replay['tmp'] . '/out-' . $replay_mode;
+  ensure_dir($replay_out);
+  putenv('DRIVEMAP_OUTPUT_DIR=' . $replay_out);
+  putenv('DRIVEMAP_SMART_CACHE_FILE=' . $ctx_replay['tmp'] . '/smart-cache-' . $replay_mode . '.json');
+  putenv('DRIVEMAP_REPLAY_LATENCY=' . $latency);
+  [$replay_code] = run_php_script($map_script);
+  $replayed_map = load_json_file($replay_out . '/drivemap.json');
+  assert_equal($replay_code, 0, "generator exits successfully from a replayed bundle ($replay_mode)");
+  assert_equal($replayed_map['rows'] ?? null, $recorded_map['rows'] ?? [], "replayed rows match the recorded run ($replay_mode)");
+  if ($latency === '1') {
+    assert_true(($replayed_map['lsdevDuration'] ?? 0) >= 1, 'replayed latency reproduces the slow smartctl');
+  } else {
+    assert_true(($replayed_map['lsdevDuration'] ?? 99) < 1, 'replay without latency skips the recorded waits');
+  }
+}
+putenv('DRIVEMAP_REPLAY_DIR');
+putenv('DRIVEMAP_REPLAY_LATENCY');
+putenv('DRIVEMAP_SMARTCTL');
+putenv('DRIVEMAP_SMART_WORKERS');
+putenv('DRIVEMAP_SMART_TIMEOUT');
+
+// zfs_info: record the probe on this host, then replay a bundle captured on a
+// ZFS host.
+putenv('DRIVEMAP_OUTPUT_DIR=' . $ctx_replay['out_dir']);
+putenv('DRIVEMAP_ZFS_FORCE');
+putenv('DRIVEMAP_ZFS_FIXTURE_DIR');
+$zfs_bundle = $ctx_replay['tmp'] . '/zfs-bundle';
+putenv('DRIVEMAP_RECORD_DIR=' . $zfs_bundle);
+run_api_action($root, 'zfs_info');
+putenv('DRIVEMAP_RECORD_DIR');
+$zfs_session = load_json_file((glob($zfs_bundle . '/*.json') ?: [''])[0]);
+assert_true(isset($zfs_session['calls']['exec command -v zfs 2>/dev/null']), 'zfs_info records its zfs probe');
+$zfs_host_bundle = $ctx_replay['tmp'] . '/zfs-host-bundle';
+ensure_dir($zfs_host_bundle);
+$zfs_exec = function ($output) {
+  return [['output' => $output, 'exit' => 0, 'seconds' => 0.01]];
+};
+file_put_contents($zfs_host_bundle . '/api.php-1.json', json_encode([
+  'script' => 'api.php',
+  'started' => 1,
+  'calls' => [
+    'exec command -v zfs 2>/dev/null' => $zfs_exec("/usr/sbin/zfs\n"),
+    'exec zpool list -H' => $zfs_exec(file_get_contents($fixtures . '/zfs/zpool_list.txt')),
+    'exec zfs list -H -d 0 -o name,used,avail,refer,mountpoint' => $zfs_exec(file_get_contents($fixtures . '/zfs/zfs_list.txt')),
+  ],
+]));
+putenv('DRIVEMAP_REPLAY_DIR=' . $zfs_host_bundle);
+$replayed_zfs = json_decode(run_api_action($root, 'zfs_info')[1], true);
+putenv('DRIVEMAP_REPLAY_DIR');
+assert_equal($replayed_zfs['zfs_installed'] ?? null, true, 'replayed zfs probe reports zfs installed');
+assert_equal(array_column($replayed_zfs['zpools'] ?? [], 'name'), ['tank'], 'replayed zpool list yields the recorded pool');
+assert_equal(array_unique(array_column($replayed_zfs['timings']['commands'] ?? [], 'source')), ['replay'], 'replayed zfs commands are reported as replay');
+
 if ($failures > 0) {
   fwrite(STDERR, "\n$failures test(s) failed.\n");
   exit(1);
@@ -3,6 +3,7 @@ import json
 import subprocess as py_subprocess
 import sys
 import types
+from concurrent.futures import ProcessPoolExecutor
 from copy import deepcopy
 from importlib.machinery import SourceFileLoader
 
@@ -346,6 +347,7 @@ CASES = {
 def usage() -> int:
     print(
         f"Usage: {sys.argv[0]} <vendor_dmap_path> <case_name> [--text|--full|--server|--local-env]\n"
+        f"   or: {sys.argv[0]} <vendor_dmap_path> --batch [case_name ...] [--jobs N]\n"
         f"   or: {sys.argv[0]} --list",
         file=sys.stderr,
     )
@@ -401,6 +403,24 @@ def load_vendor_dmap(path: str):
     return module
 
 
+_VENDOR_CODE = {}
+
+
+def fresh_vendor_dmap(path: str):
+    # Batch mode compiles dmap once and executes it into a new namespace per
+    # case, so functions patched by apply_vendor_mocks() never carry over.
+    code = _VENDOR_CODE.get(path)
+    if code is None:
+        loader = SourceFileLoader("vendor_dmap_reference", path)
+        code = loader.get_code(loader.name)
+        _VENDOR_CODE[path] = code
+    module = types.ModuleType("vendor_dmap_reference")
+    module.__file__ = path
+    exec(code, module.__dict__)
+    module.g_quiet = True
+    return module
+
+
 def apply_vendor_mocks(module, case_name: str):
     spec = case_spec(case_name)
     if spec is None:
@@ -422,7 +442,11 @@ def apply_vendor_mocks(module, case_name: str):
 
     lspci_lines = mocks.get("lspci_lines")
     if isinstance(lspci_lines, list):
-        real_popen = module.subprocess.Popen
+        # Patch a private copy of subprocess; the shared module stays untouched.
+        real_subprocess = module.subprocess
+        real_popen = real_subprocess.Popen
+        module.subprocess = types.ModuleType(real_subprocess.__name__)
+        module.subprocess.__dict__.update(vars(real_subprocess))
 
         class FakeProcess:
             def __init__(self, lines):
@@ -456,8 +480,8 @@ def alias_lines(text: str):
     return [line for line in text.splitlines() if line.startswith("alias ")]
 
 
-def run_case(vendor_dmap_path: str, case_name: str):
-    module = load_vendor_dmap(vendor_dmap_path)
+def run_case(vendor_dmap_path: str, case_name: str, loader=load_vendor_dmap):
+    module = loader(vendor_dmap_path)
     apply_vendor_mocks(module, case_name)
     server = build_server(case_name)
     if server is None:
@@ -475,11 +499,63 @@ def run_case_aliases(vendor_dmap_path: str, case_name: str):
     return alias_lines(generated)
 
 
+def batch_case(vendor_dmap_path: str, case_name: str):
+    # Every single-case mode for one case: aliases (default), --full,
+    # --server and --local-env. Failed runs report None plus the error.
+    result = {
+        "aliases": None,
+        "full": None,
+        "server": build_server(case_name),
+        "local_env": local_env(case_name),
+        "error": None,
+    }
+    try:
+        generated = run_case(vendor_dmap_path, case_name, fresh_vendor_dmap)
+    except Exception as exc:
+        result["error"] = str(exc)
+        return case_name, result
+    result["full"] = generated
+    result["aliases"] = alias_lines(generated) if isinstance(generated, str) else []
+    return case_name, result
+
+
+def run_batch(vendor_dmap_path: str, names, jobs: int):
+    if jobs > 1 and len(names) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            results = list(pool.map(batch_case, [vendor_dmap_path] * len(names), names))
+    else:
+        results = [batch_case(vendor_dmap_path, name) for name in names]
+    return dict(results)
+
+
+def batch_main(vendor_dmap_path: str, args) -> int:
+    jobs = 1
+    names = []
+    index = 0
+    while index < len(args):
+        if args[index] == "--jobs" and index + 1 < len(args):
+            jobs = max(1, int(args[index + 1]))
+            index += 2
+            continue
+        names.append(args[index])
+        index += 1
+    names = names or case_names()
+    unknown = [name for name in names if name not in CASES]
+    if unknown:
+        print(f"error: unknown case '{unknown[0]}'", file=sys.stderr)
+        return 2
+    print(json.dumps(run_batch(vendor_dmap_path, names, jobs)))
+    return 0
+
+
 def main() -> int:
     if len(sys.argv) == 2 and sys.argv[1] == "--list":
         print(json.dumps(case_names()))
         return 0
 
+    if len(sys.argv) >= 3 and sys.argv[2] == "--batch":
+        return batch_main(sys.argv[1], sys.argv[3:])
+
     if len(sys.argv) < 3 or len(sys.argv) > 4:
         return usage()
 
@@ -1,12 +1,26 @@
 #!/usr/bin/env python3
 import ast
+import hashlib
 import json
+import os
 import pathlib
 import re
 import sys
+import tempfile
+
+
+def usage() -> int:
+    print(
+        f"Usage: {sys.argv[0]} <vendor_lsdev_path> <style> <chassis>\n"
+        f"   or: {sys.argv[0]} <vendor_lsdev_path> --query STYLE/CHASSIS [STYLE/CHASSIS ...]\n"
+        f"   or: {sys.argv[0]} <vendor_lsdev_path> --all",
+        file=sys.stderr,
+    )
+    return 2
 
 
 def extract_alias_template(text: str):
+    # Fallback for sources ast cannot parse: brace-scan the dict literal.
     marker = re.search(r"alias_template\s*=\s*{", text)
     if marker is None:
         return None
@@ -31,28 +45,88 @@ def extract_alias_template(text: str):
     return ast.literal_eval(snippet)
 
 
+def parse_alias_template(text: str):
+    # One ast pass over the whole script; the assignment lives inside a function.
+    try:
+        tree = ast.parse(text)
+    except SyntaxError:
+        return extract_alias_template(text)
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Assign):
+            continue
+        if any(isinstance(target, ast.Name) and target.id == "alias_template" for target in node.targets):
+            return ast.literal_eval(node.value)
+    return None
+
+
+def cache_path() -> str:
+    return os.environ.get("DRIVEMAP_TEMPLATE_CACHE") or os.path.join(
+        tempfile.gettempdir(), "45d-vendor-template-cache.json"
+    )
+
+
+def load_alias_template(script_path: pathlib.Path):
+    # The parsed table is cached by the source file's sha256, so repeated
+    # lookups skip parsing until the vendored lsdev changes.
+    data = script_path.read_bytes()
+    digest = hashlib.sha256(data).hexdigest()
+    path = cache_path()
+    try:
+        with open(path, encoding="utf-8") as handle:
+            cached = json.load(handle)
+        if cached.get("sha256") == digest and isinstance(cached.get("template"), dict):
+            return cached["template"]
+    except (OSError, ValueError, AttributeError):
+        pass
+
+    template = parse_alias_template(data.decode("utf-8"))
+    if isinstance(template, dict):
+        tmp = f"{path}.tmp.{os.getpid()}"
+        try:
+            with open(tmp, "w", encoding="utf-8") as handle:
+                json.dump({"sha256": digest, "template": template}, handle)
+            os.replace(tmp, path)
+        except OSError:
+            pass
+    return template
+
+
+def lookup(template, style: str, chassis: str):
+    value = template.get(style, {})
+    return value.get(chassis) if isinstance(value, dict) else None
+
+
 def main():
-    if len(sys.argv) != 4:
-        print("null")
-        return 1
+    if len(sys.argv) < 3:
+        return usage()
 
     script_path = pathlib.Path(sys.argv[1])
-    style = sys.argv[2]
-    chassis = sys.argv[3]
+    args = sys.argv[2:]
+    if args[0] not in ("--all", "--query") and len(args) != 2:
+        return usage()
 
     try:
-        text = script_path.read_text(encoding="utf-8")
-        template = extract_alias_template(text)
+        template = load_alias_template(script_path)
     except Exception:
-        print("null")
-        return 0
+        template = None
 
     if not isinstance(template, dict):
         print("null")
         return 0
 
-    value = template.get(style, {}).get(chassis)
-    print(json.dumps(value))
+    if args[0] == "--all":
+        print(json.dumps(template))
+        return 0
+
+    if args[0] == "--query":
+        results = {}
+        for query in args[1:]:
+            style, _, chassis = query.partition("/")
+            results[query] = lookup(template, style, chassis)
+        print(json.dumps(results))
+        return 0
+
+    print(json.dumps(lookup(template, args[0], args[1])))
     return 0
 
 